@@ -0,0 +1,83 @@
+"""Compare the token-aware chunker with the legacy split_content on a crawl fixture.
+
+Usage (from backend/api, no Neo4j needed):
+    PYTHONPATH=src python3 benchmarks/bench_chunker.py [crawl_file] [--repeat N]
+        [--max-tokens N] [--overlap-tokens N]
+
+Reports throughput and the chunk-size distribution (in estimated tokens) for both.
+"""
+import argparse
+import json
+import time
+
+from bench_ingest import default_fixture
+from chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, estimate_tokens, iter_chunks
+from crawl_reader import iter_crawl_items
+from knowledge_base import ThinkScriptKnowledgeBase
+
+
+def percentile(values, pct):
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def run(chunk_page, items, repeat):
+    """Best-of-repeat time and the chunk texts of the last run"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = [chunk for item in items for chunk in chunk_page(item)]
+        best = min(best, time.perf_counter() - start)
+    return best, chunks
+
+
+def summarize(seconds, chunks, total_chars, max_tokens):
+    sizes = sorted(estimate_tokens(chunk) for chunk in chunks)
+    return {
+        "seconds": round(seconds, 4),
+        "mb_per_second": round(total_chars / seconds / 1e6, 2) if seconds else None,
+        "chunks": len(chunks),
+        "tokens_min": sizes[0] if sizes else None,
+        "tokens_p50": percentile(sizes, 50) if sizes else None,
+        "tokens_p95": percentile(sizes, 95) if sizes else None,
+        "tokens_max": sizes[-1] if sizes else None,
+        "over_budget": sum(1 for size in sizes if size > max_tokens)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("crawl_file", nargs="?", default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS)
+    args = parser.parse_args()
+
+    crawl_file = args.crawl_file or default_fixture()
+    items = list(iter_crawl_items(crawl_file))
+    total_chars = sum(len(item.get('content') or '') for item in items)
+    print(f"Chunking {len(items)} items ({total_chars / 1e6:.2f}M chars) from {crawl_file}")
+
+    legacy = run(lambda item: ThinkScriptKnowledgeBase.split_content(item.get('content') or ''),
+                 items, args.repeat)
+    chunker = run(lambda item: [chunk.content for chunk in iter_chunks(
+                      item.get('content') or '', item.get('code_blocks') or (), args.max_tokens, args.overlap_tokens)],
+                  items, args.repeat)
+
+    report = {
+        "items": len(items),
+        "max_tokens": args.max_tokens,
+        "overlap_tokens": args.overlap_tokens,
+        "split_content": summarize(*legacy, total_chars, args.max_tokens),
+        "chunker": summarize(*chunker, total_chars, args.max_tokens)
+    }
+    for name in ("split_content", "chunker"):
+        result = report[name]
+        print(f"{name:>13}: {result['seconds']}s ({result['mb_per_second']} MB/s), {result['chunks']} chunks, "
+              f"tokens p50 {result['tokens_p50']} p95 {result['tokens_p95']} max {result['tokens_max']}, "
+              f"{result['over_budget']} over budget")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Time a cold rebuild with the online Cypher loader against CSV export plus neo4j-admin import.
+
+The online path is what `./run.sh process-crawl` does: batched node upserts,
+the link graph, client-side chunking, embeddings and index population. The
+offline path runs `./run.sh import-crawl <file> --yes`, timed end to end
+including stopping and restarting Neo4j. Graph sizes, and Nodes missing a
+property the online loader always sets, are compared afterwards.
+
+Usage (from backend/api, with Neo4j running under docker-compose):
+    PYTHONPATH=src python3 benchmarks/bench_cold_rebuild.py [crawl_file] [--skip-online] [--skip-import]
+
+WARNING: both paths replace all data in the neo4j database.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench_ingest import default_fixture, project_root
+from bulk_import import NODE_TITLE_INDEX_QUERY, export_crawl
+from knowledge_base import ThinkScriptKnowledgeBase
+from process_content import create_nodes_from_crawl, process_content
+
+crawls_dir = os.path.join(project_root, "data", "crawls")
+
+CLEAR_QUERY = """
+    MATCH (n)
+    CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+"""
+
+COUNTS_QUERY = """
+    RETURN COUNT { (:Node) } as nodes,
+           COUNT { (:ContentChunk) } as chunks,
+           COUNT { (:CodeExample) } as examples,
+           COUNT { (:Node)-[:LINKS_TO]->(:Node) } as links,
+           COUNT { (n:Node) WHERE n.title IS NULL OR n.code_blocks IS NULL OR n.links IS NULL } as missing_properties
+"""
+
+
+def graph_counts() -> dict:
+    kb = ThinkScriptKnowledgeBase()
+    try:
+        with kb.driver.session() as session:
+            return session.run(COUNTS_QUERY).single().data()
+    finally:
+        kb.close()
+
+
+def online_rebuild(crawl_file: str) -> float:
+    """Empty the database, then rebuild it the way process-crawl does; returns seconds"""
+    kb = ThinkScriptKnowledgeBase()
+    with kb.driver.session() as session:
+        session.run(CLEAR_QUERY).consume()
+    kb.close()
+
+    start = time.perf_counter()
+    kb = ThinkScriptKnowledgeBase()
+    try:
+        create_nodes_from_crawl(crawl_file)
+        process_content()
+        with kb.driver.session() as session:
+            session.run(NODE_TITLE_INDEX_QUERY).consume()
+            session.run("CALL db.awaitIndexes(600)").consume()
+    finally:
+        kb.close()
+    return time.perf_counter() - start
+
+
+def offline_rebuild(crawl_file: str) -> float:
+    """Run the import-crawl target end to end; returns seconds"""
+    start = time.perf_counter()
+    subprocess.run(["./run.sh", "import-crawl", os.path.basename(crawl_file), "--yes"], cwd=project_root,
+                   check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("crawl_file", nargs="?", default=None)
+    parser.add_argument("--skip-online", action="store_true")
+    parser.add_argument("--skip-import", action="store_true", help="skip the neo4j-admin rebuild")
+    args = parser.parse_args()
+
+    crawl_file = args.crawl_file or default_fixture()
+    if not os.path.isabs(crawl_file):
+        crawl_file = os.path.join(crawls_dir, os.path.basename(crawl_file))
+    if os.path.dirname(crawl_file) != crawls_dir:
+        sys.exit("import-crawl reads from data/crawls; copy the crawl file there first")
+
+    report = {"crawl_file": os.path.basename(crawl_file)}
+
+    # Export alone, into a scratch directory so the import target's files are untouched
+    export = export_crawl(crawl_file, os.path.join(project_root, "data", "import", "bench"))
+    print(f"Exported {export}")
+    report["export_seconds"] = round(export.seconds, 3)
+    report["export_rows"] = export.rows
+
+    if not args.skip_online:
+        report["online_seconds"] = round(online_rebuild(crawl_file), 3)
+        report["online_counts"] = graph_counts()
+        print(f"Online rebuild: {report['online_seconds']}s")
+
+    if not args.skip_import:
+        report["import_seconds"] = round(offline_rebuild(crawl_file), 3)
+        report["import_counts"] = graph_counts()
+        print(f"neo4j-admin rebuild: {report['import_seconds']}s")
+
+    if "online_seconds" in report and "import_seconds" in report:
+        report["speedup"] = round(report["online_seconds"] / report["import_seconds"], 2)
+        report["counts_match"] = report["online_counts"] == report["import_counts"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Compare the original per-row CREATE loader with the per-row and batched UNWIND upserts.
+
+`baseline` replays the loader as it was before batching: one auto-commit
+CREATE of title, content and url per crawl item, with no url constraint.
+`row` sends the current upsert (MERGE on url, code blocks, links, content
+hash and CodeExamples) one auto-commit statement per item, and `bulk` the
+same upsert as UNWIND batches. Speedups are relative to the baseline.
+
+Usage (from backend/api, with Neo4j running):
+    PYTHONPATH=src python3 benchmarks/bench_ingest.py [crawl_file] [--batch-size N] [--repeat N]
+
+WARNING: deletes every Node in the target database between runs, and drops
+the node_url constraint for the baseline (the other modes recreate it).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+from load_data import DataLoader
+from crawl_reader import iter_crawl_items
+from ingest import load_nodes, write_rows
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+MODES = ("baseline", "row", "bulk")
+
+# The statement create_nodes_from_crawl ran per item before the bulk loader
+BASELINE_CREATE_QUERY = """
+    CREATE (n:Node {
+        title: $title,
+        content: $content,
+        url: $url
+    })
+"""
+
+
+def default_fixture():
+    pattern = os.path.join(project_root, "data", "crawls", "thinkscript_data_*.json")
+    files = sorted(glob.glob(pattern) + glob.glob(pattern + "l"))
+    if not files:
+        sys.exit("No crawl fixture found in data/crawls")
+    return files[-1]
+
+
+def clear_nodes(driver):
+    with driver.session() as session:
+        session.run("MATCH (n:Node) DETACH DELETE n").consume()
+
+
+def load_baseline(driver, items):
+    """The original loader; crawls repeat some urls, so it runs without the node_url constraint"""
+    with driver.session() as session:
+        session.run("DROP CONSTRAINT node_url IF EXISTS").consume()
+    rows = ({'title': item.get('title', ''), 'content': item.get('content', ''), 'url': item.get('url', '')}
+            for item in items)
+    return write_rows(driver, BASELINE_CREATE_QUERY, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("crawl_file", nargs="?", default=None)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    crawl_file = args.crawl_file or default_fixture()
+    # Materialized once so every run replays identical input
+    items = list(iter_crawl_items(crawl_file))
+    print(f"Benchmarking {len(items)} items from {crawl_file}")
+
+    loader = DataLoader()
+    results = {}
+    try:
+        for mode in MODES:
+            runs = []
+            for _ in range(args.repeat):
+                clear_nodes(loader.driver)
+                if mode == "baseline":
+                    stats = load_baseline(loader.driver, items)
+                else:
+                    stats = load_nodes(loader.driver, items, mode=mode, batch_size=args.batch_size)
+                runs.append(stats)
+            best = min(runs, key=lambda s: s.seconds)
+            results[mode] = best
+            print(f"{mode:>8}: best of {args.repeat}: {best}")
+        clear_nodes(loader.driver)
+    finally:
+        loader.close()
+
+    def speedup(mode):
+        seconds = results[mode].seconds
+        return round(results["baseline"].seconds / seconds, 2) if seconds else float("inf")
+
+    report = {"items": len(items), "batch_size": args.batch_size}
+    for mode in MODES:
+        report[f"{mode}_seconds"] = round(results[mode].seconds, 4)
+        report[f"{mode}_rows_per_second"] = round(results[mode].rows_per_second, 1)
+    report["row_speedup"] = speedup("row")
+    report["bulk_speedup"] = speedup("bulk")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Replay a fixed ThinkScript question set against retrieval and report speed and quality.
+
+Usage (from backend/api, with Neo4j running):
+    PYTHONPATH=src python3 benchmarks/bench_retrieval.py [--load [crawl_file]]
+        [--modes exact snapshot fulltext hybrid graph] [--k 5] [--concurrency 8] [--repeat 3]
+        [--queries benchmarks/retrieval_queries.json] [--output results.json]
+
+--load first replaces every Node with the crawl file (default: newest
+data/crawls/thinkscript_data_*.json[l]), then chunks and embeds it.
+
+Each query has the urls of the pages that answer it (matched as url suffixes).
+For every mode the report has p50/p95/p99 latency, QPS with --concurrency
+queries in flight, and recall@k / MRR over pages, with chunk hits collapsed
+onto their page. `exact` runs only the exact title probe in Neo4j and `snapshot`
+the same lookup in the in-memory corpus snapshot. The retrieval cache and the
+corpus snapshot are bypassed, so every other query goes to Neo4j.
+"""
+import argparse
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from bench_ingest import default_fixture, project_root
+from chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from knowledge_base import EXACT_TITLE_BRANCH, RETRIEVAL_MODES, ThinkScriptKnowledgeBase
+from retrieval_cache import normalize_query
+
+BENCH_MODES = ("exact", "snapshot") + RETRIEVAL_MODES
+DEFAULT_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrieval_queries.json")
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def load_corpus(crawl_file):
+    """Replace the graph with the crawl file, the same way `./run.sh process-crawl` does"""
+    from process_content import create_nodes_from_crawl, process_content
+    create_nodes_from_crawl(crawl_file)
+    process_content()
+
+
+def search(kb, mode, query, k):
+    """Ranked page urls for one query"""
+    query = normalize_query(query)
+    if mode == "exact":
+        rows = kb._run_search([EXACT_TITLE_BRANCH], {"query": query}, {})
+    elif mode == "snapshot":
+        page = kb.corpus.snapshot.exact(query)
+        rows = [page] if page else []
+    else:
+        rows = kb._search(query, k, mode, {})
+    pages = []
+    for row in rows:
+        url = row['id'].split('#', 1)[0]
+        if url not in pages:
+            pages.append(url)
+    return pages
+
+
+def relevance(pages, expected, k):
+    """(recall@k, reciprocal rank) of the expected page suffixes in the top k pages"""
+    top = pages[:k]
+    found = [suffix for suffix in expected if any(page.endswith(suffix) for page in top)]
+    rank = next((i + 1 for i, page in enumerate(top) if any(page.endswith(s) for s in expected)), None)
+    return len(found) / len(expected), (1.0 / rank if rank else 0.0)
+
+
+def bench_mode(kb, mode, queries, k, concurrency, repeat):
+    def timed(query):
+        start = time.perf_counter()
+        pages = search(kb, mode, query['question'], k)
+        return time.perf_counter() - start, pages
+
+    # Warm up plans and page cache so the first mode measured isn't penalized
+    for query in queries:
+        search(kb, mode, query['question'], k)
+
+    latencies = []
+    walls = []
+    results = None
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = list(pool.map(timed, queries))
+            walls.append(time.perf_counter() - start)
+            latencies.extend(seconds * 1000 for seconds, _ in results)
+
+    recalls = []
+    reciprocal_ranks = []
+    misses = []
+    for query, (_, pages) in zip(queries, results):
+        recall, reciprocal_rank = relevance(pages, query['expected'], k)
+        recalls.append(recall)
+        reciprocal_ranks.append(reciprocal_rank)
+        if not reciprocal_rank:
+            misses.append(query['question'])
+
+    best_wall = min(walls)
+    return {
+        "queries": len(queries),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "qps": round(len(queries) / best_wall, 1),
+        f"recall@{k}": round(sum(recalls) / len(recalls), 3),
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 3),
+        "misses": misses
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--load", nargs="?", const="", default=None, metavar="CRAWL_FILE")
+    parser.add_argument("--modes", nargs="+", choices=BENCH_MODES, default=["exact", "fulltext", "hybrid"])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    crawl_file = None
+    if args.load is not None:
+        crawl_file = args.load or default_fixture()
+        print(f"Loading {crawl_file}")
+        load_corpus(crawl_file)
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = json.load(f)
+
+    kb = ThinkScriptKnowledgeBase()
+    corpus = kb.corpus
+    try:
+        with kb.driver.session() as session:
+            pages = session.run("MATCH (n:Node) WHERE n.deleted_at IS NULL RETURN count(n) as count").single()['count']
+        if not pages:
+            raise SystemExit("No Node data in Neo4j; run with --load")
+        print(f"Replaying {len(queries)} queries against {pages} pages "
+              f"(k={args.k}, concurrency={args.concurrency})")
+
+        if "snapshot" in args.modes:
+            if corpus is None:
+                raise SystemExit("snapshot mode needs CORPUS_SNAPSHOT=true")
+            kb.load_snapshot()
+        modes = {}
+        for mode in args.modes:
+            if mode == "hybrid" and kb.embedding_provider is None:
+                print("Skipping hybrid: EMBEDDING_PROVIDER is none")
+                continue
+            # Only snapshot mode sees the snapshot; for the others, one refreshed in the
+            # background mid-run would silently move the exact title probe into memory
+            kb.corpus = corpus if mode == "snapshot" else None
+            modes[mode] = bench_mode(kb, mode, queries, args.k, args.concurrency, args.repeat)
+            print(f"{mode:>8}: p50 {modes[mode]['p50_ms']}ms, {modes[mode]['qps']} qps, "
+                  f"recall@{args.k} {modes[mode][f'recall@{args.k}']}, mrr {modes[mode]['mrr']}")
+    finally:
+        kb.close()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "crawl_file": crawl_file,
+        "pages": pages,
+        "queries_file": args.queries,
+        "k": args.k,
+        "concurrency": args.concurrency,
+        "repeat": args.repeat,
+        "settings": {
+            "embedding_provider": os.getenv("EMBEDDING_PROVIDER", "hashing"),
+            "corpus_snapshot": corpus.stats()['snapshot'] if corpus else None,
+            "chunk_max_tokens": CHUNK_MAX_TOKENS,
+            "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS
+        },
+        "modes": modes
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Local stand-in for the OpenAI and Anthropic streaming APIs, for load tests without API keys.
+
+Usage (from backend/api):
+    python3 benchmarks/fake_llm_server.py --port 9000 --tokens 50 --token-delay-ms 20
+
+Then start the API against it:
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://localhost:9000/v1 \
+    ANTHROPIC_API_KEY=fake ANTHROPIC_BASE_URL=http://localhost:9000 uvicorn main:app
+
+Both providers share the same token timing, so time-to-first-token can be compared
+directly, e.g. loadtest_chat.py --model claude-3-haiku-20240307 vs --model gpt-3.5-turbo.
+GET /stats returns how many completions each provider endpoint has served.
+
+Fault injection, to exercise the API's limiter and backoff:
+    --max-concurrent 8      answer 429 while 8 streams are already open
+    --rate-limit-rate 0.2   answer 429 to a random 20% of requests
+    --retry-after 1         Retry-After seconds sent with each 429 (0 to omit)
+    --slow-rate 0.1 --slow-ms 5000   delay the first token of 10% of streams by 5s
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+config = {"tokens": 50, "token_delay_ms": 20.0, "first_token_delay_ms": 200.0,
+          "max_concurrent": 0, "rate_limit_rate": 0.0, "retry_after": 1.0, "slow_rate": 0.0, "slow_ms": 5000.0}
+requests_served = {"openai": 0, "anthropic": 0}
+rate_limited = {"openai": 0, "anthropic": 0}
+open_streams = {"count": 0}
+
+
+def should_rate_limit() -> bool:
+    if config["max_concurrent"] and open_streams["count"] >= config["max_concurrent"]:
+        return True
+    return random.random() < config["rate_limit_rate"]
+
+
+def rate_limit_response(provider: str) -> JSONResponse:
+    rate_limited[provider] += 1
+    headers = {"retry-after": str(config["retry_after"])} if config["retry_after"] else {}
+    message = "Rate limit reached (injected by fake_llm_server)"
+    if provider == "anthropic":
+        content = {"type": "error", "error": {"type": "rate_limit_error", "message": message}}
+    else:
+        content = {"error": {"message": message, "type": "requests", "param": None, "code": "rate_limit_exceeded"}}
+    return JSONResponse(status_code=429, content=content, headers=headers)
+
+
+async def first_token_delay():
+    delay = config["first_token_delay_ms"]
+    if random.random() < config["slow_rate"]:
+        delay += config["slow_ms"]
+    await asyncio.sleep(delay / 1000)
+
+
+async def counted(stream):
+    """Keep open_streams accurate however the stream ends"""
+    open_streams["count"] += 1
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        open_streams["count"] -= 1
+
+
+def openai_chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def openai_stream(model: str):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    await first_token_delay()
+    yield openai_chunk(completion_id, model, {"role": "assistant", "content": ""})
+    for i in range(config["tokens"]):
+        yield openai_chunk(completion_id, model, {"content": f"token{i} "})
+        await asyncio.sleep(config["token_delay_ms"] / 1000)
+    yield openai_chunk(completion_id, model, {}, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-3.5-turbo")
+    requests_served["openai"] += 1
+    if should_rate_limit():
+        return rate_limit_response("openai")
+    if body.get("stream"):
+        return StreamingResponse(counted(openai_stream(model)), media_type="text/event-stream")
+
+    await asyncio.sleep((config["first_token_delay_ms"] + config["tokens"] * config["token_delay_ms"]) / 1000)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": " ".join(f"token{i}" for i in range(config["tokens"]))},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": config["tokens"], "total_tokens": config["tokens"]}
+    }
+
+
+def anthropic_event(event_type: str, payload: dict) -> str:
+    payload = {"type": event_type, **payload}
+    return f"event: {event_type}\ndata: {json.dumps(payload)}\n\n"
+
+
+async def anthropic_stream(model: str, request_messages: list):
+    message_id = f"msg_{uuid.uuid4().hex}"
+    await first_token_delay()
+    yield anthropic_event("message_start", {"message": {
+        "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+        "stop_reason": None, "stop_sequence": None,
+        "usage": {"input_tokens": len(request_messages), "output_tokens": 0}
+    }})
+    yield anthropic_event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+    for i in range(config["tokens"]):
+        yield anthropic_event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": f"token{i} "}})
+        await asyncio.sleep(config["token_delay_ms"] / 1000)
+    yield anthropic_event("content_block_stop", {"index": 0})
+    yield anthropic_event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                            "usage": {"output_tokens": config["tokens"]}})
+    yield anthropic_event("message_stop", {})
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    body = await request.json()
+    model = body.get("model", "claude-3-haiku-20240307")
+    conversation = body.get("messages", [])
+    # Mirror the API's validation so mapping bugs surface as errors
+    roles = [msg["role"] for msg in conversation]
+    if not roles or roles[0] != "user" or any(a == b for a, b in zip(roles, roles[1:])):
+        return JSONResponse(status_code=400, content={"type": "error", "error": {
+            "type": "invalid_request_error", "message": f"messages must alternate starting with user: {roles}"}})
+    requests_served["anthropic"] += 1
+    if should_rate_limit():
+        return rate_limit_response("anthropic")
+    if body.get("stream"):
+        return StreamingResponse(counted(anthropic_stream(model, conversation)), media_type="text/event-stream")
+
+    await asyncio.sleep((config["first_token_delay_ms"] + config["tokens"] * config["token_delay_ms"]) / 1000)
+    return {
+        "id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant", "model": model,
+        "content": [{"type": "text", "text": " ".join(f"token{i}" for i in range(config["tokens"]))}],
+        "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": len(conversation), "output_tokens": config["tokens"]}
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return {"requests": requests_served, "rate_limited": rate_limited, "open_streams": open_streams["count"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--tokens", type=int, default=config["tokens"])
+    parser.add_argument("--token-delay-ms", type=float, default=config["token_delay_ms"])
+    parser.add_argument("--first-token-delay-ms", type=float, default=config["first_token_delay_ms"])
+    parser.add_argument("--max-concurrent", type=int, default=config["max_concurrent"])
+    parser.add_argument("--rate-limit-rate", type=float, default=config["rate_limit_rate"])
+    parser.add_argument("--retry-after", type=float, default=config["retry_after"])
+    parser.add_argument("--slow-rate", type=float, default=config["slow_rate"])
+    parser.add_argument("--slow-ms", type=float, default=config["slow_ms"])
+    args = parser.parse_args()
+
+    config.update(tokens=args.tokens, token_delay_ms=args.token_delay_ms,
+                  first_token_delay_ms=args.first_token_delay_ms, max_concurrent=args.max_concurrent,
+                  rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                  slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
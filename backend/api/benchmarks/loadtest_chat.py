@@ -0,0 +1,112 @@
+"""Fire N simultaneous /chat streams and report time-to-first-token and throughput.
+
+Usage (from backend/api, with the API running):
+    python3 benchmarks/loadtest_chat.py --url http://localhost:8000 --clients 1 4 16 32
+
+Pair with benchmarks/fake_llm_server.py to measure the server rather than the provider.
+If streams serialize on the event loop, wall time grows linearly with the client count;
+if they interleave, it stays close to a single stream's duration.
+
+With --llm-url pointing at the fake server, each level also reports how many
+upstream LLM requests it caused; with chat coalescing on, simultaneous identical
+questions should share one (run the API with ANSWER_CACHE_BACKEND=none so later
+levels aren't answered from the cache). Use --distinct to give every client its
+own question instead, e.g. to drive the upstream limiter against a fake server
+started with --max-concurrent; requests it sheds are reported separately.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+async def one_chat(client: httpx.AsyncClient, url: str, model: str, question: str) -> dict:
+    start = time.perf_counter()
+    first_token = None
+    chunks = 0
+    error = None
+    code = None
+    body = {"messages": [{"role": "user", "content": question}], "model": model}
+    async with client.stream("POST", f"{url}/chat", json=body) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = json.loads(line[6:])
+            if "error" in data:
+                error = data["error"]
+                code = data.get("code")
+            elif "content" in data:
+                chunks += 1
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+    return {"ttft": first_token, "total": time.perf_counter() - start, "chunks": chunks, "error": error,
+            "code": code}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def upstream_requests(client: httpx.AsyncClient, llm_url: str) -> int:
+    response = await client.get(f"{llm_url}/stats")
+    return sum(response.json()["requests"].values())
+
+
+async def run_level(url: str, clients: int, model: str, question: str, llm_url: str = None,
+                    distinct: bool = False) -> dict:
+    timeout = httpx.Timeout(120.0)
+    limits = httpx.Limits(max_connections=clients + 1)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        before = await upstream_requests(client, llm_url) if llm_url else None
+        start = time.perf_counter()
+        questions = [f"{question} (client {i})" if distinct else question for i in range(clients)]
+        results = await asyncio.gather(*(one_chat(client, url, model, q) for q in questions))
+        wall = time.perf_counter() - start
+        upstream = await upstream_requests(client, llm_url) - before if llm_url else None
+
+    ok = [r for r in results if r["error"] is None and r["ttft"] is not None]
+    ttfts = [r["ttft"] * 1000 for r in ok]
+    return {
+        "clients": clients,
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "shed": sum(1 for r in results if r["code"] == "overloaded"),
+        "wall_s": round(wall, 3),
+        "chats_per_s": round(len(ok) / wall, 2) if wall else None,
+        "chunks_per_s": round(sum(r["chunks"] for r in ok) / wall, 1) if wall else None,
+        "ttft_p50_ms": round(statistics.median(ttfts), 1) if ttfts else None,
+        "ttft_p95_ms": round(percentile(ttfts, 95), 1) if ttfts else None,
+        "mean_stream_s": round(statistics.mean(r["total"] for r in ok), 3) if ok else None,
+        "upstream_requests": upstream
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--question", default="How do I use the crosses function?")
+    parser.add_argument("--llm-url", default=None, help="fake_llm_server.py base url, e.g. http://localhost:9000")
+    parser.add_argument("--distinct", action="store_true", help="a different question per client")
+    args = parser.parse_args()
+
+    report = []
+    for clients in args.clients:
+        level = await run_level(args.url, clients, args.model, args.question, args.llm_url, args.distinct)
+        print(f"{clients:>4} clients: {level['chats_per_s']} chats/s, wall {level['wall_s']}s, "
+              f"ttft p50 {level['ttft_p50_ms']}ms p95 {level['ttft_p95_ms']}ms, errors {level['errors']} (shed {level['shed']})"
+              + (f", upstream requests {level['upstream_requests']}" if args.llm_url else ""))
+        report.append(level)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
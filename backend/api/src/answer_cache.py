@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+
+def normalize_question(text: str) -> str:
+    """Case/whitespace/trailing punctuation-insensitive form of a question"""
+    text = re.sub(r'\s+', ' ', text.strip().lower())
+    return text.rstrip(' ?!.')
+
+
+def make_cache_key(question: str, model: str, temperature: float, chunk_ids: Iterable[str],
+                   generation: Optional[int] = None) -> str:
+    """Key on the normalized question, model, temperature and the retrieved context.
+
+    The ingestion generation is part of the key so persistent backends never serve
+    answers from before a re-ingestion, even across restarts.
+    """
+    context_hash = hashlib.sha256('\n'.join(sorted(chunk_ids)).encode('utf-8')).hexdigest()
+    raw = json.dumps([normalize_question(question), model, round(temperature, 3), context_hash, generation])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """File-backed LRU with per-entry TTL, shared across workers and restarts"""
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float = 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now))
+            self._conn.execute("""
+                DELETE FROM answers WHERE key IN (
+                    SELECT key FROM answers ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM answers").fetchone()[0]
+
+
+class AnswerCache:
+    """Answer cache in front of generate_response, invalidated by ingestion generation"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+
+    def check_generation(self, generation: Optional[int]):
+        """Free entries from older generations once the graph has been re-ingested.
+
+        Generations only move forward: a request that saw an older one (e.g. the
+        last known generation after a retrieval timeout) doesn't clear the cache.
+        """
+        if generation is not None and (self.generation is None or generation > self.generation):
+            if self.generation is not None:
+                self.backend.clear()
+            self.generation = generation
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        self.backend.set(key, value)
+
+
+def replay_chunks(text: str, size: int = 64) -> Iterator[str]:
+    """Split a cached answer into stream-sized pieces on whitespace boundaries"""
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            space = text.rfind(' ', start + 1, end)
+            if space > start:
+                end = space
+        yield text[start:end]
+        start = end
+
+
+def create_answer_cache() -> Optional[AnswerCache]:
+    """Build the cache configured by ANSWER_CACHE_BACKEND (memory, sqlite or none)"""
+    backend_name = os.getenv("ANSWER_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+    max_entries = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    if backend_name == "none":
+        return None
+    if backend_name == "memory":
+        return AnswerCache(MemoryCacheBackend(max_entries=max_entries, ttl=ttl))
+    if backend_name == "sqlite":
+        path = os.getenv("ANSWER_CACHE_PATH", "data/cache/answers.sqlite3")
+        return AnswerCache(SQLiteCacheBackend(path, max_entries=max_entries, ttl=ttl))
+    raise ValueError(f"Unknown ANSWER_CACHE_BACKEND: {backend_name}")
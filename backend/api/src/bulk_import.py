@@ -0,0 +1,170 @@
+import csv
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from chunker import chunk_rows
+from crawl_reader import iter_crawl_items
+from embeddings import embed_pending_chunks, get_embedding_provider
+from ingest import bump_generation, ensure_constraints, is_unchanged, node_row, page_links
+from link_graph import pagerank
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+load_dotenv(os.path.join(project_root, '.env'))
+
+# Where CSVs are written; run.sh mounts this directory into the neo4j-admin container
+IMPORT_DIR = os.getenv("IMPORT_DIR", os.path.join(project_root, "data", "import"))
+
+# Code blocks are full of ';' (neo4j-admin's default), so array elements are
+# split on the ASCII unit separator; pass --array-delimiter=U+001F to the import
+ARRAY_DELIMITER = "\x1f"
+
+# Seconds to wait for freshly created indexes to finish populating
+INDEX_ONLINE_TIMEOUT_SECONDS = int(os.getenv("INDEX_ONLINE_TIMEOUT_SECONDS", "600"))
+
+NODE_TITLE_INDEX_QUERY = "CREATE INDEX node_title IF NOT EXISTS FOR (n:Node) ON (n.title)"
+
+# Strings are always quoted: neo4j-admin reads a bare empty field as a missing
+# property, but "" as an empty string (or an empty array for array columns), which
+# is what the online loader stores for an empty title, code_blocks or links
+QUOTING = csv.QUOTE_NONNUMERIC
+
+# One file per label or relationship type; labels and types are given on the
+# neo4j-admin command line, so the files only carry ids and properties
+CSV_HEADERS = {
+    "nodes.csv": ["url:ID(Node)", "title", "content", "code_blocks:string[]", "links:string[]",
+                  "content_hash", "pagerank:double", "in_degree:int", "out_degree:int", "degree:int"],
+    "chunks.csv": [":ID(Chunk)", "content", "kind", "chunk_index:int"],
+    "has_chunk.csv": [":START_ID(Node)", ":END_ID(Chunk)"],
+    "examples.csv": [":ID(Example)", "code", "identifiers", "example_index:int"],
+    "has_example.csv": [":START_ID(Node)", ":END_ID(Example)"],
+    "links_to.csv": [":START_ID(Node)", ":END_ID(Node)"]
+}
+
+
+@dataclass
+class ExportStats:
+    rows: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(CSV_HEADERS, 0))
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        counts = ", ".join(f"{name[:-4]} {count}" for name, count in self.rows.items())
+        return f"{counts} in {self.seconds:.2f}s"
+
+
+def _array(values: List[str]) -> str:
+    return ARRAY_DELIMITER.join(value.replace(ARRAY_DELIMITER, " ") for value in values)
+
+
+def _resolve_pages(crawl_file: str):
+    """First pass: the crawl position that wins for each url, and the LINKS_TO edges between crawled pages.
+
+    Like the MERGE in load_nodes, the last item for a url wins, so only urls and
+    links are held in memory here; page text is streamed again by the second pass.
+    """
+    positions: Dict[str, int] = {}
+    links: Dict[str, List[str]] = {}
+    for position, item in enumerate(iter_crawl_items(crawl_file)):
+        url = item.get('url') or ''
+        if is_unchanged(item) or not url:
+            continue
+        positions[url] = position
+        links[url] = page_links(url, item.get('links') or [])
+    edges = [(source, target) for source, targets in links.items() for target in targets if target in positions]
+    return positions, edges
+
+
+def export_crawl(crawl_file: str, import_dir: str = IMPORT_DIR) -> ExportStats:
+    """Write a crawl file as neo4j-admin import CSVs.
+
+    The result matches what create_nodes_from_crawl followed by process_content
+    builds online: Nodes with link ranks, their ContentChunks from the same
+    chunker and their CodeExamples. Embeddings, indexes and the generation
+    marker are added by finish_import once the database is running.
+    """
+    start = time.perf_counter()
+    positions, edges = _resolve_pages(crawl_file)
+    urls = list(positions)
+    ranks = pagerank(urls, edges)
+    in_degree = dict.fromkeys(urls, 0)
+    out_degree = dict.fromkeys(urls, 0)
+    for source, target in edges:
+        out_degree[source] += 1
+        in_degree[target] += 1
+
+    os.makedirs(import_dir, exist_ok=True)
+    stats = ExportStats()
+    files = {name: open(os.path.join(import_dir, name), 'w', encoding='utf-8', newline='') for name in CSV_HEADERS}
+    try:
+        writers = {name: csv.writer(f, quoting=QUOTING) for name, f in files.items()}
+        for name, header in CSV_HEADERS.items():
+            # Headers stay unquoted
+            csv.writer(files[name]).writerow(header)
+
+        def write(name: str, row: list):
+            writers[name].writerow(row)
+            stats.rows[name] += 1
+
+        chunk_id = 0
+        example_id = 0
+        for position, item in enumerate(iter_crawl_items(crawl_file)):
+            url = item.get('url') or ''
+            if positions.get(url) != position:
+                continue
+            row = node_row(item)
+            write("nodes.csv", [url, row['title'], row['content'], _array(row['code_blocks']), _array(row['links']),
+                                row['content_hash'], ranks[url], in_degree[url], out_degree[url],
+                                in_degree[url] + out_degree[url]])
+            for index, chunk in enumerate(chunk_rows(row['content'], row['code_blocks'])):
+                write("chunks.csv", [chunk_id, chunk['content'], chunk['kind'], index])
+                write("has_chunk.csv", [url, chunk_id])
+                chunk_id += 1
+            for index, example in enumerate(row['examples']):
+                write("examples.csv", [example_id, example['code'], example['identifiers'], index])
+                write("has_example.csv", [url, example_id])
+                example_id += 1
+            if stats.rows["nodes.csv"] % 1000 == 0:
+                print(f"  exported {stats.rows['nodes.csv']} pages")
+        for source, target in edges:
+            write("links_to.csv", [source, target])
+    finally:
+        for f in files.values():
+            f.close()
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def finish_import(kb):
+    """Schema, embeddings and generation marker for a database filled by neo4j-admin import"""
+    start = time.perf_counter()
+    # The fulltext and code example indexes were created by ThinkScriptKnowledgeBase()
+    ensure_constraints(kb.driver)
+    with kb.driver.session() as session:
+        session.run(NODE_TITLE_INDEX_QUERY).consume()
+    provider = get_embedding_provider()
+    if provider:
+        embed_pending_chunks(kb.driver, provider)
+    with kb.driver.session() as session:
+        session.run("CALL db.awaitIndexes($timeout)", timeout=INDEX_ONLINE_TIMEOUT_SECONDS).consume()
+    bump_generation(kb.driver)
+    print(f"Import finished in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if '--finish' in sys.argv:
+        from knowledge_base import ThinkScriptKnowledgeBase
+        finish_import(ThinkScriptKnowledgeBase())
+    elif args:
+        crawl_file = args[0] if os.path.isabs(args[0]) else os.path.join(project_root, args[0])
+        if not os.path.exists(crawl_file):
+            sys.exit(f"Crawl file not found: {crawl_file}")
+        print(f"Exporting {crawl_file} to {args[1] if len(args) > 1 else IMPORT_DIR}")
+        print(f"Exported {export_crawl(crawl_file, *args[1:2])}")
+    else:
+        sys.exit("Usage: bulk_import.py <crawl_file> [import_dir] | bulk_import.py --finish")
@@ -0,0 +1,125 @@
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from token_count import CHARS_PER_TOKEN, count_tokens
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))
+
+TEXT = "text"
+CODE = "code"
+
+# Chunks are measured with this model's tokenizer, as prompt_builder measures them for OpenAI models
+CHUNK_TOKEN_MODEL = os.getenv("CHUNK_TOKEN_MODEL", "gpt-3.5-turbo")
+
+# Sentences end at terminal punctuation followed by whitespace
+SENTENCE_END_RE = re.compile(r'[.!?]\s')
+
+
+class Chunk(NamedTuple):
+    kind: str  # TEXT or CODE
+    content: str
+    tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    return count_tokens(text, CHUNK_TOKEN_MODEL)
+
+
+def iter_text_chunks(content: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                     overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[Chunk]:
+    """Pack whole sentences into chunks of at most max_tokens in a single regex scan.
+
+    Chunks are slices of content, so nothing is re-split or re-joined. Each chunk
+    after the first starts with up to overlap_tokens of the previous chunk's tail,
+    and sentences longer than the budget are cut at word boundaries.
+    """
+    # A window of only whitespace strips to nothing; it must never become a ContentChunk
+    return (chunk for chunk in _pack_text(content, max_tokens, overlap_tokens) if chunk.content)
+
+
+def _pack_text(content: str, max_tokens: int, overlap_tokens: int) -> Iterator[Chunk]:
+    if overlap_tokens >= max_tokens // 2:
+        raise ValueError("overlap_tokens must be less than half of max_tokens")
+    # Character estimates only pick cut points; every chunk is measured with count_tokens
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+
+    def sentence_spans() -> Iterator[tuple]:
+        position = 0
+        for match in SENTENCE_END_RE.finditer(content):
+            yield position, match.start() + 1
+            position = match.end()
+        # Text after the last sentence end, unless it is only whitespace
+        if content[position:].strip():
+            yield position, len(content)
+
+    def fits(start: int, end: int) -> bool:
+        return estimate_tokens(content[start:end]) <= max_tokens
+
+    def cut_point(start: int) -> int:
+        """End of the longest word-aligned window from `start` (or hard cut) within max_tokens"""
+        cut = content.rfind(' ', start + 1, start + max_chars + 1)
+        if cut <= start:
+            cut = start + max_chars
+        while not fits(start, cut):
+            space = content.rfind(' ', start + 1, cut)
+            cut = space if space > start else start + max(1, (cut - start) // 2)
+        return cut
+
+    def make(start: int, end: int) -> Chunk:
+        text = content[start:end].strip()
+        return Chunk(TEXT, text, estimate_tokens(text))
+
+    def overlap_start(start: int, end: int) -> Optional[int]:
+        """Offset of the last ~overlap_chars of content[start:end], at a word boundary"""
+        space = content.find(' ', max(start, end - overlap_chars), end)
+        return space + 1 if space > start else None
+
+    # Pending chunk content[start:end] of whole sentences; text before `emitted` is already out
+    start = end = None
+    emitted = 0
+
+    for sentence_start, sentence_end in sentence_spans():
+        if start is not None and fits(start, sentence_end):
+            end = sentence_end
+            continue
+
+        if start is not None and end > emitted:
+            yield make(start, end)
+            emitted = end
+            start = overlap_start(start, end)
+            if start is not None and fits(start, sentence_end):
+                end = sentence_end
+                continue
+
+        start, end = sentence_start, sentence_end
+        # A sentence over budget on its own is cut into word-aligned windows
+        while not fits(start, end):
+            # A cut inside leading whitespace would make an empty chunk
+            while content[start].isspace():
+                start += 1
+            cut = cut_point(start)
+            yield make(start, cut)
+            emitted = cut
+            start = overlap_start(start, cut) or cut
+
+    if start is not None and end > emitted:
+        yield make(start, end)
+
+
+def iter_chunks(content: str, code_blocks: Iterable[str] = (), max_tokens: int = CHUNK_MAX_TOKENS,
+                overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[Chunk]:
+    """Prose chunks followed by one atomic CODE chunk per code block, whatever its size"""
+    yield from iter_text_chunks(content, max_tokens, overlap_tokens)
+    for code in code_blocks:
+        code = code.strip()
+        if code:
+            yield Chunk(CODE, code, estimate_tokens(code))
+
+
+def chunk_rows(content: str, code_blocks: Iterable[str] = ()) -> List[Dict[str, str]]:
+    """Chunks in the {content, kind} shape written by CHUNK_REPLACE_FRAGMENT"""
+    return [{'content': chunk.content, 'kind': chunk.kind}
+            for chunk in iter_chunks(content or '', code_blocks or ())]
@@ -0,0 +1,57 @@
+import re
+from typing import Dict, List, Optional
+
+CODE_EXAMPLE_INDEX_NAME = "code_example_fulltext_index"
+
+# The standard analyzer would drop ThinkScript keywords such as `if`, `then`,
+# `no` and `not` as English stop words
+CODE_EXAMPLE_INDEX_QUERY = f"""
+    CREATE FULLTEXT INDEX {CODE_EXAMPLE_INDEX_NAME} IF NOT EXISTS
+    FOR (e:CodeExample) ON EACH [e.code, e.identifiers]
+    OPTIONS {{indexConfig: {{`fulltext.analyzer`: 'standard-no-stop-words'}}}}
+"""
+
+IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+CAMEL_CASE_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+
+# "show me an example of ...", "sample code for ...", "snippet using ..."
+EXAMPLE_INTENT_RE = re.compile(
+    r'\b(?:show\s+me|give\s+me|examples?|samples?|snippets?|code\s+for|sample\s+code|write\s+(?:a|me))\b'
+    r'(?:\s+(?:an?|of|for|using|with|the|how\s+to)\b)*',
+    re.IGNORECASE
+)
+
+
+def code_identifiers(code: str) -> str:
+    """Identifiers in a code block plus their camelCase parts (AddLabel -> AddLabel Add Label).
+
+    Indexed next to the code so both `AddLabel` and `add label` find the example.
+    """
+    terms = []
+    seen = set()
+    for identifier in IDENTIFIER_RE.findall(code):
+        parts = CAMEL_CASE_RE.findall(identifier) if not identifier.islower() else []
+        for term in [identifier] + (parts if len(parts) > 1 else []):
+            if term not in seen:
+                seen.add(term)
+                terms.append(term)
+    return ' '.join(terms)
+
+
+def example_rows(code_blocks: List[str]) -> List[Dict[str, str]]:
+    """CodeExample properties for a page, in the {code, identifiers} shape used by ingestion"""
+    return [{'code': code, 'identifiers': code_identifiers(code)} for code in code_blocks]
+
+
+def example_query(query: str) -> Optional[str]:
+    """The subject of an example request ("show me an example of AddLabel" -> "AddLabel"), else None"""
+    if not EXAMPLE_INTENT_RE.search(query):
+        return None
+    subject = EXAMPLE_INTENT_RE.sub(' ', query)
+    subject = re.sub(r'\s+', ' ', subject).strip(' ?.!')
+    return subject or None
+
+
+def ensure_code_example_index(driver):
+    with driver.session() as session:
+        session.run(CODE_EXAMPLE_INDEX_QUERY).consume()
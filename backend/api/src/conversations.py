@@ -0,0 +1,138 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "data/cache/conversations.sqlite3")
+# Conversations idle for longer than this are evicted
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", "604800"))
+# Turns kept per conversation; older ones could never fit the prompt budget anyway
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "40"))
+# Expired conversations are swept at most this often
+EVICTION_INTERVAL_SECONDS = 300
+
+
+class ConversationStore:
+    """SQLite-backed chat sessions, so clients send only their new turn.
+
+    Reads and writes touch a bounded number of rows per conversation, so the
+    cost of a turn does not grow with the length of the conversation.
+    """
+
+    def __init__(self, path: str = CONVERSATION_DB_PATH, ttl: float = CONVERSATION_TTL_SECONDS,
+                 max_turns: int = CONVERSATION_MAX_TURNS):
+        self.path = path
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        self._evicted_at = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                model TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS conversations_expires ON conversations (expires_at)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS turns (
+                conversation_id TEXT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                PRIMARY KEY (conversation_id, seq)
+            ) WITHOUT ROWID
+        """)
+
+    def create(self, model: Optional[str] = None, turns: Optional[List[Dict[str, str]]] = None) -> Dict[str, object]:
+        """New conversation, optionally seeded with earlier turns (e.g. a client's local history)"""
+        conversation_id = secrets.token_urlsafe(16)
+        now = time.time()
+        turns = (turns or [])[-self.max_turns:]
+        with self._lock:
+            self._evict_expired(now)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO conversations (id, model, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (conversation_id, model, now, now + self.ttl))
+                self._conn.executemany(
+                    "INSERT INTO turns (conversation_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                    [(conversation_id, seq, turn['role'], turn['content']) for seq, turn in enumerate(turns)])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {'id': conversation_id, 'model': model, 'expires_at': now + self.ttl}
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, object]]:
+        """Conversation metadata and its stored turns, or None if unknown or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT model, expires_at FROM conversations WHERE id = ? AND expires_at >= ?",
+                (conversation_id, time.time())).fetchone()
+            if row is None:
+                return None
+            turns = self._turns(conversation_id)
+        return {'id': conversation_id, 'model': row[0], 'expires_at': row[1], 'turns': turns}
+
+    def history(self, conversation_id: str) -> Optional[List[Dict[str, str]]]:
+        """Stored turns oldest first, or None if the conversation is unknown or expired"""
+        conversation = self.get(conversation_id)
+        return conversation['turns'] if conversation else None
+
+    def append(self, conversation_id: str, role: str, content: str):
+        """Add a turn, drop turns beyond max_turns and extend the conversation's TTL"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                (last,) = self._conn.execute(
+                    "SELECT coalesce(max(seq), -1) FROM turns WHERE conversation_id = ?",
+                    (conversation_id,)).fetchone()
+                self._conn.execute(
+                    "INSERT INTO turns (conversation_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                    (conversation_id, last + 1, role, content))
+                self._conn.execute(
+                    "DELETE FROM turns WHERE conversation_id = ? AND seq <= ?",
+                    (conversation_id, last + 1 - self.max_turns))
+                self._conn.execute(
+                    "UPDATE conversations SET expires_at = ? WHERE id = ?", (now + self.ttl, conversation_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            return cursor.rowcount > 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM conversations").fetchone()[0]
+
+    def _turns(self, conversation_id: str) -> List[Dict[str, str]]:
+        rows = self._conn.execute(
+            "SELECT role, content FROM turns WHERE conversation_id = ? ORDER BY seq",
+            (conversation_id,)).fetchall()
+        return [{'role': role, 'content': content} for role, content in rows]
+
+    def _evict_expired(self, now: float):
+        if now - self._evicted_at < EVICTION_INTERVAL_SECONDS:
+            return
+        self._evicted_at = now
+        self._conn.execute("DELETE FROM conversations WHERE expires_at < ?", (now,))
@@ -0,0 +1,258 @@
+import difflib
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+# Live pages with their text chunks in chunk_index order (code chunks follow the
+# text ones and aren't slices of the page content, so they're left out)
+SNAPSHOT_QUERY = """
+    MATCH (n:Node)
+    WHERE n.deleted_at IS NULL AND n.title IS NOT NULL
+    OPTIONAL MATCH (n)-[:HAS_CHUNK]->(c:ContentChunk {kind: 'text'})
+    WITH n, c
+    ORDER BY n.url, c.chunk_index
+    RETURN n.url as url, n.title as title, coalesce(n.content, '') as content,
+           collect(c.content) as chunks
+"""
+
+# Fuzzy candidates must share the first character and be about as long as the query
+FUZZY_LENGTH_SLACK = 3
+FUZZY_CUTOFF = 0.75
+
+# Characters of a page's first chunk returned with each lookup result
+EXCERPT_CHARS = 200
+
+# Wait this long before retrying a failed rebuild
+REFRESH_RETRY_SECONDS = 30
+
+SYMBOL_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_.]*$')
+
+
+def symbol_key(text: str) -> str:
+    return text.strip().lower()
+
+
+class CorpusSnapshot:
+    """Read-only copy of page titles, symbol names and chunk offsets for lookups without Neo4j.
+
+    Page text is kept in a single string with per-page offsets, chunks as offsets
+    into it, and symbol keys as one sorted list of interned strings searched with
+    bisect. A snapshot is immutable once built; refreshing builds a new one.
+    """
+
+    def __init__(self, rows: List[dict], generation: Optional[int] = None):
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.load_ms = None
+
+        urls = []
+        titles = []
+        parts = []
+        page_starts = array('I')
+        page_ends = array('I')
+        # Chunk i of page p spans chunk_starts/ends[chunk_first[p] + i]
+        chunk_first = array('I')
+        chunk_counts = array('H')
+        chunk_starts = array('I')
+        chunk_ends = array('I')
+        exact: Dict[str, int] = {}
+        keys: Dict[str, List[int]] = {}
+        position = 0
+
+        for page, row in enumerate(rows):
+            content = row['content']
+            urls.append(sys.intern(row['url']))
+            titles.append(sys.intern(row['title']))
+            exact.setdefault(titles[-1], page)
+            for symbol in self._symbols(row['title'], row['url']):
+                keys.setdefault(sys.intern(symbol), []).append(page)
+
+            page_starts.append(position)
+            chunk_first.append(len(chunk_starts))
+            found = 0
+            offset = 0
+            for chunk in row['chunks']:
+                # Text chunks are stripped slices of the content, overlapping their predecessor
+                start = content.find(chunk, offset) if chunk else -1
+                if start < 0:
+                    break
+                chunk_starts.append(position + start)
+                chunk_ends.append(position + start + len(chunk))
+                offset = start + 1
+                found += 1
+            chunk_counts.append(found)
+            parts.append(content)
+            position += len(content)
+            page_ends.append(position)
+
+        self._text = ''.join(parts)
+        self._urls = urls
+        self._titles = titles
+        self._page_starts = page_starts
+        self._page_ends = page_ends
+        self._chunk_first = chunk_first
+        self._chunk_counts = chunk_counts
+        self._chunk_starts = chunk_starts
+        self._chunk_ends = chunk_ends
+        self._exact = exact
+        self._keys = sorted(keys)
+        self._key_pages = [tuple(keys[key]) for key in self._keys]
+
+    @staticmethod
+    def _symbols(title: str, url: str):
+        """Lookup keys of a page: its title and, when symbol-like, the last url path segment"""
+        yield symbol_key(title)
+        segment = url.split('#', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+        if SYMBOL_RE.match(segment) and symbol_key(segment) != symbol_key(title):
+            yield symbol_key(segment)
+
+    @classmethod
+    def load(cls, driver, generation: Optional[int] = None) -> 'CorpusSnapshot':
+        start = time.perf_counter()
+        with driver.session() as session:
+            # Auto-commit read: fails fast at startup instead of retrying while Neo4j is down
+            rows = session.run(SNAPSHOT_QUERY).data()
+        snapshot = cls(rows, generation)
+        snapshot.load_ms = round((time.perf_counter() - start) * 1000, 1)
+        return snapshot
+
+    def __len__(self):
+        return len(self._urls)
+
+    def page(self, index: int) -> dict:
+        """Whole page in the shape of the exact title branch"""
+        return {'id': self._urls[index], 'name': self._titles[index],
+                'content': self._text[self._page_starts[index]:self._page_ends[index]]}
+
+    def chunk(self, index: int, chunk_index: int = 0) -> dict:
+        """Text chunk of a page in the shape of the chunk search branches, or the whole page"""
+        if chunk_index >= self._chunk_counts[index]:
+            return self.page(index)
+        slot = self._chunk_first[index] + chunk_index
+        return {'id': f"{self._urls[index]}#{chunk_index}", 'name': self._titles[index],
+                'content': self._text[self._chunk_starts[slot]:self._chunk_ends[slot]]}
+
+    def exact(self, title: str) -> Optional[dict]:
+        """Page whose title equals `title` (case-sensitive, like n.title = $query)"""
+        index = self._exact.get(title)
+        return self.page(index) if index is not None else None
+
+    def prefix(self, text: str, limit: int = 10) -> List[str]:
+        """Symbol keys starting with `text` (case-insensitive), in sorted order"""
+        key = symbol_key(text)
+        if not key:
+            return []
+        matches = []
+        i = bisect_left(self._keys, key)
+        while i < len(self._keys) and len(matches) < limit and self._keys[i].startswith(key):
+            matches.append(self._keys[i])
+            i += 1
+        return matches
+
+    def fuzzy(self, text: str, limit: int = 5, cutoff: float = FUZZY_CUTOFF) -> List[str]:
+        """Closest symbol keys to `text`, e.g. for misspelled function names"""
+        key = symbol_key(text)
+        if not key:
+            return []
+        # Keys sharing the first character form one contiguous run of the sorted list
+        lo = bisect_left(self._keys, key[0])
+        hi = bisect_left(self._keys, chr(ord(key[0]) + 1), lo)
+        candidates = [candidate for candidate in self._keys[lo:hi]
+                      if abs(len(candidate) - len(key)) <= FUZZY_LENGTH_SLACK]
+        return difflib.get_close_matches(key, candidates, n=limit, cutoff=cutoff)
+
+    def lookup(self, text: str, limit: int = 10) -> List[dict]:
+        """Pages for a symbol: the exact match, then prefix matches, then fuzzy ones"""
+        results = []
+        seen = set()
+
+        def add(key: str, match: str):
+            i = bisect_left(self._keys, key)
+            for index in self._key_pages[i]:
+                if index not in seen and len(results) < limit:
+                    seen.add(index)
+                    first = self.chunk(index, 0)
+                    results.append({'match': match, 'symbol': key, 'title': first['name'], 'id': first['id'],
+                                    'excerpt': first['content'][:EXCERPT_CHARS]})
+
+        key = symbol_key(text)
+        if key and self.prefix(key, 1) == [key]:
+            add(key, 'exact')
+        for match in self.prefix(key, limit):
+            add(match, 'prefix')
+        if len(results) < limit:
+            for match in self.fuzzy(key, limit):
+                add(match, 'fuzzy')
+        return results
+
+    def stats(self) -> dict:
+        return {
+            'generation': self.generation,
+            'pages': len(self),
+            'symbols': len(self._keys),
+            'chunks': len(self._chunk_starts),
+            'text_bytes': len(self._text.encode()),
+            'load_ms': self.load_ms,
+            'loaded_at': self.loaded_at
+        }
+
+
+class SnapshotHolder:
+    """Current snapshot, rebuilt in the background when the ingestion generation moves.
+
+    `fresh(generation)` only returns a snapshot built for that generation, so a
+    stale one is never used; callers fall back to Neo4j while a rebuild runs.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.snapshot: Optional[CorpusSnapshot] = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.last_error = None
+        self._retry_at = 0.0
+        self._loading = threading.Lock()
+
+    def refresh(self, generation: Optional[int]):
+        """Rebuild the snapshot for `generation` unless a rebuild is already running"""
+        if not self._loading.acquire(blocking=False):
+            return
+        try:
+            snapshot = CorpusSnapshot.load(self.driver, generation)
+            self.snapshot = snapshot
+            self.refreshes += 1
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            self._retry_at = time.monotonic() + REFRESH_RETRY_SECONDS
+            raise
+        finally:
+            self._loading.release()
+
+    def fresh(self, generation: Optional[int]) -> Optional[CorpusSnapshot]:
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.generation == generation:
+            return snapshot
+        if not self._loading.locked() and time.monotonic() >= self._retry_at:
+            threading.Thread(target=self._refresh_quietly, args=(generation,), daemon=True).start()
+        return None
+
+    def _refresh_quietly(self, generation: Optional[int]):
+        try:
+            self.refresh(generation)
+        except Exception:
+            pass  # recorded in last_error; retried on the next lookup
+
+    def stats(self) -> dict:
+        return {
+            'snapshot': self.snapshot.stats() if self.snapshot else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,91 @@
+import json
+from typing import Any, Dict, Iterator
+
+READ_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+def iter_crawl_items(file_path: str) -> Iterator[Dict[str, Any]]:
+    """Yield crawl items one at a time from a JSON Lines or JSON array file.
+
+    Only the current item (plus one read buffer for arrays) is held in memory,
+    so loaders can stream arbitrarily large crawls into batched writes.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        first = _peek_non_whitespace(f)
+        if first == '[':
+            yield from _iter_json_array(f)
+        elif first:
+            yield from _iter_json_lines(f)
+
+
+def _peek_non_whitespace(f) -> str:
+    while True:
+        position = f.tell()
+        char = f.read(1)
+        if not char or not char.isspace():
+            f.seek(position)
+            return char
+
+
+def _iter_json_lines(f) -> Iterator[Dict[str, Any]]:
+    for line_number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}") from e
+
+
+def _iter_json_array(f) -> Iterator[Dict[str, Any]]:
+    """Incrementally decode the elements of a top-level JSON array"""
+    f.read(1)  # opening '['
+    buffer = ''
+    position = 0
+    eof = False
+
+    while True:
+        # Skip whitespace and separators between elements
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ','):
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            buffer, position = f.read(READ_SIZE), 0
+            eof = not buffer
+
+        if position >= len(buffer):
+            raise ValueError("Unterminated JSON array in crawl file")
+        if buffer[position] == ']':
+            return
+
+        try:
+            item, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Element continues past the buffer; read more and retry
+            if eof:
+                raise
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+
+        # Elements must be followed by ',' or ']'; anything else (or nothing yet)
+        # means a scalar such as a number was cut off at the buffer boundary
+        following = end
+        while following < len(buffer) and buffer[following].isspace():
+            following += 1
+        if following == len(buffer) or buffer[following] not in ',]':
+            chunk = '' if eof else f.read(READ_SIZE)
+            if chunk:
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            eof = True
+            if following < len(buffer):
+                raise ValueError(f"Unexpected {buffer[following]!r} after array element in crawl file")
+
+        yield item
+        position = end
@@ -0,0 +1,174 @@
+import hashlib
+import math
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+
+class EmbeddingProvider(ABC):
+    """Turns texts into fixed-size vectors; subclasses implement embed()"""
+
+    name = "base"
+    dimensions = 0
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+    @property
+    def model_id(self) -> str:
+        """Stored on each chunk so a provider change triggers re-embedding"""
+        return f"{self.name}:{self.dimensions}"
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Deterministic offline embeddings (signed feature hashing of words and word bigrams).
+
+    No network or model download, so it is suitable for tests and air-gapped setups;
+    it captures lexical overlap only.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        words = re.findall(r'[a-z0-9_]+', text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm:
+            vector = [value / norm for value in vector]
+        return vector
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API, called in batches with simple retries"""
+
+    name = "openai"
+
+    def __init__(self, model: str = "text-embedding-3-small", dimensions: int = 1536):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.model = model
+        self.dimensions = dimensions
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model}:{self.dimensions}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        # The API rejects empty strings
+        inputs = [text if text.strip() else " " for text in texts]
+        for attempt in range(3):
+            try:
+                response = self.client.embeddings.create(model=self.model, input=inputs, dimensions=self.dimensions)
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except Exception as e:
+                print(f"Embedding attempt {attempt + 1} failed: {str(e)}")
+                if attempt < 2:
+                    time.sleep(2 ** attempt)
+                else:
+                    raise
+
+
+def get_embedding_provider(name: Optional[str] = None) -> Optional[EmbeddingProvider]:
+    """Provider selected by EMBEDDING_PROVIDER (hashing, openai or none)"""
+    name = (name or os.getenv("EMBEDDING_PROVIDER", "hashing")).lower()
+    dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+    if name == "none":
+        return None
+    if name == "hashing":
+        return HashingEmbeddingProvider(int(dimensions or 256))
+    if name == "openai":
+        return OpenAIEmbeddingProvider(os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+                                       int(dimensions or 1536))
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {name}")
+
+
+VECTOR_INDEX_NAME = "chunk_embedding_index"
+
+PENDING_CHUNKS_QUERY = """
+    MATCH (c:ContentChunk)
+    WHERE c.embedding IS NULL OR c.embedding_model <> $model
+    RETURN elementId(c) as id, c.content as content
+    LIMIT $limit
+"""
+
+SET_EMBEDDINGS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (c:ContentChunk)
+    WHERE elementId(c) = row.id
+    SET c.embedding = row.embedding,
+        c.embedding_model = $model
+"""
+
+
+VECTOR_INDEX_DIMENSIONS_QUERY = """
+    SHOW VECTOR INDEXES YIELD name, options
+    WHERE name = $name
+    RETURN options.indexConfig.`vector.dimensions` as dimensions
+"""
+
+
+def ensure_vector_index(driver, provider: EmbeddingProvider):
+    """Create the chunk vector index for the provider's dimensions.
+
+    CREATE ... IF NOT EXISTS keeps an existing index's config, so an index
+    built for another provider is dropped and recreated when its dimensions
+    differ; otherwise every new embedding would fail to be indexed.
+    """
+    with driver.session() as session:
+        record = session.run(VECTOR_INDEX_DIMENSIONS_QUERY, name=VECTOR_INDEX_NAME).single()
+        if record is not None and record['dimensions'] != int(provider.dimensions):
+            print(f"Recreating {VECTOR_INDEX_NAME}: {record['dimensions']} dimensions, "
+                  f"{provider.model_id} needs {provider.dimensions}")
+            session.run(f"DROP INDEX {VECTOR_INDEX_NAME} IF EXISTS").consume()
+        # Index options cannot be parameterized
+        session.run(f"""
+            CREATE VECTOR INDEX {VECTOR_INDEX_NAME} IF NOT EXISTS
+            FOR (c:ContentChunk) ON (c.embedding)
+            OPTIONS {{indexConfig: {{
+                `vector.dimensions`: {int(provider.dimensions)},
+                `vector.similarity_function`: 'cosine'
+            }}}}
+        """).consume()
+
+
+def embed_pending_chunks(driver, provider: EmbeddingProvider, batch_size: int = 64) -> int:
+    """Embed chunks that have no embedding from this provider yet, batch by batch.
+
+    Chunks whose text survived re-chunking keep their embedding, so after an
+    incremental sync only new or changed chunks reach the provider.
+    """
+    ensure_vector_index(driver, provider)
+    total = 0
+    start = time.perf_counter()
+    with driver.session() as session:
+        while True:
+            pending = session.execute_read(
+                lambda tx: tx.run(PENDING_CHUNKS_QUERY, model=provider.model_id, limit=batch_size).data())
+            if not pending:
+                break
+            vectors = provider.embed([row['content'] or '' for row in pending])
+            rows = [{'id': row['id'], 'embedding': vector} for row, vector in zip(pending, vectors)]
+            session.execute_write(
+                lambda tx: tx.run(SET_EMBEDDINGS_QUERY, rows=rows, model=provider.model_id).consume())
+            total += len(rows)
+            print(f"  embeddings: {total} chunks ({total / (time.perf_counter() - start):.0f} chunks/s)")
+    print(f"Embedded {total} chunks with {provider.model_id}")
+    return total
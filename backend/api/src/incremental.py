@@ -0,0 +1,187 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Set
+
+from embeddings import embed_pending_chunks
+from link_graph import build_link_graph
+from ingest import (
+    CHUNK_REPLACE_FRAGMENT,
+    DEFAULT_CHUNK_BATCH_SIZE,
+    EXAMPLE_REPLACE_FRAGMENT,
+    bump_generation,
+    ensure_constraints,
+    is_unchanged,
+    node_row,
+    write_batches
+)
+
+# Upsert a changed page and replace its examples and chunks in the same
+# transaction, so a page is never visible without them
+PAGE_SYNC_QUERY = """
+    UNWIND $rows AS row
+    MERGE (parent:Node {url: row.url})
+    SET parent.title = row.title,
+        parent.content = row.content,
+        parent.code_blocks = row.code_blocks,
+        parent.links = row.links,
+        parent.content_hash = row.content_hash
+    REMOVE parent.deleted_at
+    WITH parent, row
+""" + EXAMPLE_REPLACE_FRAGMENT + """
+    WITH parent, row
+""" + CHUNK_REPLACE_FRAGMENT
+
+PAGE_DELETE_QUERY = """
+    UNWIND $rows AS url
+    MATCH (n:Node {url: url})
+    OPTIONAL MATCH (n)-[:HAS_CHUNK|HAS_EXAMPLE]->(child)
+    DETACH DELETE child, n
+"""
+
+# Tombstoned pages keep their Node (and url history) but drop out of search
+PAGE_TOMBSTONE_QUERY = """
+    UNWIND $rows AS url
+    MATCH (n:Node {url: url})
+    SET n.deleted_at = datetime()
+    WITH n
+    OPTIONAL MATCH (n)-[:HAS_CHUNK|HAS_EXAMPLE]->(child)
+    DETACH DELETE child
+"""
+
+REMOVAL_MODES = ("delete", "tombstone")
+
+
+@dataclass
+class SyncSummary:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    duplicates: int = 0
+    unknown_unchanged: int = 0
+    seconds: float = 0.0
+    removal_skipped: bool = False
+    removal_mode: str = "delete"
+    samples: Dict[str, List[str]] = field(default_factory=lambda: {'inserted': [], 'updated': [], 'removed': []})
+
+    def record(self, kind: str, url: str, limit: int = 5):
+        if len(self.samples[kind]) < limit:
+            self.samples[kind].append(url)
+
+    def print_report(self):
+        print("\nSync summary:")
+        print(f"- inserted:  {self.inserted}")
+        print(f"- updated:   {self.updated}")
+        print(f"- unchanged: {self.unchanged}")
+        removed = f"{self.removed} ({self.removal_mode})"
+        if self.removal_skipped:
+            removed += " SKIPPED, exceeds max removal ratio"
+        print(f"- removed:   {removed}")
+        if self.duplicates:
+            print(f"- duplicate urls ignored: {self.duplicates}")
+        if self.unknown_unchanged:
+            print(f"- unchanged markers for pages not live in the graph: {self.unknown_unchanged} "
+                  "(clear the crawler HTTP cache and recrawl to load them)")
+        for kind, urls in self.samples.items():
+            for url in urls:
+                print(f"  {kind}: {url}")
+        print(f"Completed in {self.seconds:.2f}s")
+
+
+def fetch_page_hashes(driver) -> Dict[str, Any]:
+    """Return {url: content_hash} for live pages; tombstoned pages map to None"""
+    # Live pages loaded before hashes existed map to '' so they count as changed
+    with driver.session() as session:
+        result = session.run("""
+            MATCH (n:Node)
+            WHERE n.url IS NOT NULL
+            RETURN n.url as url,
+                   CASE WHEN n.deleted_at IS NULL THEN coalesce(n.content_hash, '') END as content_hash
+        """)
+        return {record['url']: record['content_hash'] for record in result}
+
+
+def sync_crawl(
+    driver,
+    items: Iterable[Dict[str, Any]],
+    chunk_content: Callable[[str, List[str]], List[Dict[str, str]]],
+    removal_mode: str = "delete",
+    max_removal_ratio: float = 0.5,
+    batch_size: int = DEFAULT_CHUNK_BATCH_SIZE,
+    embedding_provider=None
+) -> SyncSummary:
+    """Bring the graph in line with a crawl by url and content hash.
+
+    Only new and changed pages are written and re-chunked. Pages missing from
+    the crawl are deleted or tombstoned, unless that would remove more than
+    max_removal_ratio of the live pages (e.g. a truncated crawl file).
+    """
+    if removal_mode not in REMOVAL_MODES:
+        raise ValueError(f"Unknown removal mode: {removal_mode}")
+
+    start = time.perf_counter()
+    summary = SyncSummary(removal_mode=removal_mode)
+    ensure_constraints(driver)
+    existing = fetch_page_hashes(driver)
+    seen: Set[str] = set()
+
+    def changed_pages() -> Iterator[Dict[str, Any]]:
+        for item in items:
+            # The crawler got a 304 for this page: keep it as is, without content to compare
+            if is_unchanged(item):
+                url = item.get('url')
+                if not url or url in seen:
+                    continue
+                seen.add(url)
+                if existing.get(url) is None:
+                    summary.unknown_unchanged += 1
+                else:
+                    summary.unchanged += 1
+                continue
+
+            row = node_row(item)
+            url = row['url']
+            if not url:
+                continue
+            if url in seen:
+                summary.duplicates += 1
+                continue
+            seen.add(url)
+
+            if url not in existing:
+                summary.inserted += 1
+                summary.record('inserted', url)
+            elif existing[url] != row['content_hash']:
+                summary.updated += 1
+                summary.record('updated', url)
+            else:
+                summary.unchanged += 1
+                continue
+
+            row['chunks'] = chunk_content(row['content'], row['code_blocks'])
+            yield row
+
+    write_batches(driver, PAGE_SYNC_QUERY, changed_pages(), batch_size, label="changed pages")
+
+    removed = [url for url, digest in existing.items() if url not in seen and digest is not None]
+    live = sum(1 for digest in existing.values() if digest is not None)
+    summary.removed = len(removed)
+    if removed and live and len(removed) / live > max_removal_ratio:
+        summary.removal_skipped = True
+    elif removed:
+        query = PAGE_DELETE_QUERY if removal_mode == "delete" else PAGE_TOMBSTONE_QUERY
+        for url in removed:
+            summary.record('removed', url)
+        write_batches(driver, query, removed, batch_size, label="removed pages")
+
+    # Only chunks of new/changed pages lack embeddings at this point
+    if embedding_provider and (summary.inserted or summary.updated):
+        embed_pending_chunks(driver, embedding_provider)
+
+    if summary.inserted or summary.updated or (summary.removed and not summary.removal_skipped):
+        # Links from unchanged pages may now resolve (or dangle), so rebuild them all
+        build_link_graph(driver)
+        bump_generation(driver)
+
+    summary.seconds = time.perf_counter() - start
+    return summary
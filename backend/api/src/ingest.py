@@ -0,0 +1,269 @@
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urldefrag
+
+from code_examples import example_rows
+
+DEFAULT_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+
+# Nodes are keyed by their crawl url, which must be unique
+NODE_URL_CONSTRAINT = """
+    CREATE CONSTRAINT node_url IF NOT EXISTS
+    FOR (n:Node) REQUIRE n.url IS UNIQUE
+"""
+
+# Replace the CodeExample nodes of `parent` with row.examples ({code, identifiers}
+# maps from code_examples.example_rows)
+EXAMPLE_REPLACE_FRAGMENT = """
+    OPTIONAL MATCH (parent)-[:HAS_EXAMPLE]->(old:CodeExample)
+    WITH parent, row, collect(old) as old_examples
+    FOREACH (old IN old_examples | DETACH DELETE old)
+    FOREACH (i IN range(0, size(row.examples) - 1) |
+        CREATE (parent)-[:HAS_EXAMPLE]->(:CodeExample {
+            code: row.examples[i].code,
+            identifiers: row.examples[i].identifiers,
+            example_index: i
+        })
+    )
+"""
+
+# Per-row statement used by the legacy loader (one auto-commit transaction per item)
+NODE_UPSERT_QUERY = """
+    MERGE (parent:Node {url: $url})
+    SET parent.title = $title,
+        parent.content = $content,
+        parent.code_blocks = $code_blocks,
+        parent.links = $links,
+        parent.content_hash = $content_hash
+    REMOVE parent.deleted_at
+    WITH parent, {examples: $examples} as row
+""" + EXAMPLE_REPLACE_FRAGMENT
+
+# Bulk statement: one parameterized UNWIND per batch inside an explicit write transaction
+NODE_BULK_UPSERT_QUERY = """
+    UNWIND $rows AS row
+    MERGE (parent:Node {url: row.url})
+    SET parent.title = row.title,
+        parent.content = row.content,
+        parent.code_blocks = row.code_blocks,
+        parent.links = row.links,
+        parent.content_hash = row.content_hash
+    REMOVE parent.deleted_at
+    WITH parent, row
+""" + EXAMPLE_REPLACE_FRAGMENT
+
+# Replace the chunks of `parent` with row.chunks ({content, kind} maps from
+# chunker.chunk_rows). Embeddings of chunks whose text is unchanged are carried
+# over so only new text needs embedding.
+CHUNK_REPLACE_FRAGMENT = """
+    CALL {
+        WITH parent
+        OPTIONAL MATCH (parent)-[:HAS_CHUNK]->(old:ContentChunk)
+        WITH collect(old) as olds
+        WITH olds, [o IN olds WHERE o.embedding IS NOT NULL |
+                    {content: o.content, embedding: o.embedding, model: o.embedding_model}] as kept
+        FOREACH (o IN olds | DETACH DELETE o)
+        RETURN kept
+    }
+    WITH parent, row, kept
+    UNWIND range(0, size(row.chunks) - 1) AS i
+    WITH parent, row, i, [k IN kept WHERE k.content = row.chunks[i].content][0] as reuse
+    CREATE (parent)-[:HAS_CHUNK]->(chunk:ContentChunk {
+        content: row.chunks[i].content,
+        kind: row.chunks[i].kind,
+        chunk_index: i
+    })
+    SET chunk.embedding = reuse.embedding,
+        chunk.embedding_model = reuse.model
+"""
+
+# Replace all chunks of each parent in the batch with the precomputed chunks
+CHUNK_BULK_REPLACE_QUERY = """
+    UNWIND $rows AS row
+    MATCH (parent:Node {url: row.url})
+""" + CHUNK_REPLACE_FRAGMENT
+
+DEFAULT_CHUNK_BATCH_SIZE = int(os.getenv("CHUNK_BATCH_SIZE", "100"))
+
+# Every completed ingestion run stamps a new generation so readers can drop
+# cached answers/results. A timestamp stays monotonic even across full wipes.
+GENERATION_BUMP_QUERY = """
+    MERGE (state:IngestState {id: 'corpus'})
+    SET state.generation = CASE
+            WHEN timestamp() > coalesce(state.generation, 0) THEN timestamp()
+            ELSE state.generation + 1
+        END,
+        state.updated_at = datetime()
+    RETURN state.generation as generation
+"""
+
+GENERATION_READ_QUERY = """
+    MATCH (state:IngestState {id: 'corpus'})
+    RETURN state.generation as generation
+"""
+
+
+@dataclass
+class IngestStats:
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.rows} rows in {self.batches} batches, "
+                f"{self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s)")
+
+
+def content_hash(title: str, content: str, code_blocks: List[str] = (), links: List[str] = ()) -> str:
+    """Stable fingerprint of the page fields that affect search"""
+    digest = hashlib.sha256()
+    digest.update(title.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(content.encode('utf-8'))
+    for code in code_blocks:
+        digest.update(b'\0')
+        digest.update(code.encode('utf-8'))
+    digest.update(b'\1')
+    for link in links:
+        digest.update(b'\0')
+        digest.update(link.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def normalize_link(url: str) -> str:
+    """Drop the #fragment so in-page anchors resolve to their page"""
+    return urldefrag(url.strip())[0]
+
+
+def page_links(page_url: str, links: Iterable[str]) -> List[str]:
+    """Distinct normalized links of a page, without self-links, in crawl order"""
+    seen = {page_url}
+    result = []
+    for link in links:
+        link = normalize_link(link or '')
+        if link and link not in seen:
+            seen.add(link)
+            result.append(link)
+    return result
+
+
+def is_unchanged(item: Dict[str, Any]) -> bool:
+    """Crawl marker for a page the crawler revalidated from its HTTP cache instead of re-parsing"""
+    return bool(item.get('unchanged'))
+
+
+def node_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a crawl item to the Node properties we persist"""
+    title = item.get('title') or ''
+    content = item.get('content') or ''
+    url = item.get('url') or ''
+    code_blocks = [code.strip() for code in item.get('code_blocks') or [] if code and code.strip()]
+    links = page_links(url, item.get('links') or [])
+    return {
+        'title': title,
+        'content': content,
+        'code_blocks': code_blocks,
+        'examples': example_rows(code_blocks),
+        'links': links,
+        'url': url,
+        'content_hash': content_hash(title, content, code_blocks, links)
+    }
+
+
+def batched(rows: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Yield lists of at most batch_size rows without materializing the input"""
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _run_batch(tx, query: str, batch: List[Dict[str, Any]]):
+    tx.run(query, rows=batch).consume()
+
+
+def write_batches(
+    driver,
+    query: str,
+    rows: Iterable[Dict[str, Any]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    label: str = "rows"
+) -> IngestStats:
+    """Send rows through an UNWIND $rows query, one write transaction per batch.
+
+    Only one batch is held in memory at a time, so rows may be any iterable.
+    """
+    stats = IngestStats()
+    start = time.perf_counter()
+    with driver.session() as session:
+        for batch in batched(rows, batch_size):
+            session.execute_write(_run_batch, query, batch)
+            stats.rows += len(batch)
+            stats.batches += 1
+            elapsed = time.perf_counter() - start
+            print(f"  {label}: {stats.rows} written ({stats.rows / elapsed:.0f} rows/s)")
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def write_rows(driver, query: str, rows: Iterable[Dict[str, Any]]) -> IngestStats:
+    """Legacy per-row path: one auto-commit statement per row"""
+    stats = IngestStats()
+    start = time.perf_counter()
+    with driver.session() as session:
+        for row in rows:
+            session.run(query, row).consume()
+            stats.rows += 1
+            stats.batches += 1
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def ensure_constraints(driver):
+    with driver.session() as session:
+        session.run(NODE_URL_CONSTRAINT).consume()
+
+
+def load_nodes(driver, items: Iterable[Dict[str, Any]], mode: str = "bulk",
+               batch_size: int = DEFAULT_BATCH_SIZE) -> IngestStats:
+    """Upsert one Node per crawl url using the bulk (default) or per-row path"""
+    ensure_constraints(driver)
+    # Unchanged markers carry no content; they only mean something to sync_crawl
+    rows = (row for row in map(node_row, (item for item in items if not is_unchanged(item))) if row['url'])
+    if mode == "bulk":
+        return write_batches(driver, NODE_BULK_UPSERT_QUERY, rows, batch_size, label="nodes")
+    if mode == "row":
+        return write_rows(driver, NODE_UPSERT_QUERY, rows)
+    raise ValueError(f"Unknown ingestion mode: {mode}")
+
+
+def write_chunks(driver, parents: Iterable[Dict[str, Any]],
+                 batch_size: int = DEFAULT_CHUNK_BATCH_SIZE) -> IngestStats:
+    """Write precomputed chunks, one {url, chunks: [{content, kind}]} row per parent Node"""
+    return write_batches(driver, CHUNK_BULK_REPLACE_QUERY, parents, batch_size, label="parents")
+
+
+def bump_generation(driver) -> int:
+    with driver.session() as session:
+        generation = session.execute_write(
+            lambda tx: tx.run(GENERATION_BUMP_QUERY).single()['generation'])
+    print(f"Ingestion generation is now {generation}")
+    return generation
+
+
+def read_generation(driver) -> Optional[int]:
+    with driver.session() as session:
+        record = session.run(GENERATION_READ_QUERY).single()
+        return record['generation'] if record else None
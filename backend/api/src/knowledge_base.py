@@ -1,14 +1,24 @@
 import os
-from openai import OpenAI
-from anthropic import Anthropic
+from openai import AsyncOpenAI
+from anthropic import AsyncAnthropic
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import json
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Optional
 import time
+import asyncio
 from datetime import datetime
 import logging
+from ingest import read_generation
+from embeddings import VECTOR_INDEX_NAME, get_embedding_provider
+from retrieval_cache import RetrievalCache, normalize_query
+from corpus_snapshot import SnapshotHolder
+from model_router import ModelRouter
+from code_examples import CODE_EXAMPLE_INDEX_QUERY, example_query
+from metrics import LLM_RATE_LIMITED, LLM_RETRIES, NEO4J_QUERY_SECONDS, NEO4J_SESSION_ACQUIRE_SECONDS, RETRIEVAL_SECONDS
+from upstream_limiter import (LLM_DEADLINE_SECONDS, AdaptiveLimiter, UpstreamOverloaded, backoff_delay, is_overload,
+                              is_retryable, retry_after_seconds, status_code)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +35,115 @@ print(f"NEO4J_USER: {os.getenv('NEO4J_USER')}")
 print(f"OPENAI_API_KEY: {'set' if os.getenv('OPENAI_API_KEY') else 'not set'}")
 print(f"ANTHROPIC_API_KEY: {'set' if os.getenv('ANTHROPIC_API_KEY') else 'not set'}")
 
+# Neo4j connection pool: size it for the retrieval worker threads plus ingestion
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "10"))  # seconds
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))  # seconds
+NEO4J_WARMUP_CONNECTIONS = int(os.getenv("NEO4J_WARMUP_CONNECTIONS", "4"))
+
+# Indexes retrieval depends on; /ready fails until they are ONLINE
+REQUIRED_INDEXES = ("content_fulltext_index", "code_example_fulltext_index")
+
+# Representative questions used to plan the retrieval query variants at startup
+WARMUP_QUERIES = ("How do I plot a moving average?", "Show me an example of AddLabel")
+
+# How often the API re-reads the ingestion generation marker
+GENERATION_POLL_SECONDS = float(os.getenv("GENERATION_POLL_SECONDS", "5"))
+
+# Retrieval after the exact title probe: fulltext (BM25 only), hybrid (BM25 + vector)
+# or graph (BM25 plus the pages one LINKS_TO hop away from the hits)
+RETRIEVAL_MODES = ("fulltext", "hybrid", "graph")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "fulltext")
+HYBRID_CANDIDATE_FACTOR = 4  # candidates per ranking, as a multiple of limit
+RRF_K = 60  # reciprocal rank fusion constant
+EXAMPLE_LIMIT = 3  # code examples put ahead of prose for "show me an example" questions
+GRAPH_EXPANSION_LIMIT = int(os.getenv("GRAPH_EXPANSION_LIMIT", "3"))  # linked pages added in graph mode
+
+# In-process cache of find_relevant_nodes results (0 entries disables it)
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "2048"))
+RETRIEVAL_CACHE_MAX_MB = float(os.getenv("RETRIEVAL_CACHE_MAX_MB", "32"))
+
+# In-process copy of titles and symbols; exact title matches are then answered
+# without Neo4j, which only runs the ranked search
+CORPUS_SNAPSHOT = os.getenv("CORPUS_SNAPSHOT", "true").lower() in ("1", "true", "yes")
+
+# Most user/assistant turns sent to either provider; system messages are always kept.
+# /chat also trims history to HISTORY_TOKEN_BUDGET before getting here.
+MAX_HISTORY_TURNS = int(os.getenv("MAX_HISTORY_TURNS", "20"))
+
+# Branches of the single-round-trip retrieval query; each returns
+# (source, name, content, id, score) and is combined with UNION ALL
+EXACT_TITLE_BRANCH = """
+            MATCH (n:Node)
+            WHERE n.title = $query AND n.deleted_at IS NULL
+            RETURN 'exact' as source, n.title as name, n.content as content, n.url as id, 1.0 as score
+            LIMIT 1"""
+
+FULLTEXT_BRANCH = """
+            CALL db.index.fulltext.queryNodes("content_fulltext_index", $fulltext_query)
+            YIELD node, score
+            WITH node, score
+            ORDER BY score DESC
+            LIMIT $limit
+            OPTIONAL MATCH (node)<-[:HAS_CHUNK]-(parent:Node)
+            RETURN 'fulltext' as source,
+                   CASE WHEN node:Node THEN node.title ELSE parent.title END as name,
+                   node.content as content,
+                   CASE
+                       WHEN node:Node THEN node.url
+                       ELSE parent.url + '#' + toString(node.chunk_index)
+                   END as id,
+                   score"""
+
+VECTOR_BRANCH = """
+            CALL db.index.vector.queryNodes($vector_index, $limit, $embedding)
+            YIELD node, score
+            MATCH (node)<-[:HAS_CHUNK]-(parent:Node)
+            RETURN 'vector' as source,
+                   parent.title as name,
+                   node.content as content,
+                   parent.url + '#' + toString(node.chunk_index) as id,
+                   score"""
+
+# Pages linked to or from the pages of the top hits. Pages reached from several
+# hits rank first; PageRank favours authoritative pages while dividing by
+# log(degree) keeps index pages that link everywhere from crowding them out.
+GRAPH_BRANCH = """
+            CALL db.index.fulltext.queryNodes("content_fulltext_index", $fulltext_query)
+            YIELD node, score
+            WITH node, score
+            ORDER BY score DESC
+            LIMIT $limit
+            MATCH (node)<-[:HAS_CHUNK]-(seed:Node)
+            WITH collect(DISTINCT seed) as seeds
+            UNWIND seeds as seed
+            MATCH (seed)-[:LINKS_TO]-(neighbor:Node)
+            WHERE neighbor.deleted_at IS NULL AND NOT neighbor IN seeds
+            WITH neighbor, count(DISTINCT seed) as seed_links
+            WITH neighbor, seed_links * (1 + coalesce(neighbor.pagerank, 0.0))
+                 / log(2 + coalesce(neighbor.degree, 0)) as score
+            ORDER BY score DESC
+            LIMIT $expansion_limit
+            OPTIONAL MATCH (neighbor)-[:HAS_CHUNK]->(first:ContentChunk {chunk_index: 0})
+            RETURN 'neighbor' as source,
+                   neighbor.title as name,
+                   coalesce(first.content, left(neighbor.content, 800)) as content,
+                   CASE WHEN first IS NULL THEN neighbor.url ELSE neighbor.url + '#0' END as id,
+                   score"""
+
+EXAMPLE_BRANCH = """
+            CALL db.index.fulltext.queryNodes("code_example_fulltext_index", $example_query)
+            YIELD node, score
+            WITH node, score
+            ORDER BY score DESC
+            LIMIT $example_limit
+            MATCH (parent:Node)-[:HAS_EXAMPLE]->(node)
+            RETURN 'example' as source,
+                   parent.title + ' (example)' as name,
+                   node.code as content,
+                   parent.url + '#example-' + toString(node.example_index) as id,
+                   score"""
+
 class ThinkScriptKnowledgeBase:
     def __init__(self):
         neo4j_uri = os.getenv("NEO4J_URI", "neo4j://localhost:7687")
@@ -34,28 +153,141 @@ class ThinkScriptKnowledgeBase:
         print(f"Connecting to Neo4j at: {neo4j_uri}")
         self.driver = GraphDatabase.driver(
             neo4j_uri,
-            auth=(neo4j_user, neo4j_password)
+            auth=(neo4j_user, neo4j_password),
+            max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+            connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+            max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME
         )
         
-        # Initialize OpenAI client
+        # Initialize OpenAI client (async, so streaming never blocks the event loop;
+        # retries are handled by _generate_openai_response)
         openai_api_key = os.getenv("OPENAI_API_KEY")
         if openai_api_key:
-            self.openai_client = OpenAI(api_key=openai_api_key)
+            self.openai_client = AsyncOpenAI(api_key=openai_api_key, max_retries=0)
         else:
             self.openai_client = None
             
-        # Initialize Anthropic client
+        # Initialize Anthropic client (async, retries handled by _generate_claude_response)
         anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
         if anthropic_api_key:
-            self.anthropic_client = Anthropic(api_key=anthropic_api_key)
+            self.anthropic_client = AsyncAnthropic(api_key=anthropic_api_key, max_retries=0)
         else:
             self.anthropic_client = None
             
+        # Per-provider cap on concurrent upstream requests, adapted to 429s
+        self.limiters = {provider: AdaptiveLimiter(provider) for provider in ("openai", "anthropic")}
+        # Hedging and failover between models on top of generate_response
+        self.router = ModelRouter(self)
+            
+        # Created lazily by the embedding_provider property
+        self._embedding_provider = None
+        
+        # Cached ingestion generation (see current_generation)
+        self._generation = None
+        self._generation_checked_at = float('-inf')
+        
+        # Query results, invalidated when the generation changes
+        if RETRIEVAL_CACHE_MAX_ENTRIES > 0:
+            self.retrieval_cache = RetrievalCache(RETRIEVAL_CACHE_MAX_ENTRIES,
+                                                  int(RETRIEVAL_CACHE_MAX_MB * 1024 * 1024))
+        else:
+            self.retrieval_cache = None
+            
+        # Loaded by load_snapshot and rebuilt when the generation changes
+        self.corpus = SnapshotHolder(self.driver) if CORPUS_SNAPSHOT else None
+            
         self.setup_indexes()
 
     def close(self):
         self.driver.close()
 
+    def warmup(self, connections: int = NEO4J_WARMUP_CONNECTIONS):
+        """Open pooled connections and run the retrieval queries once before serving traffic.
+
+        This moves connection setup, Cypher planning of the retrieval query
+        variants and cold index/page-cache reads off the first user requests.
+        """
+        start = time.perf_counter()
+        self.driver.verify_connectivity()
+        
+        # Hold the transactions open together so the pool really opens that many connections
+        sessions = []
+        transactions = []
+        try:
+            for _ in range(connections):
+                session = self.driver.session()
+                sessions.append(session)
+                transaction = session.begin_transaction()
+                transactions.append(transaction)
+                transaction.run("RETURN 1").consume()
+        finally:
+            for transaction in transactions:
+                transaction.close()
+            for session in sessions:
+                session.close()
+        connected = time.perf_counter()
+        
+        for query in WARMUP_QUERIES:
+            self._search(normalize_query(query), 5, RETRIEVAL_MODE, {})
+        self.current_generation()
+        logger.info(f"Neo4j warmup: {connections} connections in {(connected - start) * 1000:.0f}ms, "
+                    f"retrieval primed in {(time.perf_counter() - connected) * 1000:.0f}ms")
+
+    def readiness(self) -> dict:
+        """Connectivity and index state for the /ready endpoint"""
+        required = list(REQUIRED_INDEXES)
+        if RETRIEVAL_MODE == "hybrid":
+            required.append(VECTOR_INDEX_NAME)
+        
+        start = time.perf_counter()
+        try:
+            with self.driver.session() as session:
+                session.run("RETURN 1").consume()
+                latency_ms = round((time.perf_counter() - start) * 1000, 1)
+                records = session.run("""
+                    SHOW INDEXES YIELD name, state
+                    WHERE name IN $names
+                    RETURN name, state
+                """, names=required).data()
+        except Exception as e:
+            return {'ready': False, 'neo4j': 'unavailable', 'error': str(e)}
+        
+        indexes = dict.fromkeys(required, 'MISSING')
+        indexes.update({record['name']: record['state'] for record in records})
+        return {
+            'ready': all(state == 'ONLINE' for state in indexes.values()),
+            'neo4j': 'ok',
+            'neo4j_ms': latency_ms,
+            'indexes': indexes
+        }
+
+    def current_generation(self) -> Optional[int]:
+        """Ingestion generation marker, re-read at most every GENERATION_POLL_SECONDS"""
+        now = time.monotonic()
+        if now - self._generation_checked_at >= GENERATION_POLL_SECONDS:
+            generation = read_generation(self.driver)
+            # Graphs ingested before the marker existed are generation 0 until the next ingestion
+            self._generation = generation if generation is not None else 0
+            self._generation_checked_at = now
+        return self._generation
+
+    def last_generation(self) -> Optional[int]:
+        """Generation as of the last read, without querying Neo4j (None before the first read)"""
+        return self._generation
+
+    def load_snapshot(self):
+        """Build the corpus snapshot for the current generation (API startup)"""
+        if self.corpus:
+            self.corpus.refresh(self.current_generation())
+            stats = self.corpus.snapshot.stats()
+            logger.info(f"Corpus snapshot: {stats['pages']} pages, {stats['symbols']} symbols, "
+                        f"{stats['text_bytes'] / 1e6:.1f}MB in {stats['load_ms']}ms")
+
+    def lookup_symbol(self, symbol: str, limit: int = 10) -> Optional[list]:
+        """Exact, prefix and fuzzy symbol matches from the snapshot, or None when it isn't loaded"""
+        snapshot = self.corpus.snapshot if self.corpus else None
+        return snapshot.lookup(symbol, limit) if snapshot is not None else None
+
     def setup_indexes(self):
         """Set up Neo4j indexes for better search performance"""
         with self.driver.session() as session:
@@ -69,9 +301,15 @@ class ThinkScriptKnowledgeBase:
                 CREATE FULLTEXT INDEX content_fulltext_index IF NOT EXISTS
                 FOR (n:ContentChunk) ON EACH [n.content]
             """)
+            # Identifier-friendly fulltext index for code examples
+            session.run(CODE_EXAMPLE_INDEX_QUERY)
+
+    @staticmethod
+    def split_content(content: str, chunk_size: int = 100) -> list:
+        """Split content into chunks of approximately chunk_size words.
 
-    def split_content(self, content: str, chunk_size: int = 100) -> list:
-        """Split content into chunks of approximately chunk_size words"""
+        Legacy word-based splitter; ingestion uses chunker.chunk_rows.
+        """
         # Split content into sentences
         sentences = re.split(r'(?<=[.!?])\s+', content)
         chunks = []
@@ -92,59 +330,158 @@ class ThinkScriptKnowledgeBase:
 
         return chunks
 
-    def find_relevant_nodes(self, query: str) -> list:
-        print(f"\nSearching for: {query}")
+    @staticmethod
+    def escape_fulltext_query(query: str) -> str:
+        """Escape Lucene query syntax so free-form questions can't break the fulltext search"""
+        return re.sub(r'([+\-&|!(){}\[\]^"~*?:\\/])', r'\\\1', query)
+
+    @property
+    def embedding_provider(self):
+        """Query-side embedding provider, created on first hybrid search"""
+        if self._embedding_provider is None:
+            self._embedding_provider = get_embedding_provider()
+        return self._embedding_provider
+
+    def find_relevant_nodes(self, query: str, limit: int = 5, mode: Optional[str] = None,
+                            timings: Optional[dict] = None) -> list:
+        """Exact title match, else `mode` search: fulltext (BM25), hybrid (BM25 + vector) or graph.
+
+        Questions asking for an example also search CodeExample nodes, which rank first.
+        Graph mode appends up to GRAPH_EXPANSION_LIMIT pages linked to the hits.
+
+        Results are cached per (query, mode, limit) until the ingestion generation changes.
+        Per-stage durations are added to `timings` when given.
+        """
+        timings = timings if timings is not None else {}
+        mode = mode or RETRIEVAL_MODE
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        # Cached and searched in the same form, so equivalent spellings share an entry
+        query = normalize_query(query)
+        
+        start = time.perf_counter()
+        cache = self.retrieval_cache
+        if cache:
+            cache.check_generation(self.current_generation())
+            key = cache.make_key(query, mode, limit)
+            nodes = cache.get(key)
+            if nodes is not None:
+                elapsed = time.perf_counter() - start
+                cache.record(True, elapsed)
+                RETRIEVAL_SECONDS.observe(elapsed, mode=mode, cache="hit")
+                timings['retrieval_cache'] = "hit"
+                return nodes
+        
+        logger.debug(f"Searching for: {query} ({mode})")
+        nodes = self._search(query, limit, mode, timings)
+        logger.debug(f"Found {len(nodes)} matches")
+        
+        elapsed = time.perf_counter() - start
+        if cache:
+            cache.put(key, nodes)
+            cache.record(False, elapsed)
+        RETRIEVAL_SECONDS.observe(elapsed, mode=mode, cache="miss" if cache else "off")
+        timings['retrieval_cache'] = "miss" if cache else None
+        return nodes
+
+    def _search(self, query: str, limit: int, mode: str, timings: dict) -> list:
+        """Run the exact title probe and the ranked search(es) in a single round trip"""
+        hybrid = mode == "hybrid" and self.embedding_provider is not None
+        params = {
+            "query": query,
+            "fulltext_query": self.escape_fulltext_query(query),
+            "limit": limit * HYBRID_CANDIDATE_FACTOR if hybrid else limit
+        }
+        # A snapshot of the current generation answers the exact title probe in memory
+        snapshot = self.corpus.fresh(self.current_generation()) if self.corpus else None
+        if snapshot is not None:
+            page = snapshot.exact(query)
+            timings['corpus_snapshot'] = "hit" if page else "miss"
+            if page:
+                self.corpus.hits += 1
+                return [page]
+            self.corpus.misses += 1
+            branches = [FULLTEXT_BRANCH]
+        else:
+            branches = [EXACT_TITLE_BRANCH, FULLTEXT_BRANCH]
+        if hybrid:
+            branches.append(VECTOR_BRANCH)
+            params.update(vector_index=VECTOR_INDEX_NAME, embedding=self.embedding_provider.embed_query(query))
+        if mode == "graph":
+            branches.append(GRAPH_BRANCH)
+            params["expansion_limit"] = GRAPH_EXPANSION_LIMIT
+        subject = example_query(query)
+        if subject:
+            branches.append(EXAMPLE_BRANCH)
+            params.update(example_query=self.escape_fulltext_query(subject), example_limit=EXAMPLE_LIMIT)
+        
+        try:
+            rows = self._run_search(branches, params, timings)
+        except Exception as e:
+            if not hybrid:
+                raise
+            # e.g. vector index not built yet; degrade to fulltext only
+            logger.error(f"Vector search failed: {str(e)}")
+            rows = self._run_search([branch for branch in branches if branch is not VECTOR_BRANCH], params,
+                                    timings)
+        
+        rankings = {"exact": [], "fulltext": [], "vector": [], "example": [], "neighbor": []}
+        for row in sorted(rows, key=lambda row: row['score'], reverse=True):
+            rankings[row['source']].append({'id': row['id'], 'name': row['name'], 'content': row['content']})
+        
+        if rankings["exact"]:
+            logger.debug("Found exact title match")
+            return rankings["exact"]
+        if hybrid:
+            nodes = self.fuse_rankings([rankings["fulltext"], rankings["vector"]], limit)
+        else:
+            nodes = rankings["fulltext"]
+        
+        if rankings["example"]:
+            # Examples answer the question directly; drop prose chunks repeating the same code
+            logger.debug(f"Found {len(rankings['example'])} code examples")
+            codes = {example['content'] for example in rankings["example"]}
+            nodes = rankings["example"] + [node for node in nodes if node['content'] not in codes]
+        nodes = nodes[:limit]
+        
+        if rankings["neighbor"]:
+            # Linked pages come after the direct hits, on top of `limit`
+            ids = {node['id'] for node in nodes}
+            nodes += [node for node in rankings["neighbor"] if node['id'] not in ids]
+        return nodes
+
+    def _run_search(self, branches: List[str], params: dict, timings: dict) -> list:
+        query = "CALL {" + "\n            UNION ALL".join(branches) + "\n        }\n        RETURN source, name, content, id, score"
+        opened = time.perf_counter()
+        
+        def work(tx):
+            # The transaction function starts once a pooled connection is held
+            acquired = time.perf_counter()
+            rows = tx.run(query, params).data()
+            finished = time.perf_counter()
+            NEO4J_SESSION_ACQUIRE_SECONDS.observe(acquired - opened)
+            NEO4J_QUERY_SECONDS.observe(finished - acquired)
+            timings['session_acquire_ms'] = round((acquired - opened) * 1000, 1)
+            timings['neo4j_query_ms'] = round((finished - acquired) * 1000, 1)
+            return rows
         
         with self.driver.session() as session:
-            # First try exact title match
-            result = session.run("""
-                MATCH (n:Node)
-                WHERE n.title = $query
-                RETURN n.title as name, n.content as content
-                LIMIT 1
-            """, {"query": query})
-            
-            exact_match = list(result)
-            if exact_match:
-                print("Found exact title match")
-                return [{
-                    'name': record['name'],
-                    'content': record['content']
-                } for record in exact_match]
-            
-            # If no exact match, try fulltext search on both Node and ContentChunk
-            result = session.run("""
-                CALL db.index.fulltext.queryNodes("content_fulltext_index", $query)
-                YIELD node, score
-                WITH node, score
-                MATCH (node)
-                WHERE node:Node OR node:ContentChunk
-                WITH node, score
-                ORDER BY score DESC
-                LIMIT 5
-                RETURN 
-                    CASE 
-                        WHEN node:Node THEN node.title
-                        ELSE [(node)<-[:HAS_CHUNK]-(parent:Node) | parent.title][0]
-                    END as name,
-                    CASE 
-                        WHEN node:Node THEN node.content
-                        ELSE node.content
-                    END as content,
-                    score
-            """, {"query": query})
-            
-            nodes = []
-            for record in result:
-                nodes.append({
-                    'name': record['name'],
-                    'content': record['content']
-                })
-            
-            print(f"Found {len(nodes)} matches")
-            return nodes
+            return session.execute_read(work)
 
-    def generate_response(
+    @staticmethod
+    def fuse_rankings(rankings: List[list], limit: int) -> list:
+        """Fuse rankings with reciprocal rank fusion"""
+        scores = {}
+        nodes = {}
+        for ranking in rankings:
+            for rank, node in enumerate(ranking):
+                scores[node['id']] = scores.get(node['id'], 0.0) + 1.0 / (RRF_K + rank + 1)
+                nodes.setdefault(node['id'], node)
+        
+        ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [nodes[node_id] for node_id in ranked]
+
+    async def generate_response(
         self,
         messages: List[Dict[str, str]],
         stream: bool = True,
@@ -152,32 +489,44 @@ class ThinkScriptKnowledgeBase:
         max_tokens: Optional[int] = None,
         timeout: Optional[int] = None,
         retries: Optional[int] = None,
-        model: str = "gpt-3.5-turbo"
+        model: str = "gpt-3.5-turbo",
+        timings: Optional[dict] = None
     ) -> Any:
         """
         Generate a response using either OpenAI or Anthropic API with streaming support.
+        With stream=True this returns an async iterator of text deltas for either provider.
+        `timeout` applies per attempt and `retries` is the number of attempts.
+        Retries and time spent queued for a concurrency slot are recorded in `timings` when given.
+        Raises UpstreamOverloaded when the request is shed.
         """
+        timings = timings if timings is not None else {}
         # Use provided values or defaults
         timeout = timeout or 30  # seconds
         retries = retries or 3
+        messages = self.recent_turns(messages)
         
         # Determine which API to use based on model
         if model.startswith('claude'):
             if not self.anthropic_client:
                 raise ValueError("Anthropic API key not configured")
-            return self._generate_claude_response(messages, stream, temperature, max_tokens, model)
+            return await self._generate_claude_response(messages, stream, temperature, max_tokens, model,
+                                                        timeout, retries, timings)
         else:
             if not self.openai_client:
                 raise ValueError("OpenAI API key not configured")
-            return self._generate_openai_response(messages, stream, temperature, max_tokens, model)
+            return await self._generate_openai_response(messages, stream, temperature, max_tokens, model,
+                                                        timeout, retries, timings)
 
-    def _generate_openai_response(
+    async def _generate_openai_response(
         self,
         messages: List[Dict[str, str]],
         stream: bool,
         temperature: float,
         max_tokens: Optional[int],
-        model: str
+        model: str,
+        timeout: int = 30,
+        retries: int = 3,
+        timings: Optional[dict] = None
     ) -> Any:
         """Generate response using OpenAI API"""
         params = {
@@ -189,67 +538,145 @@ class ThinkScriptKnowledgeBase:
         
         if max_tokens:
             params["max_tokens"] = max_tokens
-            
-        self.openai_client.timeout = 30
         
-        for attempt in range(3):
+        response = await self._call_upstream(
+            "openai", lambda attempt_timeout: self.openai_client.chat.completions.create(timeout=attempt_timeout,
+                                                                                        **params),
+            timeout, retries, timings)
+        if stream:
+            return self.limiters["openai"].hold(self._iter_openai_text(response))
+        self._finish_upstream("openai")
+        return response.choices[0].message.content
+
+    async def _call_upstream(self, provider: str, create, timeout: float, retries: int,
+                             timings: Optional[dict] = None) -> Any:
+        """Run create(attempt_timeout) holding one of the provider's concurrency slots.
+
+        Failed attempts give the slot back before backing off (jittered, or as long
+        as Retry-After asks) and are retried while the error is transient and the
+        LLM_DEADLINE_SECONDS budget allows. On success the slot is still held:
+        the caller releases it with limiter.hold(stream), or _finish_upstream.
+        """
+        limiter = self.limiters[provider]
+        deadline = time.monotonic() + LLM_DEADLINE_SECONDS
+        for attempt in range(retries):
+            waited = await limiter.acquire(deadline)
+            if timings is not None:
+                timings['queue_ms'] = round((timings.get('queue_ms') or 0) + waited * 1000, 1)
             try:
-                if stream:
-                    return self.openai_client.chat.completions.create(**params)
-                else:
-                    response = self.openai_client.chat.completions.create(**params)
-                    return response.choices[0].message.content
+                response = await create(max(1.0, min(timeout, deadline - time.monotonic())))
             except Exception as e:
-                logger.error(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt < 2:
-                    time.sleep(1)
-                else:
+                limiter.release()
+                retry_after = retry_after_seconds(e)
+                if status_code(e) == 429:
+                    LLM_RATE_LIMITED.inc(provider=provider)
+                if is_overload(e):
+                    limiter.on_overloaded(retry_after)
+                logger.error(f"{provider} attempt {attempt + 1} failed: {str(e)}")
+                delay = backoff_delay(attempt, retry_after)
+                if attempt == retries - 1 or not is_retryable(e) or time.monotonic() + delay >= deadline:
+                    if status_code(e) == 429:
+                        raise UpstreamOverloaded(f"The {provider} model is rate limiting requests; please retry shortly",
+                                                 retry_after=round(retry_after or 1.0, 1)) from e
                     raise
+                self._record_retry(provider, timings)
+                # Backoff without holding a slot or blocking other requests
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Cancelled mid-request (client gone, coalesced stream abandoned)
+                limiter.release()
+                raise
+            else:
+                return response
+
+    def _finish_upstream(self, provider: str):
+        """Give back the slot of a non-streaming response"""
+        self.limiters[provider].release()
+        self.limiters[provider].on_success()
+
+    @staticmethod
+    def _record_retry(provider: str, timings: Optional[dict]):
+        LLM_RETRIES.inc(provider=provider)
+        if timings is not None:
+            timings['retries'] = timings.get('retries', 0) + 1
+
+    @staticmethod
+    async def _iter_openai_text(response) -> AsyncIterator[str]:
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    @staticmethod
+    def recent_turns(messages: List[Dict[str, str]], max_turns: int = MAX_HISTORY_TURNS) -> List[Dict[str, str]]:
+        """System messages plus the last max_turns user/assistant turns, in their original order"""
+        turns = [i for i, msg in enumerate(messages) if msg["role"] != "system"]
+        if max_turns <= 0 or len(turns) <= max_turns:
+            return messages
+        first_kept = turns[-max_turns]
+        return [msg for i, msg in enumerate(messages) if msg["role"] == "system" or i >= first_kept]
+
+    @staticmethod
+    def to_anthropic_messages(messages: List[Dict[str, str]]) -> tuple:
+        """Map chat messages to Anthropic's (system, messages) format, preserving order.
+
+        Anthropic requires alternating turns that start and end with the user, so
+        consecutive same-role turns are merged and leading/trailing assistant turns
+        (which add nothing to answering the latest question) are dropped.
+        """
+        system_parts = [msg["content"] for msg in messages if msg["role"] == "system" and msg["content"]]
+        conversation = []
+        for msg in messages:
+            if msg["role"] not in ("user", "assistant") or not msg["content"]:
+                continue
+            if not conversation and msg["role"] == "assistant":
+                continue
+            if conversation and conversation[-1]["role"] == msg["role"]:
+                conversation[-1]["content"] += "\n\n" + msg["content"]
+            else:
+                conversation.append({"role": msg["role"], "content": msg["content"]})
+        while conversation and conversation[-1]["role"] == "assistant":
+            conversation.pop()
+        return "\n\n".join(system_parts), conversation
 
-    def _generate_claude_response(
+    async def _generate_claude_response(
         self,
         messages: List[Dict[str, str]],
         stream: bool,
         temperature: float,
         max_tokens: Optional[int],
-        model: str
+        model: str,
+        timeout: int = 30,
+        retries: int = 3,
+        timings: Optional[dict] = None
     ) -> Any:
         """Generate response using Anthropic API"""
-        # Convert messages to Anthropic format
-        system_message = next((msg for msg in messages if msg["role"] == "system"), None)
-        user_messages = [msg for msg in messages if msg["role"] == "user"]
-        assistant_messages = [msg for msg in messages if msg["role"] == "assistant"]
-        
-        # Combine messages into conversation
-        conversation = []
-        for user_msg, assistant_msg in zip(user_messages, assistant_messages):
-            conversation.append({"role": "user", "content": user_msg["content"]})
-            if assistant_msg:
-                conversation.append({"role": "assistant", "content": assistant_msg["content"]})
+        system, conversation = self.to_anthropic_messages(messages)
+        if not conversation:
+            raise ValueError("No user message to answer")
         
         params = {
             "model": model,
             "messages": conversation,
             "temperature": temperature,
-            "stream": stream
+            "stream": stream,
+            # max_tokens is required by the Messages API
+            "max_tokens": max_tokens or 1024
         }
-        
-        if max_tokens:
-            params["max_tokens"] = max_tokens
             
-        if system_message:
-            params["system"] = system_message["content"]
+        if system:
+            params["system"] = system
             
-        for attempt in range(3):
-            try:
-                if stream:
-                    return self.anthropic_client.messages.stream(**params)
-                else:
-                    response = self.anthropic_client.messages.create(**params)
-                    return response.content[0].text
-            except Exception as e:
-                logger.error(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt < 2:
-                    time.sleep(1)
-                else:
-                    raise 
\ No newline at end of file
+        response = await self._call_upstream(
+            "anthropic", lambda attempt_timeout: self.anthropic_client.messages.create(timeout=attempt_timeout,
+                                                                                      **params),
+            timeout, retries, timings)
+        if stream:
+            return self.limiters["anthropic"].hold(self._iter_claude_text(response))
+        self._finish_upstream("anthropic")
+        return "".join(block.text for block in response.content if block.type == "text")
+
+    @staticmethod
+    async def _iter_claude_text(response) -> AsyncIterator[str]:
+        async for event in response:
+            if event.type == "content_block_delta" and event.delta.type == "text_delta":
+                yield event.delta.text
@@ -0,0 +1,102 @@
+import time
+from typing import Dict, List, Tuple
+
+from ingest import DEFAULT_BATCH_SIZE, write_batches
+
+# Relationships are rebuilt from Node.links after every ingestion run, so links
+# to pages that arrive later in the crawl still resolve
+LINKS_CLEAR_QUERY = """
+    MATCH (:Node)-[r:LINKS_TO]->(:Node)
+    CALL { WITH r DELETE r } IN TRANSACTIONS OF 10000 ROWS
+"""
+
+# Each target url is resolved through the node_url uniqueness constraint;
+# links to pages outside the crawl simply don't match
+LINKS_BUILD_QUERY = """
+    MATCH (source:Node)
+    WHERE source.links IS NOT NULL AND source.deleted_at IS NULL
+    CALL {
+        WITH source
+        UNWIND source.links AS target_url
+        MATCH (target:Node {url: target_url})
+        WHERE target <> source AND target.deleted_at IS NULL
+        MERGE (source)-[:LINKS_TO]->(target)
+    } IN TRANSACTIONS OF 500 ROWS
+"""
+
+LINK_EDGES_QUERY = """
+    MATCH (source:Node)-[:LINKS_TO]->(target:Node)
+    RETURN source.url as source, target.url as target
+"""
+
+LIVE_URLS_QUERY = """
+    MATCH (n:Node)
+    WHERE n.url IS NOT NULL AND n.deleted_at IS NULL
+    RETURN n.url as url
+"""
+
+SET_RANKS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (n:Node {url: row.url})
+    SET n.pagerank = row.pagerank,
+        n.in_degree = row.in_degree,
+        n.out_degree = row.out_degree,
+        n.degree = row.in_degree + row.out_degree
+"""
+
+
+def pagerank(urls: List[str], edges: List[Tuple[str, str]], damping: float = 0.85,
+             iterations: int = 100, tolerance: float = 1e-8) -> Dict[str, float]:
+    """Power-iteration PageRank, scaled so the highest-ranked page scores 1.0"""
+    if not urls:
+        return {}
+    index = {url: i for i, url in enumerate(urls)}
+    count = len(urls)
+    outgoing = [[] for _ in urls]
+    for source, target in edges:
+        if source in index and target in index:
+            outgoing[index[source]].append(index[target])
+
+    ranks = [1.0 / count] * count
+    for _ in range(iterations):
+        # Pages without outgoing links spread their rank evenly
+        dangling = sum(ranks[i] for i in range(count) if not outgoing[i])
+        base = (1.0 - damping) / count + damping * dangling / count
+        new_ranks = [base] * count
+        for i, targets in enumerate(outgoing):
+            if targets:
+                share = damping * ranks[i] / len(targets)
+                for j in targets:
+                    new_ranks[j] += share
+        delta = sum(abs(a - b) for a, b in zip(ranks, new_ranks))
+        ranks = new_ranks
+        if delta < tolerance:
+            break
+
+    top = max(ranks)
+    return {url: ranks[i] / top for url, i in index.items()}
+
+
+def build_link_graph(driver, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Rebuild LINKS_TO from Node.links, then store pagerank and degree on every live Node"""
+    start = time.perf_counter()
+    with driver.session() as session:
+        session.run(LINKS_CLEAR_QUERY).consume()
+        session.run(LINKS_BUILD_QUERY).consume()
+        edges = [(record['source'], record['target']) for record in session.run(LINK_EDGES_QUERY)]
+        urls = [record['url'] for record in session.run(LIVE_URLS_QUERY)]
+
+    ranks = pagerank(urls, edges)
+    in_degree = dict.fromkeys(urls, 0)
+    out_degree = dict.fromkeys(urls, 0)
+    for source, target in edges:
+        if source in out_degree and target in in_degree:
+            out_degree[source] += 1
+            in_degree[target] += 1
+
+    rows = ({'url': url, 'pagerank': ranks[url], 'in_degree': in_degree[url], 'out_degree': out_degree[url]}
+            for url in urls)
+    write_batches(driver, SET_RANKS_QUERY, rows, batch_size, label="page ranks")
+    print(f"Link graph: {len(edges)} links between {len(urls)} pages "
+          f"in {time.perf_counter() - start:.2f}s")
+    return len(edges)
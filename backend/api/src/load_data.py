@@ -1,7 +1,14 @@
-import json
 import os
+import sys
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
+from crawl_reader import iter_crawl_items
+from ingest import DEFAULT_BATCH_SIZE, bump_generation, ensure_constraints, load_nodes
+from incremental import sync_crawl
+from link_graph import build_link_graph
+from embeddings import get_embedding_provider
+from chunker import chunk_rows
+from code_examples import ensure_code_example_index
 
 load_dotenv()
 
@@ -28,28 +35,16 @@ class DataLoader:
         with self.driver.session() as session:
             # Only create index on title for searching
             session.run("CREATE INDEX node_title IF NOT EXISTS FOR (n:Node) ON (n.title)")
+        # Nodes are upserted by url
+        ensure_constraints(self.driver)
+        ensure_code_example_index(self.driver)
 
-    def load_data(self, file_path: str):
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-
-        print(f"Found {len(data)} items in JSON file")
-        
-        with self.driver.session() as session:
-            for item in data:
-                title = item.get('title', '')
-                content = item.get('content', '')
-
-                # Create node with content as a non-indexed property
-                session.run("""
-                    CREATE (n:Node {
-                        title: $title,
-                        content: $content
-                    })
-                """, {
-                    "title": title,
-                    "content": content
-                })
+    def load_data(self, file_path: str, mode: str = "bulk", batch_size: int = DEFAULT_BATCH_SIZE):
+        # Items are streamed from the file straight into the batched writer
+        stats = load_nodes(self.driver, iter_crawl_items(file_path), mode=mode, batch_size=batch_size)
+        print(f"Ingested {stats}")
+        build_link_graph(self.driver)
+        bump_generation(self.driver)
 
         # Print statistics after loading
         with self.driver.session() as session:
@@ -62,6 +57,12 @@ class DataLoader:
             for record in result:
                 print(f"- {record['title']}")
 
+    def sync_data(self, file_path: str, removal_mode: str = "delete"):
+        """Apply only the differences between a crawl file and the graph"""
+        summary = sync_crawl(self.driver, iter_crawl_items(file_path), chunk_rows,
+                             removal_mode=removal_mode, embedding_provider=get_embedding_provider())
+        summary.print_report()
+
     def determine_type(self, url: str) -> str:
         if "function" in url.lower():
             return "Function"
@@ -74,9 +75,35 @@ class DataLoader:
         else:
             return "Documentation"
 
+def find_latest_crawl(data_dir: str = "/app/data/crawls") -> str:
+    # Look for the most recent crawl file in the data/crawls directory
+    crawl_files = [f for f in os.listdir(data_dir) if f.startswith("thinkscript_data_") and f.endswith((".json", ".jsonl"))]
+    if not crawl_files:
+        raise FileNotFoundError(f"No crawl files found in {data_dir}")
+    
+    # Sort by timestamp in filename and get the most recent
+    latest_file = sorted(crawl_files)[-1]
+    return os.path.join(data_dir, latest_file)
+
 def main():
+    # --sync applies an incremental diff instead of wiping and reloading;
+    # --tombstone marks removed pages instead of deleting them
+    incremental = "--sync" in sys.argv
+    removal_mode = "tombstone" if "--tombstone" in sys.argv else "delete"
+
     loader = DataLoader()
     try:
+        if incremental:
+            print("Creating indexes...")
+            loader.create_indexes()
+
+            data_file = find_latest_crawl()
+            print(f"Syncing crawl file: {data_file}")
+            loader.sync_data(data_file, removal_mode=removal_mode)
+
+            print("\nIncremental sync completed successfully!")
+            return
+
         print("Clearing existing data and indexes...")
         loader.clear_data()
         
@@ -84,15 +111,7 @@ def main():
         loader.create_indexes()
         
         print("Loading data...")
-        # Look for the most recent crawl file in the data/crawls directory
-        data_dir = "/app/data/crawls"
-        crawl_files = [f for f in os.listdir(data_dir) if f.startswith("thinkscript_data_") and f.endswith(".json")]
-        if not crawl_files:
-            raise FileNotFoundError("No crawl files found in /app/data/crawls")
-        
-        # Sort by timestamp in filename and get the most recent
-        latest_file = sorted(crawl_files)[-1]
-        data_file = os.path.join(data_dir, latest_file)
+        data_file = find_latest_crawl()
         print(f"Using crawl file: {data_file}")
         
         loader.load_data(data_file)
@@ -1,13 +1,61 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 from knowledge_base import ThinkScriptKnowledgeBase
+from answer_cache import create_answer_cache, make_cache_key, replay_chunks
+from conversations import ConversationStore
+from metrics import (CHAT_COALESCED, CHAT_REQUESTS, CHAT_STREAM_SECONDS, LLM_FIRST_TOKEN_SECONDS,
+                     LLM_TOKENS_PER_SECOND, PROMPT_TOKENS, PROMPT_TURNS_DROPPED, REGISTRY)
+from prompt_builder import build_prompt
+from single_flight import CHAT_COALESCING, SingleFlight, flight_key
+from upstream_limiter import UpstreamOverloaded
+from model_router import provider_of
 import json
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import asyncio
+import logging
+import os
+import time
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Retrieval stage configuration
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+RETRIEVAL_TIMEOUT_MS = int(os.getenv("RETRIEVAL_TIMEOUT_MS", "800"))
+# Output cap per answer; input size is bounded by prompt_builder.PROMPT_TOKEN_BUDGET
+MAX_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", "1000"))
+
+# Pre-open Neo4j connections and prime retrieval before accepting traffic
+NEO4J_WARMUP = os.getenv("NEO4J_WARMUP", "true").lower() != "false"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The knowledge base (driver pool, indexes, retrieval cache) lives as long as the app
+    app.state.kb = await asyncio.to_thread(ThinkScriptKnowledgeBase)
+    # Answer cache for repeated questions (ANSWER_CACHE_BACKEND=memory|sqlite|none)
+    app.state.answer_cache = create_answer_cache()
+    # Server-side chat history for /conversations clients
+    app.state.conversations = ConversationStore()
+    # Identical questions asked while an answer is streaming share that stream
+    app.state.inflight = SingleFlight() if CHAT_COALESCING else None
+    if NEO4J_WARMUP:
+        try:
+            await asyncio.to_thread(app.state.kb.warmup)
+        except Exception as e:
+            # Serve anyway; /ready reports whether Neo4j is usable
+            logger.error(f"Neo4j warmup failed: {str(e)}")
+    try:
+        await asyncio.to_thread(app.state.kb.load_snapshot)
+    except Exception as e:
+        # Exact title lookups go to Neo4j until a rebuild succeeds
+        logger.error(f"Corpus snapshot load failed: {str(e)}")
+    yield
+    app.state.conversations.close()
+    app.state.kb.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -18,8 +66,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize knowledge base
-kb = ThinkScriptKnowledgeBase()
+def _retrieval_cache():
+    kb = getattr(app.state, "kb", None)
+    return kb.retrieval_cache if kb else None
+
+def _answer_cache():
+    return getattr(app.state, "answer_cache", None)
+
+def _corpus():
+    kb = getattr(app.state, "kb", None)
+    return kb.corpus if kb else None
+
+# Cache counters are read when /metrics is scraped
+REGISTRY.callback("thinkscript_retrieval_cache_hits_total", "Retrieval cache hits",
+                  lambda: _retrieval_cache().hits if _retrieval_cache() else None, type="counter")
+REGISTRY.callback("thinkscript_retrieval_cache_misses_total", "Retrieval cache misses",
+                  lambda: _retrieval_cache().misses if _retrieval_cache() else None, type="counter")
+REGISTRY.callback("thinkscript_retrieval_cache_bytes", "Approximate retrieval cache size",
+                  lambda: _retrieval_cache().stats()['bytes'] if _retrieval_cache() else None)
+REGISTRY.callback("thinkscript_answer_cache_hits_total", "Answer cache hits",
+                  lambda: _answer_cache().hits if _answer_cache() else None, type="counter")
+REGISTRY.callback("thinkscript_answer_cache_misses_total", "Answer cache misses",
+                  lambda: _answer_cache().misses if _answer_cache() else None, type="counter")
+REGISTRY.callback("thinkscript_corpus_snapshot_hits_total", "Exact title lookups answered by the corpus snapshot",
+                  lambda: _corpus().hits if _corpus() else None, type="counter")
+REGISTRY.callback("thinkscript_corpus_snapshot_pages", "Pages in the corpus snapshot",
+                  lambda: len(_corpus().snapshot) if _corpus() and _corpus().snapshot is not None else None)
 
 class Message(BaseModel):
     role: str
@@ -28,23 +100,54 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     messages: List[Message]
     model: str = "gpt-3.5-turbo"  # Default to GPT-3.5
+    include_timings: bool = False  # Emit a final {"timings": {...}} event
+
+class ConversationRequest(BaseModel):
+    model: Optional[str] = None
+    messages: List[Message] = []  # Earlier turns to seed the conversation with
+
+class TurnRequest(BaseModel):
+    content: str
+    model: Optional[str] = None  # Defaults to the model the conversation was created with
+    include_timings: bool = False
 
 @app.get("/")
 async def root():
     return {"message": "ThinkScript API is running"}
 
-async def stream_response(messages, model: str):
+def lookup_context(kb: ThinkScriptKnowledgeBase, query: str, stage_timings: dict) -> tuple:
+    """Blocking retrieval: (ingestion generation, top-k nodes)"""
+    generation = kb.current_generation()
+    return generation, kb.find_relevant_nodes(query, RETRIEVAL_TOP_K, timings=stage_timings)
+
+async def retrieve_context(kb: ThinkScriptKnowledgeBase, query: str, timings: dict) -> tuple:
+    """Run the Neo4j lookup off the event loop, giving up after RETRIEVAL_TIMEOUT_MS.
+
+    Returns (nodes, generation). After a timeout the last known generation is returned
+    with no nodes, so the answer cache still applies; it is None when retrieval failed.
+    """
+    start = time.perf_counter()
+    # Filled by the worker thread, which may outlive a timeout, so merged only on success
+    stage_timings = {}
     try:
-        # Convert messages to the format expected by the API
-        formatted_messages = [
-            {"role": msg.role, "content": msg.content}
-            for msg in messages
-        ]
-        
-        # Add system message
-        formatted_messages.insert(0, {
-            "role": "system",
-            "content": """You are a helpful assistant that answers questions about ThinkScript programming language.
+        generation, nodes = await asyncio.wait_for(
+            asyncio.to_thread(lookup_context, kb, query, stage_timings),
+            timeout=RETRIEVAL_TIMEOUT_MS / 1000
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Retrieval timed out after {RETRIEVAL_TIMEOUT_MS}ms, answering without context")
+        timings['retrieval_timed_out'] = True
+        generation, nodes = kb.last_generation(), []
+    except Exception as e:
+        logger.error(f"Retrieval failed, answering without context: {str(e)}")
+        generation, nodes = None, []
+    else:
+        timings.update(stage_timings)
+    timings['retrieval_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    timings['retrieved'] = len(nodes)
+    return nodes, generation
+
+SYSTEM_PROMPT = """You are a helpful assistant that answers questions about ThinkScript programming language.
                          Your responses should be:
                          1. Clear and concise
                          2. Include code examples when relevant
@@ -55,37 +158,236 @@ async def stream_response(messages, model: str):
                          If you find multiple relevant pieces of information, combine them to provide a comprehensive answer.
                          If you're not sure about something, say so rather than making assumptions.
                          Always format code examples with proper indentation and comments."""
-        })
+
+async def generate_answer(kb: ThinkScriptKnowledgeBase, formatted_messages: list, model: str,
+                          temperature: float, timings: dict):
+    """Stream text deltas from the LLM, recording time-to-first-token, duration and throughput.
+
+    The router may serve the answer from a fallback model; metrics are labelled with the model that answered.
+    """
+    llm_start = time.perf_counter()
+    first_token_at = None
+    characters = 0
+    response = kb.router.stream(formatted_messages, model, temperature, MAX_OUTPUT_TOKENS, timings)
+    
+    # Text deltas from whichever model answered first
+    async for text in response:
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            model = timings['routing']['served']
+            provider = provider_of(model)
+            timings['llm_first_token_ms'] = round((first_token_at - llm_start) * 1000, 1)
+            LLM_FIRST_TOKEN_SECONDS.observe(first_token_at - llm_start, provider=provider, model=model)
+        characters += len(text)
+        yield text
+    
+    finished = time.perf_counter()
+    timings['llm_ms'] = round((finished - llm_start) * 1000, 1)
+    if first_token_at is not None:
+        # ~4 characters per token
+        timings['output_tokens'] = characters // 4 + 1
+        if finished > first_token_at:
+            tokens_per_second = timings['output_tokens'] / (finished - first_token_at)
+            timings['tokens_per_s'] = round(tokens_per_second, 1)
+            LLM_TOKENS_PER_SECOND.observe(tokens_per_second, provider=provider, model=model)
+
+async def stream_response(kb: ThinkScriptKnowledgeBase, answer_cache, messages: List[dict], model: str,
+                          include_timings: bool = False, on_answer=None, inflight: Optional[SingleFlight] = None):
+    """SSE stream answering the last user message; on_answer(text) is awaited with a completed answer.
+
+    With `inflight`, a request whose prompt matches a stream already running
+    attaches to it instead of calling the LLM again.
+    """
+    timings = {'retrieval_ms': None, 'retrieval_timed_out': False, 'retrieved': 0, 'retrieval_cache': None,
+               'corpus_snapshot': None, 'session_acquire_ms': None, 'neo4j_query_ms': None, 'cache': None,
+               'llm_first_token_ms': None, 'llm_ms': None, 'output_tokens': None, 'tokens_per_s': None,
+               'retries': 0, 'queue_ms': None, 'routing': None, 'prompt': None, 'coalesced': None, 'total_ms': None}
+    temperature = 0.7
+    request_start = time.perf_counter()
+    outcome = "error"
+    try:
+        # Convert messages to the format expected by the API
+        formatted_messages = [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in messages
+        ]
         
-        # Get streaming response
-        response = kb.generate_response(
-            messages=formatted_messages,
-            stream=True,
-            temperature=0.7,
-            max_tokens=1000,
-            model=model
-        )
+        # Retrieve documentation for the latest user question
+        query = next((msg["content"] for msg in reversed(formatted_messages) if msg["role"] == "user"), "")
+        nodes, generation = await retrieve_context(kb, query, timings) if query.strip() else ([], None)
         
-        # Stream the response
-        if model.startswith('claude'):
-            async for chunk in response:
-                if chunk.type == 'content_block_delta':
-                    yield f"data: {json.dumps({'content': chunk.delta.text})}\n\n"
+        # Only first questions are cacheable: follow-ups depend on the earlier answers
+        cache_key = None
+        cached = None
+        if answer_cache and generation is not None and not any(msg["role"] == "assistant" for msg in formatted_messages):
+            answer_cache.check_generation(generation)
+            cache_key = make_cache_key(query, model, temperature, [node['id'] for node in nodes], generation)
+            cached = await asyncio.to_thread(answer_cache.get, cache_key)
+            timings['cache'] = 'miss' if cached is None else 'hit'
+        
+        if cached is not None:
+            # Replay the cached answer in the same event format as a live stream
+            for piece in replay_chunks(cached):
+                yield f"data: {json.dumps({'content': piece})}\n\n"
         else:
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    yield f"data: {json.dumps({'content': chunk.choices[0].delta.content})}\n\n"
+            # System prompt, documentation, history and latest turn within the token budget
+            prompt_messages, prompt_stats = build_prompt(formatted_messages, nodes, model, SYSTEM_PROMPT)
+            timings['prompt'] = prompt_stats.to_dict()
+            
+            # Cache only answers that streamed to completion from the requested model;
+            # a fallback's answer must not be replayed as the requested model's
+            async def cache_answer(text: str, answer_timings: dict):
+                if cache_key and text and (answer_timings.get('routing') or {}).get('served') == model:
+                    await asyncio.to_thread(answer_cache.set, cache_key, text)
+            
+            # Attach to an identical stream already running, if any; a started stream
+            # caches its answer when it finishes, even if this client has gone by then
+            flight, started = None, True
+            if inflight is not None:
+                flight, started = inflight.join(
+                    flight_key(prompt_messages, model, temperature),
+                    lambda flight_timings: generate_answer(kb, prompt_messages, model, temperature, flight_timings),
+                    on_complete=lambda done: cache_answer("".join(done.chunks), done.timings))
+                timings['coalesced'] = "leader" if started else "joined"
+                if not started:
+                    CHAT_COALESCED.inc()
+            if started:
+                # Counted per upstream LLM request
+                PROMPT_TOKENS.observe(prompt_stats.total_tokens,
+                                      provider=provider_of(model))
+                if prompt_stats.turns_dropped:
+                    PROMPT_TURNS_DROPPED.inc(prompt_stats.turns_dropped)
+            
+            # Stream the response
+            parts = []
+            if flight is not None:
+                try:
+                    # Joiners first get everything streamed so far
+                    async for text in flight.subscribe():
+                        parts.append(text)
+                        yield f"data: {json.dumps({'content': text})}\n\n"
+                finally:
+                    inflight.leave(flight)
+                timings.update(flight.timings)
+            else:
+                async for text in generate_answer(kb, prompt_messages, model, temperature, timings):
+                    parts.append(text)
+                    yield f"data: {json.dumps({'content': text})}\n\n"
+                await cache_answer("".join(parts), timings)
+        
+        answer = cached if cached is not None else "".join(parts)
+        if on_answer and answer:
+            await on_answer(answer)
+        outcome = "cache_hit" if cached is not None else "ok"
                 
+    except GeneratorExit:
+        # Client went away mid-stream
+        outcome = "disconnected"
+        raise
+    except UpstreamOverloaded as e:
+        # Shed before reaching the provider; clients can retry after retry_after seconds
+        outcome = "shed"
+        yield f"data: {json.dumps({'error': str(e), 'code': 'overloaded', 'retry_after': e.retry_after})}\n\n"
     except Exception as e:
         yield f"data: {json.dumps({'error': str(e)})}\n\n"
+    finally:
+        elapsed = time.perf_counter() - request_start
+        timings['total_ms'] = round(elapsed * 1000, 1)
+        CHAT_STREAM_SECONDS.observe(elapsed, outcome=outcome)
+        CHAT_REQUESTS.inc(outcome=outcome)
+        logger.info(f"Chat timings ({outcome}): {json.dumps(timings)}")
+    
+    if include_timings:
+        yield f"data: {json.dumps({'timings': timings})}\n\n"
 
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(chat_request: ChatRequest, request: Request):
+    state = request.app.state
     return StreamingResponse(
-        stream_response(request.messages, request.model),
+        stream_response(state.kb, state.answer_cache,
+                        [{"role": msg.role, "content": msg.content} for msg in chat_request.messages],
+                        chat_request.model, chat_request.include_timings, inflight=state.inflight),
         media_type="text/event-stream"
     )
 
+@app.post("/conversations")
+async def create_conversation(conversation_request: ConversationRequest, request: Request):
+    """Start a server-side conversation; send turns to /conversations/{id}/messages"""
+    turns = [{"role": msg.role, "content": msg.content} for msg in conversation_request.messages if msg.content]
+    return await asyncio.to_thread(request.app.state.conversations.create, conversation_request.model, turns)
+
+@app.get("/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str, request: Request):
+    conversation = await asyncio.to_thread(request.app.state.conversations.get, conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found or expired")
+    return conversation
+
+@app.delete("/conversations/{conversation_id}")
+async def delete_conversation(conversation_id: str, request: Request):
+    if not await asyncio.to_thread(request.app.state.conversations.delete, conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found or expired")
+    return {"deleted": conversation_id}
+
+@app.post("/conversations/{conversation_id}/messages")
+async def send_turn(conversation_id: str, turn: TurnRequest, request: Request):
+    """Answer a new user turn using the stored history; the exchange is stored once it completes"""
+    state = request.app.state
+    store = state.conversations
+    conversation = await asyncio.to_thread(store.get, conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found or expired")
+    if not turn.content.strip():
+        raise HTTPException(status_code=400, detail="Empty message")
+    
+    # The turn is stored only with its answer, so a failed or abandoned stream can be retried
+    async def store_answer(answer: str):
+        await asyncio.to_thread(store.append, conversation_id, "user", turn.content)
+        await asyncio.to_thread(store.append, conversation_id, "assistant", answer)
+    
+    messages = conversation['turns'] + [{"role": "user", "content": turn.content}]
+    model = turn.model or conversation['model'] or ChatRequest.model_fields['model'].default
+    return StreamingResponse(
+        stream_response(state.kb, state.answer_cache, messages, model, turn.include_timings,
+                        on_answer=store_answer, inflight=state.inflight),
+        media_type="text/event-stream"
+    )
+
+@app.get("/stats")
+async def stats(request: Request):
+    """Cache hit/miss counters and retrieval latency"""
+    kb = request.app.state.kb
+    answer_cache = request.app.state.answer_cache
+    return {
+        "retrieval_cache": kb.retrieval_cache.stats() if kb.retrieval_cache else None,
+        "answer_cache": {"hits": answer_cache.hits, "misses": answer_cache.misses} if answer_cache else None,
+        "conversations": await asyncio.to_thread(len, request.app.state.conversations),
+        "corpus_snapshot": kb.corpus.stats() if kb.corpus else None,
+        "coalescing": request.app.state.inflight.stats() if request.app.state.inflight is not None else None,
+        "upstream": {provider: limiter.stats() for provider, limiter in kb.limiters.items()},
+        "models": kb.router.stats()
+    }
+
+@app.get("/symbols")
+async def symbols(q: str, request: Request, limit: int = 10):
+    """Exact, prefix and fuzzy ThinkScript symbol matches, served from the in-memory corpus snapshot"""
+    matches = request.app.state.kb.lookup_symbol(q, max(1, min(limit, 50)))
+    if matches is None:
+        raise HTTPException(status_code=503, detail="Corpus snapshot not loaded")
+    return {"query": q, "matches": matches}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: latency histograms, retry and request counters, cache counters"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"} 
\ No newline at end of file
+    """Liveness: the process is up (see /ready for dependencies)"""
+    return {"status": "healthy"}
+
+@app.get("/ready")
+async def ready(request: Request):
+    """Readiness: Neo4j answers and the retrieval indexes are ONLINE"""
+    status = await asyncio.to_thread(request.app.state.kb.readiness)
+    return JSONResponse(status, status_code=200 if status['ready'] else 503) 
\ No newline at end of file
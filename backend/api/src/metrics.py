@@ -0,0 +1,212 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from cache hits to slow LLM streams
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+TOKEN_BUCKETS = (250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 16000)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge:
+    """Current value with optional labels"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels; observe() is O(log buckets)"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            snapshot = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else _format_value(bound))
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class CallbackMetric:
+    """Value read at scrape time, e.g. counters kept by the caches"""
+
+    def __init__(self, name: str, help: str, type: str, read: Callable[[], Optional[float]]):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.read = read
+
+    def render(self):
+        value = self.read()
+        if value is not None:
+            yield f"{self.name} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, read: Callable[[], Optional[float]], type: str = "gauge"):
+        return self.register(CallbackMetric(name, help, type, read))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+RETRIEVAL_SECONDS = REGISTRY.histogram(
+    "thinkscript_retrieval_seconds", "find_relevant_nodes latency", ("mode", "cache"))
+NEO4J_SESSION_ACQUIRE_SECONDS = REGISTRY.histogram(
+    "thinkscript_neo4j_session_acquire_seconds", "Wait for a pooled Neo4j connection and transaction")
+NEO4J_QUERY_SECONDS = REGISTRY.histogram(
+    "thinkscript_neo4j_query_seconds", "Retrieval query execution time once a connection is held")
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "thinkscript_llm_first_token_seconds", "Time from LLM request to first streamed text", ("provider", "model"))
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "thinkscript_llm_tokens_per_second", "Estimated output tokens per second after the first token",
+    ("provider", "model"), buckets=RATE_BUCKETS)
+LLM_RETRIES = REGISTRY.counter(
+    "thinkscript_llm_retries_total", "LLM request attempts that failed and were retried", ("provider",))
+LLM_CONCURRENCY_LIMIT = REGISTRY.gauge(
+    "thinkscript_llm_concurrency_limit", "Adaptive cap on concurrent upstream LLM requests", ("provider",))
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "thinkscript_llm_in_flight", "Upstream LLM requests holding a concurrency slot", ("provider",))
+LLM_QUEUED = REGISTRY.gauge(
+    "thinkscript_llm_queued", "Requests waiting for an upstream LLM concurrency slot", ("provider",))
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "thinkscript_llm_queue_wait_seconds", "Time spent waiting for an upstream LLM concurrency slot", ("provider",))
+LLM_SHED = REGISTRY.counter(
+    "thinkscript_llm_shed_total", "Requests rejected before reaching the LLM provider", ("provider", "reason"))
+LLM_RATE_LIMITED = REGISTRY.counter(
+    "thinkscript_llm_rate_limited_total", "429 responses from the LLM provider", ("provider",))
+ROUTER_DECISIONS = REGISTRY.counter(
+    "thinkscript_router_decisions_total", "Model that served each answer (outcome: primary, hedge or failover)",
+    ("requested", "served", "outcome"))
+ROUTER_HEDGES = REGISTRY.counter(
+    "thinkscript_router_hedges_total", "Fallback streams started because the first token was late", ("model",))
+ROUTER_FAILURES = REGISTRY.counter(
+    "thinkscript_router_failures_total", "LLM streams that failed, by model", ("model",))
+MODEL_FIRST_TOKEN_EWMA_SECONDS = REGISTRY.gauge(
+    "thinkscript_model_first_token_ewma_seconds", "Moving average of time to first token per model", ("model",))
+MODEL_AVAILABLE = REGISTRY.gauge(
+    "thinkscript_model_available", "1 unless the model's circuit breaker is open", ("model",))
+PROMPT_TOKENS = REGISTRY.histogram(
+    "thinkscript_prompt_tokens", "Assembled input tokens per LLM request", ("provider",), buckets=TOKEN_BUCKETS)
+PROMPT_TURNS_DROPPED = REGISTRY.counter(
+    "thinkscript_prompt_turns_dropped_total", "Chat history turns left out of the prompt by the token budget")
+CHAT_STREAM_SECONDS = REGISTRY.histogram(
+    "thinkscript_chat_stream_seconds", "Total /chat stream duration", ("outcome",))
+CHAT_REQUESTS = REGISTRY.counter(
+    "thinkscript_chat_requests_total", "Completed /chat streams", ("outcome",))
+CHAT_COALESCED = REGISTRY.counter(
+    "thinkscript_chat_coalesced_total", "/chat streams served from an identical in-flight LLM stream")
@@ -0,0 +1,202 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from metrics import (MODEL_AVAILABLE, MODEL_FIRST_TOKEN_EWMA_SECONDS, ROUTER_DECISIONS, ROUTER_FAILURES,
+                     ROUTER_HEDGES)
+
+# Model tried when the requested one fails or is slow, per provider of the requested model
+# (empty disables fallback for that provider)
+FALLBACK_MODELS = {
+    "openai": os.getenv("OPENAI_FALLBACK_MODEL", "claude-3-haiku-20240307"),
+    "anthropic": os.getenv("ANTHROPIC_FALLBACK_MODEL", "gpt-3.5-turbo")
+}
+# Start the fallback alongside the first model if no token has arrived by then (0 disables hedging)
+HEDGE_AFTER_MS = float(os.getenv("HEDGE_AFTER_MS", "1500"))
+# Consecutive failures after which a model is skipped for ROUTER_COOLDOWN_SECONDS
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_COOLDOWN_SECONDS = float(os.getenv("ROUTER_COOLDOWN_SECONDS", "30"))
+
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.2
+
+
+def provider_of(model: str) -> str:
+    return "anthropic" if model.startswith("claude") else "openai"
+
+
+class ModelHealth:
+    """Moving averages of time-to-first-token and error rate, plus a simple circuit breaker"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.first_token_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        MODEL_AVAILABLE.set(1, model=model)
+
+    @property
+    def available(self) -> bool:
+        # After the cooldown the next request is let through as a probe
+        return time.monotonic() >= self.open_until
+
+    def record_success(self, first_token_seconds: float):
+        if self.first_token_ewma is None:
+            self.first_token_ewma = first_token_seconds
+        else:
+            self.first_token_ewma += EWMA_ALPHA * (first_token_seconds - self.first_token_ewma)
+        self.error_ewma *= 1 - EWMA_ALPHA
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        MODEL_FIRST_TOKEN_EWMA_SECONDS.set(self.first_token_ewma, model=self.model)
+        MODEL_AVAILABLE.set(1, model=self.model)
+
+    def record_failure(self):
+        self.error_ewma += EWMA_ALPHA * (1 - self.error_ewma)
+        self.consecutive_failures += 1
+        ROUTER_FAILURES.inc(model=self.model)
+        if self.consecutive_failures >= ROUTER_FAILURE_THRESHOLD:
+            self.open_until = time.monotonic() + ROUTER_COOLDOWN_SECONDS
+            MODEL_AVAILABLE.set(0, model=self.model)
+
+    def stats(self) -> dict:
+        return {
+            'available': self.available,
+            'first_token_ewma_ms': round(self.first_token_ewma * 1000, 1) if self.first_token_ewma is not None else None,
+            'error_rate': round(self.error_ewma, 3),
+            'consecutive_failures': self.consecutive_failures
+        }
+
+
+class ModelRouter:
+    """Streams an answer from the requested model, hedging and failing over to its fallback.
+
+    The fallback is started alongside the requested model when no token has
+    arrived after HEDGE_AFTER_MS, and instead of it when it fails before its
+    first token or its circuit is open. Whichever stream yields a token first
+    is served and the other is cancelled. Failures after the first token are
+    not retried, since part of the answer has already been sent.
+    """
+
+    def __init__(self, kb, fallbacks: Dict[str, str] = FALLBACK_MODELS, hedge_after_ms: float = HEDGE_AFTER_MS):
+        self.kb = kb
+        self.fallbacks = fallbacks
+        self.hedge_after = hedge_after_ms / 1000 if hedge_after_ms > 0 else None
+        self.health: Dict[str, ModelHealth] = {}
+
+    def _health(self, model: str) -> ModelHealth:
+        health = self.health.get(model)
+        if health is None:
+            health = self.health[model] = ModelHealth(model)
+        return health
+
+    def _configured(self, model: str) -> bool:
+        client = self.kb.anthropic_client if provider_of(model) == "anthropic" else self.kb.openai_client
+        return client is not None
+
+    def candidates(self, model: str) -> List[str]:
+        """Models to try in order: the requested one and its fallback, healthy ones first"""
+        models = [model]
+        fallback = self.fallbacks.get(provider_of(model))
+        if fallback and fallback != model and self._configured(fallback):
+            models.append(fallback)
+        healthy = [m for m in models if self._health(m).available]
+        return healthy + [m for m in models if m not in healthy]
+
+    async def _open(self, model: str, messages: List[dict], temperature: float, max_tokens: Optional[int],
+                    timings: dict) -> tuple:
+        """Start a stream and wait for its first text: (model, stream, first text or None)"""
+        start = time.perf_counter()
+        stream = await self.kb.generate_response(messages=messages, stream=True, temperature=temperature,
+                                                 max_tokens=max_tokens, model=model, timings=timings)
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            await stream.aclose()
+            raise
+        self._health(model).record_success(time.perf_counter() - start)
+        return model, stream, first
+
+    @staticmethod
+    def _discard(task: asyncio.Task):
+        """Close the stream of an attempt that lost the race, once it has one"""
+        if not task.cancelled() and task.exception() is None:
+            asyncio.ensure_future(task.result()[1].aclose())
+
+    async def stream(self, messages: List[dict], model: str, temperature: float = 0.7,
+                     max_tokens: Optional[int] = None, timings: Optional[dict] = None) -> AsyncIterator[str]:
+        """Text deltas from the first model to respond; routing decisions are recorded in timings['routing']"""
+        timings = timings if timings is not None else {}
+        routing = {'requested': model, 'served': None, 'hedged': False, 'failed': []}
+        timings['routing'] = routing
+        remaining = self.candidates(model)
+        # Each attempt records its own queue_ms and retries; only the winner's are kept
+        pending: Dict[asyncio.Task, tuple] = {}
+        winner = None
+        winner_timings = None
+        last_error: Optional[BaseException] = None
+
+        def launch():
+            candidate = remaining.pop(0)
+            attempt_timings = {}
+            task = asyncio.create_task(self._open(candidate, messages, temperature, max_tokens, attempt_timings))
+            pending[task] = (candidate, attempt_timings)
+
+        launch()
+        try:
+            while pending and winner is None:
+                hedge_after = self.hedge_after if remaining and not routing['hedged'] else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # First token is late: race the next model against it
+                    routing['hedged'] = True
+                    ROUTER_HEDGES.inc(model=remaining[0])
+                    launch()
+                    continue
+                for task in done:
+                    candidate, attempt_timings = pending.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        routing['failed'].append(candidate)
+                        self._health(candidate).record_failure()
+                    elif winner is None:
+                        winner = task.result()
+                        winner_timings = attempt_timings
+                    else:
+                        self._discard(task)
+                if winner is None and not pending and remaining:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(self._discard)
+
+        if winner is None:
+            raise last_error
+        served, stream, first = winner
+        timings.update(winner_timings)
+        routing['served'] = served
+        if served == model:
+            outcome = "primary"
+        else:
+            outcome = "failover" if model in routing['failed'] or not routing['hedged'] else "hedge"
+        ROUTER_DECISIONS.inc(requested=model, served=served, outcome=outcome)
+        routing['outcome'] = outcome
+
+        try:
+            if first is not None:
+                yield first
+            async for text in stream:
+                yield text
+        except Exception:
+            self._health(served).record_failure()
+            raise
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> dict:
+        return {model: health.stats() for model, health in self.health.items()}
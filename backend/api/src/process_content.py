@@ -2,7 +2,12 @@ from neo4j import GraphDatabase
 from knowledge_base import ThinkScriptKnowledgeBase
 import os
 from dotenv import load_dotenv
-import json
+from crawl_reader import iter_crawl_items
+from ingest import DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_BATCH_SIZE, bump_generation, load_nodes, write_chunks
+from incremental import sync_crawl
+from link_graph import build_link_graph
+from embeddings import embed_pending_chunks, get_embedding_provider
+from chunker import chunk_rows
 
 # Get the absolute path to the .env file and project root
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,7 +17,7 @@ env_file = os.path.join(project_root, '.env')
 print(f"Loading environment from: {env_file}")
 load_dotenv(env_file)
 
-def create_nodes_from_crawl(crawl_file):
+def create_nodes_from_crawl(crawl_file, mode="bulk", batch_size=DEFAULT_BATCH_SIZE):
     """Create nodes from crawl data"""
     # Convert relative path to absolute path
     if not os.path.isabs(crawl_file):
@@ -23,74 +28,78 @@ def create_nodes_from_crawl(crawl_file):
     if not os.path.exists(crawl_file):
         raise FileNotFoundError(f"Crawl file not found: {crawl_file}")
     
-    with open(crawl_file, 'r') as f:
-        crawl_data = json.load(f)
-    
     kb = ThinkScriptKnowledgeBase()
     
     with kb.driver.session() as session:
-        # Clear existing nodes
-        session.run("MATCH (n:Node) DETACH DELETE n")
-        
-        # Create new nodes from crawl data
-        for item in crawl_data:
-            session.run("""
-                CREATE (n:Node {
-                    title: $title,
-                    content: $content,
-                    url: $url
-                })
-            """, {
-                'title': item.get('title', ''),
-                'content': item.get('content', ''),
-                'url': item.get('url', '')
-            })
-        
-        print(f"Created {len(crawl_data)} nodes from crawl data")
+        # Clear existing nodes along with their chunks and examples
+        session.run("""
+            MATCH (n:Node)
+            OPTIONAL MATCH (n)-[:HAS_CHUNK|HAS_EXAMPLE]->(child)
+            DETACH DELETE child, n
+        """)
+    
+    # Create new nodes from crawl data
+    stats = load_nodes(kb.driver, iter_crawl_items(crawl_file), mode=mode, batch_size=batch_size)
+    print(f"Created {stats.rows} nodes from crawl data ({stats.rows_per_second:.0f} rows/s)")
+    build_link_graph(kb.driver)
+    bump_generation(kb.driver)
 
-def process_content(crawl_file=None):
+def sync_from_crawl(crawl_file, removal_mode="delete"):
+    """Incrementally apply a crawl file: only new/changed pages are rewritten and re-chunked"""
+    if not os.path.isabs(crawl_file):
+        crawl_file = os.path.join(project_root, crawl_file)
+    
+    print(f"Syncing nodes from crawl file: {crawl_file}")
+    
+    if not os.path.exists(crawl_file):
+        raise FileNotFoundError(f"Crawl file not found: {crawl_file}")
+    
+    kb = ThinkScriptKnowledgeBase()
+    summary = sync_crawl(kb.driver, iter_crawl_items(crawl_file), chunk_rows, removal_mode=removal_mode,
+                         embedding_provider=get_embedding_provider())
+    summary.print_report()
+
+def iter_parent_chunks(records):
+    """Compute chunks client-side, yielding one {url, chunks} row per parent"""
+    for record in records:
+        chunks = chunk_rows(record['content'], record['code_blocks'])
+        print(f"Processed {record['title']} into {len(chunks)} chunks")
+        yield {'url': record['url'], 'chunks': chunks}
+
+def process_content(crawl_file=None, batch_size=DEFAULT_CHUNK_BATCH_SIZE):
     """Process content into chunks"""
     kb = ThinkScriptKnowledgeBase()
     
     with kb.driver.session() as session:
-        # Get all existing nodes
+        # Stream all parent nodes; chunks are written per batch of parents
         result = session.run("""
             MATCH (n:Node)
-            RETURN n.title as title, n.content as content
+            WHERE n.url IS NOT NULL
+            RETURN n.url as url, n.title as title, n.content as content, n.code_blocks as code_blocks
         """)
         
-        nodes = list(result)
-        if not nodes:
+        stats = write_chunks(kb.driver, iter_parent_chunks(result), batch_size=batch_size)
+        if not stats.rows:
             print("No nodes found to process. Please run with a crawl file first.")
             return
         
-        for record in nodes:
-            title = record['title']
-            content = record['content']
-            
-            # Split content into chunks
-            chunks = kb.split_content(content)
-            
-            # Create content chunks and relationships
-            for i, chunk in enumerate(chunks):
-                session.run("""
-                    MATCH (parent:Node {title: $title})
-                    CREATE (chunk:ContentChunk {
-                        content: $chunk,
-                        chunk_index: $index
-                    })
-                    CREATE (parent)-[:HAS_CHUNK]->(chunk)
-                """, {
-                    'title': title,
-                    'chunk': chunk,
-                    'index': i
-                })
-            
-            print(f"Processed {title} into {len(chunks)} chunks")
+        print(f"Chunked {stats}")
+        
+        # Embed chunks in batches; unchanged chunk texts kept their embeddings
+        provider = get_embedding_provider()
+        if provider:
+            embed_pending_chunks(kb.driver, provider)
+        bump_generation(kb.driver)
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) > 1:
-        crawl_file = sys.argv[1]
-        create_nodes_from_crawl(crawl_file)
-    process_content() 
\ No newline at end of file
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if '--sync' in sys.argv:
+        if not args:
+            sys.exit("Usage: process_content.py --sync [--tombstone] <crawl_file>")
+        sync_from_crawl(args[0], removal_mode="tombstone" if '--tombstone' in sys.argv else "delete")
+    else:
+        if args:
+            crawl_file = args[0]
+            create_nodes_from_crawl(crawl_file)
+        process_content()
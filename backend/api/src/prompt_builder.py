@@ -0,0 +1,206 @@
+import os
+import re
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from chunker import CHUNK_OVERLAP_TOKENS
+from token_count import CHARS_PER_TOKEN, count_tokens, truncate_to_tokens
+
+# Input token budget for one /chat request: system prompt + documentation + history + latest turn
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+# Shares of the budget; whatever the earlier parts leave unused is available to the later ones
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+# Earlier questions that no longer fit are listed in the system prompt, up to this size
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "150"))
+
+# Role/separator tokens each chat message costs on top of its text
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Consecutive chunks of a page share up to CHUNK_OVERLAP_TOKENS of text (see chunker)
+MAX_OVERLAP_CHARS = CHUNK_OVERLAP_TOKENS * CHARS_PER_TOKEN * 2
+
+CHUNK_INDEX_RE = re.compile(r'#(\d+)$')
+SENTENCE_RE = re.compile(r'^(.+?[.!?])(\s|$)')
+
+
+@dataclass
+class PromptStats:
+    budget: int = PROMPT_TOKEN_BUDGET
+    total_tokens: int = 0
+    system_tokens: int = 0
+    context_tokens: int = 0
+    history_tokens: int = 0
+    latest_tokens: int = 0
+    latest_truncated: bool = False
+    turns_kept: int = 0
+    turns_dropped: int = 0
+    summarized: int = 0
+    chunks_retrieved: int = 0
+    chunks_used: int = 0
+    duplicate_chunks: int = 0
+    overlap_chars_trimmed: int = 0
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+def _page_id(node_id: str) -> str:
+    return node_id.split('#', 1)[0]
+
+
+def _chunk_index(node_id: str) -> Optional[int]:
+    match = CHUNK_INDEX_RE.search(node_id)
+    return int(match.group(1)) if match else None
+
+
+def _trim_overlap(previous: str, current: str) -> str:
+    """Drop the start of `current` that repeats the end of `previous` (chunk overlap)"""
+    longest = min(len(previous), len(current), MAX_OVERLAP_CHARS)
+    for size in range(longest, 0, -1):
+        if previous.endswith(current[:size]):
+            return current[size:].lstrip()
+    return current
+
+
+def dedup_context(nodes: List[dict], stats: PromptStats) -> List[dict]:
+    """Merge retrieved chunks into one section per parent page, in rank order.
+
+    Chunks repeating text already taken from the same page are dropped, and
+    the overlap between consecutive chunks of a page is trimmed.
+    """
+    pages: Dict[str, dict] = {}
+    for node in nodes:
+        page = pages.setdefault(_page_id(node['id']), {'name': node['name'], 'chunks': []})
+        page['chunks'].append(node)
+
+    sections = []
+    for page in pages.values():
+        # Reading order: examples and whole pages as ranked, then text chunks by position in the page
+        whole = [node for node in page['chunks'] if _chunk_index(node['id']) is None]
+        chunks = sorted((node for node in page['chunks'] if _chunk_index(node['id']) is not None),
+                        key=lambda node: _chunk_index(node['id']))
+        parts = []  # (untrimmed, trimmed) text per kept chunk
+        previous = None
+        for node in whole + chunks:
+            content = node['content'] or ''
+            if any(content in raw for raw, _ in parts):
+                stats.duplicate_chunks += 1
+                continue
+            # A longer chunk supersedes shorter ones it contains
+            covered = [part for part in parts if part[0] in content]
+            stats.duplicate_chunks += len(covered)
+            parts = [part for part in parts if part not in covered]
+            text = content
+            index = _chunk_index(node['id'])
+            if previous is not None and index is not None and index == _chunk_index(previous['id']) + 1:
+                text = _trim_overlap(previous['content'] or '', content)
+                stats.overlap_chars_trimmed += len(content) - len(text)
+            if index is not None:
+                previous = node
+            if text:
+                parts.append((content, text))
+        if parts:
+            sections.append({'name': page['name'], 'content': "\n".join(text for _, text in parts),
+                             'chunks': len(parts)})
+    return sections
+
+
+def _first_sentence(text: str, max_chars: int = 160) -> str:
+    text = ' '.join(text.split())
+    match = SENTENCE_RE.match(text)
+    sentence = match.group(1) if match else text
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 1] + "…"
+
+
+def _summarize_turns(dropped: List[dict], model: str, budget: int) -> Tuple[str, int]:
+    """Earlier user questions as a bullet list, newest kept first when it doesn't all fit"""
+    questions = [_first_sentence(msg["content"]) for msg in dropped if msg["role"] == "user" and msg["content"].strip()]
+    lines = []
+    used = count_tokens("Earlier in this conversation the user asked:", model)
+    for question in reversed(questions):
+        cost = count_tokens(question, model) + 1
+        if used + cost > budget:
+            break
+        lines.insert(0, f"- {question}")
+        used += cost
+    if not lines:
+        return "", 0
+    return "Earlier in this conversation the user asked:\n" + "\n".join(lines), len(lines)
+
+
+def build_prompt(messages: List[dict], nodes: List[dict], model: str, system_prompt: str,
+                 budget: int = PROMPT_TOKEN_BUDGET) -> Tuple[List[dict], PromptStats]:
+    """Assemble the chat messages for one request within `budget` input tokens.
+
+    The system prompt and the latest user turn are always kept (the turn is cut
+    if it alone would exceed the budget). Documentation comes next, up to
+    CONTEXT_TOKEN_BUDGET, deduplicated per page. Older turns fill up to
+    HISTORY_TOKEN_BUDGET newest first; the questions of dropped turns are
+    summarized in the system prompt.
+    """
+    stats = PromptStats(budget=budget, chunks_retrieved=len(nodes))
+    remaining = budget
+
+    stats.system_tokens = count_tokens(system_prompt, model) + MESSAGE_OVERHEAD_TOKENS
+    remaining -= stats.system_tokens
+
+    # Latest turn: the last user message; anything the client sent after it is ignored
+    latest_index = next((i for i in range(len(messages) - 1, -1, -1) if messages[i]["role"] == "user"), None)
+    latest = None
+    if latest_index is not None:
+        latest = dict(messages[latest_index])
+        cost = count_tokens(latest["content"], model) + MESSAGE_OVERHEAD_TOKENS
+        if cost > remaining:
+            latest["content"] = truncate_to_tokens(latest["content"], remaining - MESSAGE_OVERHEAD_TOKENS, model)
+            cost = count_tokens(latest["content"], model) + MESSAGE_OVERHEAD_TOKENS
+            stats.latest_truncated = True
+        stats.latest_tokens = cost
+        remaining -= cost
+
+    # Documentation, best-ranked page first; pages that don't fit are skipped
+    header = "\n\nUse the following ThinkScript documentation excerpts when relevant:\n\n"
+    context_budget = min(CONTEXT_TOKEN_BUDGET, remaining) - count_tokens(header, model)
+    sections = []
+    for section in dedup_context(nodes, stats):
+        text = f"### {section['name']}\n{section['content']}"
+        cost = count_tokens(text, model) + 1
+        if cost > context_budget:
+            continue
+        sections.append(text)
+        stats.chunks_used += section['chunks']
+        stats.context_tokens += cost
+        context_budget -= cost
+    if sections:
+        system_prompt += header + "\n\n".join(sections)
+        stats.context_tokens += count_tokens(header, model)
+        remaining -= stats.context_tokens
+
+    # Earlier turns, newest first; a kept history always starts with a user turn
+    history = [dict(msg) for msg in messages[:latest_index] if msg["content"]] if latest_index else []
+    history_budget = min(HISTORY_TOKEN_BUDGET, remaining)
+    kept = []
+    for msg in reversed(history):
+        cost = count_tokens(msg["content"], model) + MESSAGE_OVERHEAD_TOKENS
+        if cost > history_budget:
+            break
+        kept.insert(0, msg)
+        history_budget -= cost
+        stats.history_tokens += cost
+    while kept and kept[0]["role"] != "user":
+        stats.history_tokens -= count_tokens(kept[0]["content"], model) + MESSAGE_OVERHEAD_TOKENS
+        kept.pop(0)
+    dropped = history[:len(history) - len(kept)]
+    stats.turns_kept = len(kept)
+    stats.turns_dropped = len(dropped)
+    remaining -= stats.history_tokens
+
+    if dropped:
+        summary, stats.summarized = _summarize_turns(dropped, model, min(HISTORY_SUMMARY_TOKENS, remaining))
+        if summary:
+            system_prompt += "\n\n" + summary
+            stats.history_tokens += count_tokens(summary, model)
+
+    assembled = [{"role": "system", "content": system_prompt}] + kept + ([latest] if latest else [])
+    stats.total_tokens = stats.system_tokens + stats.context_tokens + stats.history_tokens + stats.latest_tokens
+    return assembled, stats
@@ -0,0 +1,103 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Rough per-entry bookkeeping overhead (key tuple, dicts, list) in bytes
+ENTRY_OVERHEAD = 256
+
+
+def normalize_query(query: str) -> str:
+    """Whitespace-insensitive form; case is kept because the exact title probe is case-sensitive"""
+    return re.sub(r'\s+', ' ', query.strip())
+
+
+def result_size(nodes: List[dict]) -> int:
+    """Approximate memory footprint of a result list"""
+    return ENTRY_OVERHEAD + sum(
+        ENTRY_OVERHEAD + sum(len(value) for value in node.values() if isinstance(value, str))
+        for node in nodes
+    )
+
+
+class RetrievalCache:
+    """LRU of find_relevant_nodes results bounded by entry count and approximate bytes.
+
+    Entries are dropped wholesale when the ingestion generation changes.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    @staticmethod
+    def make_key(query: str, mode: str, limit: int) -> Tuple[str, str, int]:
+        return normalize_query(query), mode, limit
+
+    def check_generation(self, generation: Optional[int]):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                if self.generation is not None:
+                    self._entries.clear()
+                    self._bytes = 0
+                    self.invalidations += 1
+                self.generation = generation
+
+    def get(self, key) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            # Callers get their own list so they can't mutate the cached one
+            return [dict(node) for node in entry[0]]
+
+    def put(self, key, nodes: List[dict]):
+        size = result_size(nodes)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = ([dict(node) for node in nodes], size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def record(self, hit: bool, seconds: float):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += seconds
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'generation': self.generation,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'avg_hit_ms': round(self.hit_seconds / self.hits * 1000, 3) if self.hits else None,
+                'avg_miss_ms': round(self.miss_seconds / self.misses * 1000, 3) if self.misses else None
+            }
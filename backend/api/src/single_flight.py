@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Share one LLM stream between concurrent requests with the same prompt
+CHAT_COALESCING = os.getenv("CHAT_COALESCING", "true").lower() in ("1", "true", "yes")
+
+
+def flight_key(messages: List[dict], model: str, temperature: float) -> str:
+    """Identity of an LLM request: the assembled prompt (history plus retrieved context) and sampling settings"""
+    normalized = [[msg["role"], " ".join(msg["content"].split())] for msg in messages]
+    payload = json.dumps([model, temperature, normalized], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One upstream stream; every subscriber sees all of its chunks from the start"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.subscribers = 0
+        # LLM timings recorded by the upstream stream, copied to each subscriber
+        self.timings = {'retries': 0}
+        self.task: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+
+    def _publish(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Chunks streamed so far, then new ones as they arrive; raises the upstream error"""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._updated.wait()
+
+
+class SingleFlight:
+    """In-flight LLM streams keyed by flight_key.
+
+    The first request for a key starts the upstream stream in a task of its own,
+    so it keeps going if that client disconnects while others still listen; it
+    is cancelled once the last subscriber leaves. Finished flights are dropped,
+    so later identical questions go through the answer cache instead; the
+    starter's on_complete stores the answer even if that client has left.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.started = 0
+        self.joined = 0
+        self.cancelled = 0
+
+    def join(self, key: str, produce: Callable[[dict], AsyncIterator[str]],
+             on_complete: Optional[Callable[[Flight], Awaitable[None]]] = None) -> Tuple[Flight, bool]:
+        """Subscribe to the flight for `key`, starting produce(timings) if there is none; True if started.
+
+        on_complete(flight) is awaited once a started stream finishes without error.
+        """
+        flight = self._flights.get(key)
+        started = flight is None
+        if started:
+            flight = Flight(key)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(flight, produce, on_complete))
+            self.started += 1
+        else:
+            self.joined += 1
+        flight.subscribers += 1
+        return flight, started
+
+    def leave(self, flight: Flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # Nobody is listening any more; stop paying for the stream
+            self._forget(flight)
+            flight.task.cancel()
+            self.cancelled += 1
+
+    async def _run(self, flight: Flight, produce: Callable[[dict], AsyncIterator[str]],
+                   on_complete: Optional[Callable[[Flight], Awaitable[None]]]):
+        try:
+            async for text in produce(flight.timings):
+                flight.chunks.append(text)
+                flight._publish()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(flight)
+            flight._publish()
+        # Not reached if cancelled; subscribers already have the whole answer
+        if flight.error is None and on_complete is not None:
+            try:
+                await on_complete(flight)
+            except Exception:
+                logger.exception("Completed flight callback failed")
+
+    def _forget(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def __len__(self):
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        return {'in_flight': len(self), 'started': self.started, 'joined': self.joined,
+                'cancelled': self.cancelled}
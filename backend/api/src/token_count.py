@@ -0,0 +1,43 @@
+from functools import lru_cache
+
+# Roughly four characters per model token for English prose and code
+CHARS_PER_TOKEN = 4
+# Claude's tokenizer produces a few more tokens per character than OpenAI's for English
+CLAUDE_CHARS_PER_TOKEN = 3.5
+
+
+@lru_cache(maxsize=32)
+def _encoding(model: str):
+    """tiktoken encoding for OpenAI models when tiktoken is installed, else None"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return None
+
+
+def chars_per_token(model: str) -> float:
+    return CLAUDE_CHARS_PER_TOKEN if model.startswith("claude") else CHARS_PER_TOKEN
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Tokens in `text` for `model`: exact with tiktoken for OpenAI models, estimated otherwise"""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return int(len(text) / chars_per_token(model)) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Leading part of `text` that fits in max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    limit = int((max_tokens - 1) * chars_per_token(model))
+    return text if len(text) <= limit else text[:limit]
@@ -0,0 +1,262 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional
+
+import anthropic
+import openai
+
+from metrics import LLM_CONCURRENCY_LIMIT, LLM_IN_FLIGHT, LLM_QUEUED, LLM_QUEUE_WAIT_SECONDS, LLM_SHED
+
+# Concurrent upstream requests per provider: starts at INITIAL, grows by about one
+# per LIMIT successful requests and shrinks by DECREASE_FACTOR on a 429 or timeout
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "8"))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "32"))
+# Requests allowed to wait for a slot, and for how long, before they are shed
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "32"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+# Budget for queueing, attempts and backoff until a stream has started
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "45"))
+
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+DECREASE_FACTOR = 0.7
+# 429s and timeouts arriving together are one signal: the limit shrinks at most once per window
+DECREASE_COOLDOWN_SECONDS = 2.0
+
+
+class UpstreamOverloaded(Exception):
+    """The provider is saturated; the request was shed instead of adding to the pile-up"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, conflicts, server errors and dropped connections are worth another attempt"""
+    if isinstance(error, (openai.APIConnectionError, anthropic.APIConnectionError)):
+        return True
+    status = status_code(error)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+
+def is_overload(error: Exception) -> bool:
+    """Errors meaning the provider wants less traffic from us"""
+    if isinstance(error, (openai.APITimeoutError, anthropic.APITimeoutError)):
+        return True
+    return status_code(error) in (408, 429, 529)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay requested by the provider's Retry-After (seconds or HTTP date) or retry-after-ms header"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    milliseconds = headers.get("retry-after-ms")
+    if milliseconds:
+        try:
+            return max(0.0, float(milliseconds) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Seconds to wait before attempt + 1.
+
+    Honors the provider's Retry-After with a little jitter on top; otherwise
+    exponential backoff with full jitter, so clients that failed together
+    don't retry together.
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 0.1 * max(retry_after, 1.0))
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt + 1)))
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one provider's upstream requests, with a bounded FIFO queue.
+
+    A slot is held from the request until its stream is fully consumed. Requests
+    over the limit wait in line; when the line is full, or a request would wait
+    past its queue timeout or deadline, it is shed with UpstreamOverloaded.
+    """
+
+    def __init__(self, provider: str, initial: int = LLM_CONCURRENCY_INITIAL, minimum: int = LLM_CONCURRENCY_MIN,
+                 maximum: int = LLM_CONCURRENCY_MAX, max_queue: int = LLM_QUEUE_MAX,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS):
+        self.provider = provider
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.shed = 0
+        self.overloaded = 0
+        self._waiters = deque()
+        self._decreased_at = float('-inf')
+        # Set from Retry-After; returned to shed clients as a hint
+        self._retry_after_until = 0.0
+        self._update_gauges()
+
+    def _update_gauges(self):
+        LLM_CONCURRENCY_LIMIT.set(int(self.limit), provider=self.provider)
+        LLM_IN_FLIGHT.set(self.in_flight, provider=self.provider)
+        LLM_QUEUED.set(len(self._waiters), provider=self.provider)
+
+    def _retry_hint(self) -> float:
+        return round(max(1.0, self._retry_after_until - time.monotonic()), 1)
+
+    def _shed(self, reason: str, message: str):
+        self.shed += 1
+        LLM_SHED.inc(provider=self.provider, reason=reason)
+        raise UpstreamOverloaded(message, retry_after=self._retry_hint())
+
+    async def acquire(self, deadline: float) -> float:
+        """Take a slot, waiting in line if needed; returns the seconds spent waiting"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self._update_gauges()
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self._shed("queue_full", f"The {self.provider} model is at capacity right now; please retry shortly")
+        timeout = min(self.queue_timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            self._shed("deadline", f"Timed out waiting for the {self.provider} model; please retry shortly")
+
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._forget(waiter)
+            self._shed("queue_timeout", f"Timed out waiting for the {self.provider} model; please retry shortly")
+        except BaseException:
+            # e.g. the client disconnected while waiting; hand back a slot granted meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._forget(waiter)
+            raise
+        waited = time.monotonic() - start
+        LLM_QUEUE_WAIT_SECONDS.observe(waited, provider=self.provider)
+        return waited
+
+    def _forget(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._update_gauges()
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        # Slots go straight to the longest-waiting requests
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+        self._update_gauges()
+
+    def on_success(self):
+        """Additive increase: about one more slot per `limit` successful requests"""
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def on_overloaded(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease after a 429 or timeout, once per burst of them"""
+        self.overloaded += 1
+        now = time.monotonic()
+        if retry_after:
+            self._retry_after_until = max(self._retry_after_until, now + retry_after)
+        if now - self._decreased_at >= DECREASE_COOLDOWN_SECONDS:
+            self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+            self._decreased_at = now
+        self._update_gauges()
+
+    def hold(self, stream: AsyncIterator[str]) -> "HeldStream":
+        """Pass a stream through, keeping the slot until it is consumed or abandoned"""
+        return HeldStream(self, stream)
+
+    def stats(self) -> dict:
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'queued': len(self._waiters),
+            'shed': self.shed,
+            'overloaded': self.overloaded
+        }
+
+
+class HeldStream:
+    """An upstream stream holding one of a limiter's slots, released exactly once.
+
+    An async generator's cleanup never runs if it is closed or dropped before
+    its first __anext__, which leaked the slot of a stream abandoned unread
+    (e.g. the loser of a routing race). Here exhaustion, an error, aclose()
+    and garbage collection all give the slot back.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter, stream: AsyncIterator[str]):
+        self._limiter = limiter
+        self._stream = stream.__aiter__()
+        self._released = False
+
+    def _release(self, success: bool = False):
+        if self._released:
+            return
+        self._released = True
+        self._limiter.release()
+        if success:
+            self._limiter.on_success()
+
+    def __aiter__(self) -> "HeldStream":
+        return self
+
+    async def __anext__(self) -> str:
+        if self._released:
+            raise StopAsyncIteration
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._release(success=True)
+            raise
+        except BaseException:
+            self._release()
+            raise
+
+    async def aclose(self):
+        self._release()
+        close = getattr(self._stream, "aclose", None)
+        if close is not None:
+            await close()
+
+    def __del__(self):
+        self._release()
@@ -0,0 +1,40 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+api_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(api_dir, "src"))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def fake_llm_url():
+    """Base URL of benchmarks/fake_llm_server.py, serving both providers' streaming APIs"""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(api_dir, "benchmarks", "fake_llm_server.py"), "--port", str(port),
+         "--tokens", "8", "--token-delay-ms", "1", "--first-token-delay-ms", "5"])
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{url}/stats", timeout=0.5)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("fake_llm_server did not start")
+        yield url
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
@@ -0,0 +1,61 @@
+import json
+import os
+
+from chunker import iter_chunks, iter_text_chunks
+
+fixture = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "crawls",
+                       "thinkscript_data_20250328_132839.json")
+
+
+def test_long_word_after_leading_whitespace_makes_no_empty_chunk():
+    chunks = [chunk.content for chunk in iter_text_chunks('  ' + 'x' * 60 + ' yy.', 10, 1)]
+    assert chunks
+    assert all(chunks)
+    assert ''.join(chunks).replace(' ', '').startswith('x' * 60)
+
+
+def test_extra_spaces_after_sentence_make_no_empty_chunk():
+    content = 'Hi there.   ' + 'y' * 60 + ' z.'
+    chunks = [chunk.content for chunk in iter_text_chunks(content, 10, 1)]
+    assert chunks[0] == 'Hi there.'
+    assert all(chunks)
+
+
+def test_over_budget_text_followed_by_trailing_whitespace_makes_no_empty_chunk():
+    chunks = [chunk.content for chunk in iter_text_chunks('A' * 795 + '. ' + ' ' * 10)]
+    assert chunks == ['A' * 795 + '.']
+
+
+def test_whitespace_only_content_makes_no_chunks():
+    assert list(iter_text_chunks(' \n\t ', 10, 1)) == []
+
+
+def test_crawl_fixture_has_no_empty_chunks():
+    with open(fixture, encoding="utf-8") as f:
+        items = json.load(f)
+    for item in items:
+        for chunk in iter_chunks(item.get("content") or "", item.get("code_blocks") or ()):
+            assert chunk.content.strip(), item.get("url")
+
+
+class OneTokenPerChar:
+    """Tokenizer much denser than the chars/4 estimate, like code or symbols under tiktoken"""
+
+    def encode(self, text):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def test_chunks_fit_the_budget_as_counted_for_prompts(monkeypatch):
+    import token_count
+    from prompt_builder import count_tokens
+
+    monkeypatch.setattr(token_count, "_encoding", lambda model: OneTokenPerChar())
+    content = " ".join(f"Plot{i} = Average(close, {i});" for i in range(200))
+    chunks = list(iter_text_chunks(content, 50, 5))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.content
+        assert chunk.tokens == count_tokens(chunk.content, "gpt-3.5-turbo") <= 50
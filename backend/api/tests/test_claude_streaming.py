@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+import pytest
+
+from knowledge_base import ThinkScriptKnowledgeBase
+
+to_anthropic_messages = ThinkScriptKnowledgeBase.to_anthropic_messages
+
+
+@pytest.fixture
+def kb(fake_llm_url, monkeypatch):
+    """Knowledge base whose LLM clients talk to the fake server (Neo4j is never contacted)"""
+    monkeypatch.setenv("OPENAI_API_KEY", "fake")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{fake_llm_url}/v1")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "fake")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", fake_llm_url)
+    monkeypatch.setattr(ThinkScriptKnowledgeBase, "setup_indexes", lambda self: None)
+    kb = ThinkScriptKnowledgeBase()
+    yield kb
+    kb.close()
+
+
+async def collect(kb, messages, model):
+    stream = await kb.generate_response(messages=messages, stream=True, model=model)
+    return [text async for text in stream]
+
+
+def test_claude_streams_same_deltas_as_openai(kb):
+    messages = [{"role": "system", "content": "You are a ThinkScript expert."},
+                {"role": "user", "content": "What is AddLabel?"}]
+    claude = asyncio.run(collect(kb, messages, "claude-3-haiku-20240307"))
+    openai = asyncio.run(collect(kb, messages, "gpt-3.5-turbo"))
+    assert len(claude) == 8
+    assert claude == openai
+
+
+def test_claude_accepts_irregular_history(kb, fake_llm_url):
+    # The fake server answers 400 unless turns alternate starting with the user
+    messages = [{"role": "assistant", "content": "Hi! Ask me about ThinkScript."},
+                {"role": "user", "content": "How do I plot a line?"},
+                {"role": "user", "content": "In red?"},
+                {"role": "system", "content": "Be brief."},
+                {"role": "assistant", "content": "Use plot and SetDefaultColor."},
+                {"role": "assistant", "content": "For example plot x = close;"},
+                {"role": "user", "content": "And a dashed one?"}]
+    before = httpx.get(f"{fake_llm_url}/stats").json()["requests"]["anthropic"]
+    assert asyncio.run(collect(kb, messages, "claude-3-haiku-20240307"))
+    assert httpx.get(f"{fake_llm_url}/stats").json()["requests"]["anthropic"] == before + 1
+
+
+def test_leading_assistant_turn_is_dropped():
+    system, conversation = to_anthropic_messages([
+        {"role": "assistant", "content": "Welcome"},
+        {"role": "user", "content": "What is close?"}])
+    assert system == ""
+    assert conversation == [{"role": "user", "content": "What is close?"}]
+
+
+def test_consecutive_same_role_turns_are_merged_in_order():
+    _, conversation = to_anthropic_messages([
+        {"role": "user", "content": "first"},
+        {"role": "user", "content": "second"},
+        {"role": "assistant", "content": "answer one"},
+        {"role": "assistant", "content": "answer two"},
+        {"role": "user", "content": "latest"}])
+    assert conversation == [{"role": "user", "content": "first\n\nsecond"},
+                            {"role": "assistant", "content": "answer one\n\nanswer two"},
+                            {"role": "user", "content": "latest"}]
+
+
+def test_system_messages_become_the_system_prompt():
+    system, conversation = to_anthropic_messages([
+        {"role": "system", "content": "You are a ThinkScript expert."},
+        {"role": "user", "content": "question"},
+        {"role": "system", "content": "Documentation: ..."},
+        {"role": "assistant", "content": "trailing answer"}])
+    assert system == "You are a ThinkScript expert.\n\nDocumentation: ..."
+    assert conversation == [{"role": "user", "content": "question"}]
+
+
+def test_only_recent_turns_are_sent():
+    messages = [{"role": "system", "content": "system"}]
+    messages += [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i}"} for i in range(30)]
+    recent = ThinkScriptKnowledgeBase.recent_turns(messages, max_turns=4)
+    assert [msg["content"] for msg in recent] == ["system", "turn 26", "turn 27", "turn 28", "turn 29"]
+    assert ThinkScriptKnowledgeBase.recent_turns(messages[:3], max_turns=4) == messages[:3]
@@ -0,0 +1,57 @@
+import pytest
+
+from embeddings import EmbeddingProvider, HashingEmbeddingProvider, ensure_vector_index
+
+
+class FakeResult:
+    def __init__(self, record=None):
+        self.record = record
+
+    def single(self):
+        return self.record
+
+    def consume(self):
+        pass
+
+
+class FakeDriver:
+    """Records queries; SHOW VECTOR INDEXES reports an index of `dimensions`, if given"""
+
+    def __init__(self, dimensions=None):
+        self.dimensions = dimensions
+        self.queries = []
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def run(self, query, **params):
+        self.queries.append(" ".join(query.split()))
+        if query.strip().startswith("SHOW VECTOR INDEXES") and self.dimensions is not None:
+            return FakeResult({'dimensions': self.dimensions})
+        return FakeResult()
+
+
+def test_embedding_provider_requires_embed():
+    with pytest.raises(TypeError):
+        EmbeddingProvider()
+
+
+def test_vector_index_with_other_dimensions_is_recreated():
+    driver = FakeDriver(dimensions=1536)
+    ensure_vector_index(driver, HashingEmbeddingProvider(256))
+    assert driver.queries[1] == "DROP INDEX chunk_embedding_index IF EXISTS"
+    assert "`vector.dimensions`: 256" in driver.queries[2]
+
+
+@pytest.mark.parametrize("dimensions", [256, None])
+def test_matching_or_missing_vector_index_is_not_dropped(dimensions):
+    driver = FakeDriver(dimensions=dimensions)
+    ensure_vector_index(driver, HashingEmbeddingProvider(256))
+    assert not any(query.startswith("DROP") for query in driver.queries)
+    assert driver.queries[-1].startswith("CREATE VECTOR INDEX chunk_embedding_index IF NOT EXISTS")
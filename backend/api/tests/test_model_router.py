@@ -0,0 +1,52 @@
+import asyncio
+
+from model_router import ModelRouter
+
+
+class FakeKB:
+    """generate_response stand-in: per-model first-token delay, queue time and retries"""
+
+    openai_client = object()
+    anthropic_client = object()
+
+    def __init__(self, delays, queue_ms, retries):
+        self.delays = delays
+        self.queue_ms = queue_ms
+        self.retries = retries
+
+    async def generate_response(self, messages, stream, temperature, max_tokens, model, timings):
+        timings['queue_ms'] = (timings.get('queue_ms') or 0) + self.queue_ms[model]
+        timings['retries'] = timings.get('retries', 0) + self.retries[model]
+
+        async def text():
+            await asyncio.sleep(self.delays[model])
+            yield f"{model} answer"
+
+        return text()
+
+
+async def route(router, model, timings):
+    return [text async for text in router.stream([{"role": "user", "content": "hi"}], model, timings=timings)]
+
+
+def test_hedged_request_keeps_only_the_winners_timings():
+    kb = FakeKB(delays={"gpt-3.5-turbo": 1.0, "claude-3-haiku-20240307": 0.01},
+                queue_ms={"gpt-3.5-turbo": 500.0, "claude-3-haiku-20240307": 20.0},
+                retries={"gpt-3.5-turbo": 2, "claude-3-haiku-20240307": 0})
+    router = ModelRouter(kb, fallbacks={"openai": "claude-3-haiku-20240307"}, hedge_after_ms=50)
+    timings = {'retries': 0, 'queue_ms': None}
+    assert asyncio.run(route(router, "gpt-3.5-turbo", timings)) == ["claude-3-haiku-20240307 answer"]
+    assert timings['routing']['served'] == "claude-3-haiku-20240307"
+    assert timings['routing']['outcome'] == "hedge"
+    assert timings['queue_ms'] == 20.0
+    assert timings['retries'] == 0
+
+
+def test_primary_answer_keeps_its_timings():
+    kb = FakeKB(delays={"gpt-3.5-turbo": 0.01}, queue_ms={"gpt-3.5-turbo": 5.0}, retries={"gpt-3.5-turbo": 1})
+    router = ModelRouter(kb, fallbacks={}, hedge_after_ms=50)
+    timings = {'retries': 0, 'queue_ms': None}
+    assert asyncio.run(route(router, "gpt-3.5-turbo", timings)) == ["gpt-3.5-turbo answer"]
+    assert timings['routing']['served'] == "gpt-3.5-turbo"
+    assert timings['queue_ms'] == 5.0
+    assert timings['retries'] == 1
@@ -0,0 +1,56 @@
+import asyncio
+
+from single_flight import SingleFlight
+
+
+async def answer(timings):
+    for text in ("Use ", "plot", "."):
+        await asyncio.sleep(0.01)
+        yield text
+
+
+def test_answer_is_completed_after_the_leader_leaves():
+    async def run():
+        inflight = SingleFlight()
+        completed = []
+
+        async def on_complete(flight):
+            completed.append("".join(flight.chunks))
+
+        leader, started = inflight.join("key", answer, on_complete)
+        joiner, _ = inflight.join("key", answer, on_complete)
+        assert started and joiner is leader
+
+        # The leader's client disconnects after the first chunk
+        async for _ in leader.subscribe():
+            break
+        inflight.leave(leader)
+
+        received = [text async for text in joiner.subscribe()]
+        inflight.leave(joiner)
+        await leader.task
+        return received, completed
+
+    received, completed = asyncio.run(run())
+    assert "".join(received) == "Use plot."
+    assert completed == ["Use plot."]
+
+
+def test_abandoned_flight_is_not_completed():
+    async def run():
+        inflight = SingleFlight()
+        completed = []
+
+        async def on_complete(flight):
+            completed.append(flight)
+
+        flight, _ = inflight.join("key", answer, on_complete)
+        async for _ in flight.subscribe():
+            break
+        inflight.leave(flight)
+        await asyncio.gather(flight.task, return_exceptions=True)
+        return inflight, completed
+
+    inflight, completed = asyncio.run(run())
+    assert completed == []
+    assert inflight.cancelled == 1
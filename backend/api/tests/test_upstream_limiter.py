@@ -0,0 +1,66 @@
+import asyncio
+import gc
+
+import pytest
+
+from upstream_limiter import AdaptiveLimiter
+
+
+async def tokens(*items):
+    for item in items:
+        yield item
+
+
+def held(limiter: AdaptiveLimiter, *items):
+    """A stream holding a slot, as generate_response returns it"""
+    asyncio.run(limiter.acquire(deadline=float('inf')))
+    assert limiter.in_flight == 1
+    return limiter.hold(tokens(*items))
+
+
+def test_consumed_stream_releases_its_slot_and_counts_as_success():
+    limiter = AdaptiveLimiter("test", initial=2)
+    stream = held(limiter, "a", "b")
+
+    async def consume():
+        return [item async for item in stream]
+
+    assert asyncio.run(consume()) == ["a", "b"]
+    assert limiter.in_flight == 0
+    assert limiter.limit > 2
+
+
+def test_stream_closed_before_first_item_releases_its_slot():
+    limiter = AdaptiveLimiter("test", initial=2)
+    stream = held(limiter, "a")
+    asyncio.run(stream.aclose())
+    assert limiter.in_flight == 0
+    assert limiter.limit == 2
+
+
+def test_stream_dropped_unread_releases_its_slot():
+    limiter = AdaptiveLimiter("test", initial=2)
+    stream = held(limiter, "a")
+    del stream
+    gc.collect()
+    assert limiter.in_flight == 0
+
+
+def test_failing_stream_releases_its_slot_once():
+    limiter = AdaptiveLimiter("test", initial=2)
+
+    async def failing():
+        yield "a"
+        raise ConnectionError("dropped")
+
+    asyncio.run(limiter.acquire(deadline=float('inf')))
+    stream = limiter.hold(failing())
+
+    async def consume():
+        async for _ in stream:
+            pass
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume())
+    asyncio.run(stream.aclose())
+    assert limiter.in_flight == 0
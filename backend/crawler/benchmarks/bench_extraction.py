@@ -0,0 +1,112 @@
+"""Compare single-walk page extraction with the per-field CSS selectors it replaced.
+
+Usage (from backend/crawler, requires Scrapy's lxml/parsel):
+    PYTHONPATH=src/thinkscript_crawler python3 benchmarks/bench_extraction.py [html_dir] [--repeat N]
+
+html_dir defaults to benchmarks/fixtures; any directory of saved pages (e.g. a
+local mirror of the docs) works. Reports pages per second for both extractors
+and the bytes of duplicated text the old selectors produced.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from urllib.parse import urljoin
+
+from parsel import Selector
+
+from thinkscript_crawler.extraction import extract_page
+
+FIXTURE_DIR = Path(__file__).parent / 'fixtures'
+FIXTURE_BASE_URL = 'https://toslc.thinkorswim.com/center/reference/thinkScript/'
+
+
+def legacy_extract(selector, url):
+    """The selector passes parse_page ran before extract_page"""
+    title = selector.css('h1::text').get()
+    if not title:
+        title = selector.css('.page-title::text').get()
+    if not title:
+        title = selector.css('.content h1::text').get()
+
+    content = []
+    content.extend(selector.css('main p::text').getall())
+    content.extend(selector.css('.content p::text').getall())
+    content.extend(selector.css('article p::text').getall())
+
+    code_blocks = []
+    code_blocks.extend(selector.css('pre code::text').getall())
+    code_blocks.extend(selector.css('.content pre code::text').getall())
+    code_blocks.extend(selector.css('main pre code::text').getall())
+
+    nav_links = [urljoin(url, link) for link in selector.css('nav a::attr(href)').getall()]
+    content_links = [urljoin(url, link) for link in selector.css('main a::attr(href)').getall()]
+    return {
+        'title': title,
+        'content': ' '.join(c.strip() for c in content if c.strip()),
+        'code_blocks': [code.strip() for code in code_blocks if code.strip()],
+        'links': list(set(nav_links + content_links))
+    }
+
+
+def run(extract, pages, repeat):
+    """Best-of-repeat seconds (parsing included) and the results of the last run"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [extract(Selector(text=html), url) for url, html in pages]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def text_bytes(title, content, code_blocks):
+    return len((title or '').encode()) + len(content.encode()) + sum(len(code.encode()) for code in code_blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('html_dir', nargs='?', default=str(FIXTURE_DIR))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.html_dir).rglob('*.htm*'))
+    if not paths:
+        raise SystemExit(f"No .html files in {args.html_dir}")
+    pages = [(urljoin(FIXTURE_BASE_URL, path.stem), path.read_text(encoding='utf-8', errors='replace'))
+             for path in paths]
+    total_bytes = sum(len(html.encode()) for _, html in pages)
+    print(f"Extracting {len(pages)} pages ({total_bytes / 1e6:.2f}MB) from {args.html_dir}")
+
+    legacy_seconds, legacy = run(legacy_extract, pages, args.repeat)
+    walk_seconds, walked = run(lambda selector, url: extract_page(selector.root, url), pages, args.repeat)
+
+    legacy_bytes = sum(text_bytes(r['title'], r['content'], r['code_blocks']) for r in legacy)
+    walk_bytes = sum(text_bytes(p.title, p.content, p.code_blocks) for p in walked)
+    report = {
+        'pages': len(pages),
+        'legacy': {
+            'seconds': round(legacy_seconds, 4),
+            'pages_per_second': round(len(pages) / legacy_seconds, 1),
+            'text_bytes': legacy_bytes,
+            'code_blocks': sum(len(r['code_blocks']) for r in legacy),
+            'links': sum(len(r['links']) for r in legacy)
+        },
+        'single_walk': {
+            'seconds': round(walk_seconds, 4),
+            'pages_per_second': round(len(pages) / walk_seconds, 1),
+            'text_bytes': walk_bytes,
+            'code_blocks': sum(len(p.code_blocks) for p in walked),
+            'links': sum(len(p.links) for p in walked),
+            'headings': sum(len(p.headings) for p in walked),
+            'signatures': sum(len(p.signatures) for p in walked)
+        },
+        # Text the overlapping selectors extracted more than once (counted on the full
+        # text of each node, so inline <code>/<a> text the old ::text dropped is included)
+        'duplicate_bytes_removed': sum(p.duplicate_bytes for p in walked),
+        'speedup': round(legacy_seconds / walk_seconds, 2)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
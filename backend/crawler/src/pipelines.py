@@ -1,34 +1,25 @@
 import json
 import os
-from datetime import datetime
 
 class ThinkScriptPipeline:
+    """Write items as JSON Lines, one object per line, flushed as items arrive."""
+
     def __init__(self):
         # Create output directory if it doesn't exist
         os.makedirs('output', exist_ok=True)
         
         # Initialize output file
-        self.file = open('output/thinkscript_data.json', 'w', encoding='utf-8')
-        self.file.write('[\n')
-        self.first_item = True
+        self.file = open('output/thinkscript_data.jsonl', 'w', encoding='utf-8')
 
     def process_item(self, item, spider):
         """Process each item and write to file."""
-        # Convert item to JSON string
+        # Convert item to a single JSON line
         line = json.dumps(dict(item), ensure_ascii=False)
-        
-        # Add comma if not first item
-        if not self.first_item:
-            self.file.write(',\n')
-        else:
-            self.first_item = False
-            
-        # Write item to file
-        self.file.write(line)
+        self.file.write(line + '\n')
+        self.file.flush()
         
         return item
 
     def close_spider(self, spider):
         """Close the output file when spider is closed."""
-        self.file.write('\n]')
-        self.file.close() 
\ No newline at end of file
+        self.file.close()
\ No newline at end of file
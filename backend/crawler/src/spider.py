@@ -1,12 +1,31 @@
 import scrapy
 from scrapy.spiders import CrawlSpider, Rule
 from scrapy.linkextractors import LinkExtractor
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 import json
+import re
 from datetime import datetime
 from pathlib import Path
 import os
 
+DENY_PATTERNS = ('wp-admin', 'wp-login', 'feed', 'comment', 'tag', 'category', 'search', 'login', 'register')
+
+
+def is_resumed_job(jobdir):
+    """Whether JOBDIR holds anything from an earlier run of the job.
+
+    spider.state is only written on a clean shutdown; after a hard kill the
+    seen fingerprints and the disk queue are all that is left behind.
+    """
+    jobdir = Path(jobdir)
+    if (jobdir / 'spider.state').exists():
+        return True
+    seen = jobdir / 'requests.seen'
+    if seen.exists() and seen.stat().st_size > 0:
+        return True
+    queue = jobdir / 'requests.queue'
+    return queue.is_dir() and any(queue.iterdir())
+
 class ThinkScriptSpider(CrawlSpider):
     name = 'thinkscript'
     allowed_domains = ['thinkscript.com']
@@ -18,15 +37,39 @@ class ThinkScriptSpider(CrawlSpider):
         'https://thinkscript.com/docs/thinkScript/functions/'
     ]
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, base_url=None, *args, **kwargs):
+        # `scrapy crawl thinkscript -a base_url=http://localhost:8080/docs/` crawls
+        # a local mirror of the docs instead of the live site
+        if base_url:
+            self.start_urls = [base_url]
+            self.allowed_domains = [urlparse(base_url).hostname]
+            self.rules = (
+                Rule(LinkExtractor(allow=(re.escape(base_url),), deny=DENY_PATTERNS),
+                     callback='parse_page', follow=True),
+            )
         super(ThinkScriptSpider, self).__init__(*args, **kwargs)
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         # Get the project root directory (3 levels up from spider.py)
         self.project_root = Path(__file__).parent.parent.parent.parent
         self.data_dir = self.project_root / 'data' / 'crawls'
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.output_file = self.data_dir / f'thinkscript_data_{self.timestamp}.json'
-        self.items = []
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(ThinkScriptSpider, cls).from_crawler(crawler, *args, **kwargs)
+        spider.open_output(crawler.settings.get('JOBDIR'))
+        return spider
+    
+    def open_output(self, jobdir=None):
+        """Open the JSON Lines output; a resumed job appends to its own file."""
+        # Items are appended as JSON Lines while crawling instead of buffered until shutdown
+        if jobdir:
+            self.output_file = self.data_dir / f'thinkscript_data_{Path(jobdir).name}.jsonl'
+            resuming = is_resumed_job(jobdir)
+        else:
+            self.output_file = self.data_dir / f'thinkscript_data_{self.timestamp}.jsonl'
+            resuming = False
+        self.output = open(self.output_file, 'a' if resuming else 'w', encoding='utf-8')
     
     # Rules for following links
     rules = (
@@ -34,7 +77,7 @@ class ThinkScriptSpider(CrawlSpider):
         Rule(
             LinkExtractor(
                 allow=('thinkscript.com/docs/',),
-                deny=('wp-admin', 'wp-login', 'feed', 'comment', 'tag', 'category', 'search', 'login', 'register')
+                deny=DENY_PATTERNS
             ),
             callback='parse_page',
             follow=True
@@ -43,6 +86,15 @@ class ThinkScriptSpider(CrawlSpider):
 
     def parse_page(self, response):
         """Parse each page and extract relevant information."""
+        # Served from the HTTP cache after a 304 (incremental mode): the page is
+        # unchanged since the last crawl, so only mark it as still present
+        if 'cached' in response.flags:
+            marker = {'url': response.url, 'unchanged': True, 'crawl_date': datetime.now().isoformat()}
+            self.output.write(json.dumps(marker) + '\n')
+            self.output.flush()
+            yield marker
+            return
+        
         # Extract title
         title = response.css('h1::text').get()
         
@@ -71,14 +123,13 @@ class ThinkScriptSpider(CrawlSpider):
             'crawl_date': datetime.now().isoformat()
         }
         
-        self.items.append(metadata)
+        self.output.write(json.dumps(metadata) + '\n')
+        self.output.flush()
         yield metadata
 
     def closed(self, reason):
         """Called when spider is closed."""
-        # Save all items to a JSON file
-        with open(self.output_file, 'w') as f:
-            json.dump(self.items, f, indent=2)
+        self.output.close()
         
         print(f"\nCrawled data saved to: {self.output_file}")
         self.logger.info('Spider closed: %s', reason) 
\ No newline at end of file
@@ -0,0 +1,142 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+# Regions whose paragraphs are page content; the old selectors queried each of
+# them separately, so a paragraph inside e.g. <main><article> was kept twice
+MAIN, CONTENT, ARTICLE, NAV = 1, 2, 4, 8
+CONTENT_SCOPES = MAIN | CONTENT | ARTICLE
+
+HEADING_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+
+# Reference pages introduce the declaration with a "Syntax" heading or mark it with a class
+SIGNATURE_HEADINGS = {'syntax', 'signature', 'declaration'}
+SIGNATURE_CLASSES = {'syntax', 'signature'}
+
+# Subtrees that never hold page text
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg'}
+
+
+@dataclass
+class PageExtraction:
+    title: Optional[str] = None
+    paragraphs: List[str] = field(default_factory=list)
+    code_blocks: List[str] = field(default_factory=list)
+    headings: List[Dict[str, object]] = field(default_factory=list)
+    signatures: List[str] = field(default_factory=list)
+    links: List[str] = field(default_factory=list)
+    has_content: bool = False
+    # Bytes the overlapping per-region selectors would have extracted more than once
+    duplicate_bytes: int = 0
+
+    @property
+    def content(self) -> str:
+        return ' '.join(self.paragraphs)
+
+
+def _tag(element) -> Optional[str]:
+    tag = element.tag
+    if not isinstance(tag, str):
+        return None  # comments and processing instructions
+    return tag.rsplit('}', 1)[-1].lower()
+
+
+def _classes(element) -> set:
+    value = element.get('class')
+    return set(value.split()) if value else set()
+
+
+def _text(element) -> str:
+    return ' '.join(''.join(element.itertext()).split())
+
+
+def _scope_count(scopes: int) -> int:
+    return bin(scopes & CONTENT_SCOPES).count('1')
+
+
+def extract_page(root, base_url: str) -> PageExtraction:
+    """Extract title, paragraphs, code, headings, signatures and links in one walk.
+
+    `root` is the parsed document (response.selector.root for Scrapy responses).
+    Every element is visited once, so text nested in several content regions is
+    kept once, and each distinct href is resolved against base_url only once.
+    """
+    page = PageExtraction()
+    hrefs: Dict[str, None] = {}
+    page_title = None
+    expect_signature = False
+
+    stack = [(root, 0)]
+    while stack:
+        element, scopes = stack.pop()
+        tag = _tag(element)
+        if tag is None or tag in SKIP_TAGS:
+            continue
+
+        classes = _classes(element)
+        if tag == 'main':
+            scopes |= MAIN
+        elif tag == 'article':
+            scopes |= ARTICLE
+        elif tag == 'nav':
+            scopes |= NAV
+        if 'content' in classes:
+            scopes |= CONTENT
+        if scopes & (MAIN | CONTENT):
+            page.has_content = True
+
+        if tag == 'a':
+            href = element.get('href')
+            if href and scopes & (MAIN | NAV):
+                hrefs.setdefault(href.strip(), None)
+
+        elif tag in HEADING_LEVELS and not scopes & NAV:
+            text = _text(element)
+            if text:
+                if page.title is None and tag == 'h1':
+                    page.title = text
+                page.headings.append({'level': HEADING_LEVELS[tag], 'text': text})
+                expect_signature = text.lower().rstrip(':') in SIGNATURE_HEADINGS
+            continue
+
+        elif tag == 'pre':
+            # Code blocks are leaves: highlighted tokens are joined, nothing below is walked
+            code = ''.join(element.itertext()).strip()
+            if code:
+                page.code_blocks.append(code)
+                if scopes & CONTENT_SCOPES:
+                    # `pre code`, `.content pre code` and `main pre code` each matched it
+                    page.duplicate_bytes += len(code.encode()) * (bool(scopes & CONTENT) + bool(scopes & MAIN))
+                if expect_signature or classes & SIGNATURE_CLASSES:
+                    page.signatures.append(code)
+                    expect_signature = False
+            continue
+
+        elif tag == 'p' and scopes & CONTENT_SCOPES:
+            text = _text(element)
+            if text:
+                page.paragraphs.append(text)
+                page.duplicate_bytes += len(text.encode()) * (_scope_count(scopes) - 1)
+                if expect_signature or classes & SIGNATURE_CLASSES:
+                    page.signatures.append(text)
+                    expect_signature = False
+
+        elif classes & SIGNATURE_CLASSES:
+            text = _text(element)
+            if text:
+                page.signatures.append(text)
+            continue
+
+        elif 'page-title' in classes and page_title is None:
+            page_title = _text(element) or None
+
+        stack.extend((child, scopes) for child in reversed(element))
+
+    if page.title is None:
+        page.title = page_title
+
+    links: Dict[str, None] = {}
+    for href in hrefs:
+        links.setdefault(urljoin(base_url, href), None)
+    page.links = list(links)
+    return page
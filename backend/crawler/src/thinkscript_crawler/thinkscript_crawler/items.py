@@ -6,4 +6,9 @@ class ThinkscriptItem(scrapy.Item):
     content = scrapy.Field()
     code_blocks = scrapy.Field()
     links = scrapy.Field()
-    crawled_at = scrapy.Field() 
\ No newline at end of file
+    # [{level, text}] in document order, and declaration lines such as `Average(data, length)`
+    headings = scrapy.Field()
+    signatures = scrapy.Field()
+    crawled_at = scrapy.Field()
+    # Set (with url and crawled_at only) when the page was unchanged since the last crawl
+    unchanged = scrapy.Field() 
\ No newline at end of file
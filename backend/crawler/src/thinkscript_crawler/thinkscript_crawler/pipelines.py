@@ -1,34 +1,48 @@
 import json
 import os
-from datetime import datetime
+
+
+def is_resumed_job(jobdir):
+    """Whether JOBDIR holds anything from an earlier run of the job.
+
+    spider.state is only written on a clean shutdown; after a hard kill the
+    seen fingerprints and the disk queue are all that is left behind. By the
+    time pipelines open, the scheduler has created an empty requests.seen and
+    requests.queue for a new job, so only their contents count.
+    """
+    if os.path.exists(os.path.join(jobdir, 'spider.state')):
+        return True
+    seen = os.path.join(jobdir, 'requests.seen')
+    if os.path.exists(seen) and os.path.getsize(seen) > 0:
+        return True
+    queue = os.path.join(jobdir, 'requests.queue')
+    return os.path.isdir(queue) and bool(os.listdir(queue))
+
 
 class ThinkscriptPipeline:
-    def __init__(self):
+    """Write items as JSON Lines, one object per line, flushed as items arrive."""
+
+    def open_spider(self, spider):
+        """Open CRAWL_OUTPUT_FILE, appending to it when resuming a job."""
+        path = spider.settings.get('CRAWL_OUTPUT_FILE', 'output/thinkscript_data.jsonl')
+        
         # Create output directory if it doesn't exist
-        os.makedirs('output', exist_ok=True)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
         
-        # Initialize output file
-        self.file = open('output/thinkscript_data.json', 'w', encoding='utf-8')
-        self.file.write('[\n')
-        self.first_item = True
+        # A job directory left behind by an earlier run, even a killed one, means resuming
+        jobdir = spider.settings.get('JOBDIR')
+        resuming = bool(jobdir) and is_resumed_job(jobdir)
+        self.file = open(path, 'a' if resuming else 'w', encoding='utf-8')
 
     def process_item(self, item, spider):
         """Process each item and write to file."""
-        # Convert item to JSON string
+        # Convert item to a single JSON line
         line = json.dumps(dict(item), ensure_ascii=False)
-        
-        # Add comma if not first item
-        if not self.first_item:
-            self.file.write(',\n')
-        else:
-            self.first_item = False
-            
-        # Write item to file
-        self.file.write(line)
+        self.file.write(line + '\n')
+        self.file.flush()
         
         return item
 
     def close_spider(self, spider):
         """Close the output file when spider is closed."""
-        self.file.write('\n]')
-        self.file.close() 
\ No newline at end of file
+        self.file.close()
\ No newline at end of file
@@ -1,5 +1,12 @@
 # Scrapy settings for ThinkScript crawler
 
+import os
+from datetime import datetime
+from pathlib import Path
+
+# Project data directory (5 levels up from this file)
+DATA_DIR = str(Path(__file__).resolve().parents[5] / 'data')
+
 BOT_NAME = 'thinkscript_crawler'
 
 SPIDER_MODULES = ['thinkscript_crawler.spiders']
@@ -33,9 +40,9 @@ ITEM_PIPELINES = {
 LOG_LEVEL = 'DEBUG'
 LOG_FORMAT = '%(asctime)s [%(name)s] %(levelname)s: %(message)s'
 
-# Configure output format
-FEED_FORMAT = 'json'
-FEED_URI = 'output/thinkscript_data.json'
+# Output is written by the item pipeline as JSON Lines (CRAWL_OUTPUT_FILE),
+# so no feed exporter is configured to write to the same path
+CRAWL_OUTPUT_FILE = 'output/thinkscript_data.jsonl'
 
 # Configure maximum depth for crawling
 DEPTH_LIMIT = 3
@@ -57,5 +64,41 @@ COOKIES_ENABLED = True
 # Configure maximum response size
 DOWNLOAD_MAXSIZE = 1073741824  # 1GB
 
-# Configure response encoding
-FEED_EXPORT_INDENT = 2 
\ No newline at end of file
+# CRAWL_MODE=incremental trades the fixed delay for AutoThrottle, keeps a job
+# directory so an interrupted crawl can be resumed, and revalidates pages
+# against an HTTP cache so unchanged ones are not re-parsed
+CRAWL_MODE = os.getenv('CRAWL_MODE', 'polite')
+# A fresh job per run unless resuming: a finished job's directory still holds its
+# seen requests, so reusing it would skip every page (same naming as run.sh)
+CRAWL_JOB = os.getenv('CRAWL_JOB') or datetime.now().strftime('%Y%m%d_%H%M%S')
+CRAWL_STATE_DIR = os.getenv('CRAWL_STATE_DIR', os.path.join(DATA_DIR, 'crawls', 'state'))
+
+if CRAWL_MODE == 'incremental':
+    # AutoThrottle adapts the delay to server latency; these only bound it
+    CONCURRENT_REQUESTS_PER_DOMAIN = 8
+    DOWNLOAD_DELAY = 0.25
+    AUTOTHROTTLE_ENABLED = True
+    AUTOTHROTTLE_START_DELAY = 1.0
+    AUTOTHROTTLE_MAX_DELAY = 30.0
+    AUTOTHROTTLE_TARGET_CONCURRENCY = 4.0
+
+    # Scheduler queue, seen requests and spider state; rerun with the same CRAWL_JOB to resume
+    JOBDIR = os.path.join(CRAWL_STATE_DIR, 'jobs', CRAWL_JOB)
+
+    # Shared by all jobs: stale entries are revalidated with If-None-Match /
+    # If-Modified-Since, and a 304 yields the cached response flagged 'cached'
+    HTTPCACHE_ENABLED = True
+    HTTPCACHE_POLICY = 'scrapy.extensions.httpcache.RFC2616Policy'
+    HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+    HTTPCACHE_DIR = os.path.join(CRAWL_STATE_DIR, 'httpcache')
+
+    # Next to the other crawl files, so `./run.sh sync-crawl` can apply it
+    CRAWL_OUTPUT_FILE = os.path.join(DATA_DIR, 'crawls', f'thinkscript_data_{CRAWL_JOB}.jsonl')
+
+    # max-age=0 makes every cached page stale, so each crawl revalidates it
+    # instead of trusting heuristic freshness
+    DEFAULT_REQUEST_HEADERS = {
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en',
+        'Cache-Control': 'max-age=0',
+    }
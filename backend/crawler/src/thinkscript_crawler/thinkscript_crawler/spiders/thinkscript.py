@@ -1,15 +1,31 @@
+import re
 import scrapy
 from scrapy.spiders import CrawlSpider, Rule
 from scrapy.linkextractors import LinkExtractor
-from urllib.parse import urljoin
+from urllib.parse import urlparse
 from datetime import datetime
+from ..extraction import extract_page
 from ..items import ThinkscriptItem
 
+DENY_PATTERNS = ('wp-admin', 'wp-login', 'feed', 'comment', 'tag', 'category', 'author', 'page')
+
 class ThinkScriptSpider(CrawlSpider):
     name = 'thinkscript'
     allowed_domains = ['toslc.thinkorswim.com']
     start_urls = ['https://toslc.thinkorswim.com/center/reference/thinkScript']
     
+    def __init__(self, base_url=None, *args, **kwargs):
+        # `scrapy crawl thinkscript -a base_url=http://localhost:8080/center/reference/thinkScript`
+        # crawls a local mirror of the reference instead of the live site
+        if base_url:
+            self.start_urls = [base_url]
+            self.allowed_domains = [urlparse(base_url).hostname]
+            self.rules = (
+                Rule(LinkExtractor(allow=(re.escape(base_url),), deny=DENY_PATTERNS),
+                     callback='parse_page', follow=True),
+            )
+        super(ThinkScriptSpider, self).__init__(*args, **kwargs)
+    
     # Rules for following links
     rules = (
         # Follow links within the same domain and specific paths
@@ -24,7 +40,7 @@ class ThinkScriptSpider(CrawlSpider):
                     'toslc.thinkorswim.com/center/reference/thinkScript/declarations/.*',
                     'toslc.thinkorswim.com/center/reference/thinkScript/reserved-words/.*'
                 ),
-                deny=('wp-admin', 'wp-login', 'feed', 'comment', 'tag', 'category', 'author', 'page')
+                deny=DENY_PATTERNS
             ),
             callback='parse_page',
             follow=True
@@ -36,52 +52,34 @@ class ThinkScriptSpider(CrawlSpider):
         # Debug logging
         self.logger.info(f"Parsing page: {response.url}")
         
+        # Served from the HTTP cache after a 304 (incremental mode): the page is
+        # unchanged since the last crawl, so only mark it as still present
+        if 'cached' in response.flags:
+            yield ThinkscriptItem(url=response.url, unchanged=True, crawled_at=datetime.now().isoformat())
+            return
+        
+        # One walk over the parsed tree instead of a CSS query per field
+        page = extract_page(response.selector.root, response.url)
+        
         # Skip if not a content page
-        if not response.css('main') and not response.css('.content'):
+        if not page.has_content:
             self.logger.debug(f"Skipping non-content page: {response.url}")
             return
 
         item = ThinkscriptItem()
-        
-        # Extract title - try multiple selectors
-        title = response.css('h1::text').get()
-        if not title:
-            title = response.css('.page-title::text').get()
-        if not title:
-            title = response.css('.content h1::text').get()
-        item['title'] = title
-        
-        # Extract content - try multiple selectors
-        content = []
-        content.extend(response.css('main p::text').getall())
-        content.extend(response.css('.content p::text').getall())
-        content.extend(response.css('article p::text').getall())
-        item['content'] = ' '.join([c.strip() for c in content if c.strip()])
-        
-        # Extract code examples - try multiple selectors
-        code_blocks = []
-        code_blocks.extend(response.css('pre code::text').getall())
-        code_blocks.extend(response.css('.content pre code::text').getall())
-        code_blocks.extend(response.css('main pre code::text').getall())
-        item['code_blocks'] = [code.strip() for code in code_blocks if code.strip()]
-        
-        # Extract navigation links
-        nav_links = response.css('nav a::attr(href)').getall()
-        nav_links = [urljoin(response.url, link) for link in nav_links]
-        
-        # Extract content links
-        content_links = response.css('main a::attr(href)').getall()
-        content_links = [urljoin(response.url, link) for link in content_links]
-        
-        # Combine all links
-        item['links'] = list(set(nav_links + content_links))  # Remove duplicates
+        item['title'] = page.title
+        item['content'] = page.content
+        item['code_blocks'] = page.code_blocks
+        item['headings'] = page.headings
+        item['signatures'] = page.signatures
+        item['links'] = page.links
         
         # Add metadata
         item['url'] = response.url
         item['crawled_at'] = datetime.now().isoformat()
         
         # Debug logging
-        self.logger.info(f"Found content: Title={bool(title)}, Content length={len(item['content'])}, Code blocks={len(item['code_blocks'])}")
+        self.logger.info(f"Found content: Title={bool(page.title)}, Content length={len(item['content'])}, Code blocks={len(item['code_blocks'])}")
         
         yield item
 
@@ -4,9 +4,15 @@ import { useEffect, useRef, useState } from 'react';
 import { ChatMessage } from './message';
 import { ChatInput } from './input';
 import { Message, ChatState } from '@/types/chat';
-import { sendMessage, AIModel } from '@/lib/api';
+import { createConversation, deleteConversation, sendTurn, ConversationNotFoundError, AIModel } from '@/lib/api';
 import { Button } from '@/components/ui/button';
-import { loadChatHistory, saveChatHistory, clearChatHistory } from '@/lib/storage';
+import {
+  loadChatHistory,
+  saveChatHistory,
+  clearChatHistory,
+  loadConversationId,
+  saveConversationId,
+} from '@/lib/storage';
 import { Trash2 } from 'lucide-react';
 import { generateMessageId } from '@/lib/utils';
 import {
@@ -32,6 +38,7 @@ export function Chat({ initialState }: ChatProps) {
   const [selectedModel, setSelectedModel] = useState<AIModel>('gpt-3.5-turbo');
   const [streamingContent, setStreamingContent] = useState('');
   const streamingMessageId = useRef<string | null>(null);
+  const conversationId = useRef<string | null>(null);
 
   const scrollRef = useRef<HTMLDivElement>(null);
   const lastFailedMessage = useRef<string | null>(null);
@@ -40,6 +47,7 @@ export function Chat({ initialState }: ChatProps) {
   // Load chat history after component mounts
   useEffect(() => {
     setMounted(true);
+    conversationId.current = loadConversationId();
     setState(prev => ({
       ...prev,
       messages: loadChatHistory(),
@@ -67,6 +75,14 @@ export function Chat({ initialState }: ChatProps) {
     scrollToBottom();
   }, [state.messages, streamingContent]);
 
+  // Server-side conversation seeded with the local history, so only new turns are sent
+  const startConversation = async (history: Message[]) => {
+    const id = await createConversation(selectedModel, history.filter(msg => msg.content));
+    conversationId.current = id;
+    saveConversationId(id);
+    return id;
+  };
+
   const handleSend = async (content: string) => {
     if (!content.trim()) return;
 
@@ -100,8 +116,7 @@ export function Chat({ initialState }: ChatProps) {
         messages: [...prev.messages, assistantMessage],
       }));
 
-      // Send message and handle streaming response
-      await sendMessage([...state.messages, userMessage], (chunk) => {
+      const onChunk = (chunk: string) => {
         setStreamingContent(prev => prev + chunk);
         // Update the assistant message content
         setState(prev => ({
@@ -112,7 +127,17 @@ export function Chat({ initialState }: ChatProps) {
               : msg
           ),
         }));
-      }, selectedModel);
+      };
+
+      // Send only the new turn and handle streaming response
+      const id = conversationId.current ?? await startConversation(state.messages);
+      try {
+        await sendTurn(id, userMessage.content, onChunk, selectedModel);
+      } catch (error) {
+        if (!(error instanceof ConversationNotFoundError)) throw error;
+        // Expired on the server: start over from the local history
+        await sendTurn(await startConversation(state.messages), userMessage.content, onChunk, selectedModel);
+      }
 
       // Update final state
       setState(prev => ({
@@ -143,6 +168,11 @@ export function Chat({ initialState }: ChatProps) {
 
   const handleClearHistory = () => {
     clearChatHistory();
+    if (conversationId.current) {
+      deleteConversation(conversationId.current);
+      conversationId.current = null;
+      saveConversationId(null);
+    }
     setState((prev: ChatState) => ({
       ...prev,
       messages: [],
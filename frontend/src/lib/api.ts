@@ -4,6 +4,37 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
 export type AIModel = 'gpt-3.5-turbo' | 'gpt-4-turbo-preview';
 
+export class ConversationNotFoundError extends Error {}
+
+async function readStream(response: Response, onChunk: (chunk: string) => void): Promise<void> {
+  const reader = response.body?.getReader();
+  if (!reader) {
+    throw new Error('No reader available');
+  }
+
+  const decoder = new TextDecoder();
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    const chunk = decoder.decode(value);
+    const lines = chunk.split('\n');
+
+    for (const line of lines) {
+      if (line.startsWith('data: ')) {
+        const data = JSON.parse(line.slice(6));
+        if (data.error) {
+          throw new Error(data.error);
+        }
+        if (data.content) {
+          onChunk(data.content);
+        }
+      }
+    }
+  }
+}
+
 export async function sendMessage(
   messages: Message[], 
   onChunk: (chunk: string) => void,
@@ -22,34 +53,71 @@ export async function sendMessage(
       throw new Error('Failed to fetch');
     }
 
-    const reader = response.body?.getReader();
-    if (!reader) {
-      throw new Error('No reader available');
-    }
+    await readStream(response, onChunk);
+  } catch (error) {
+    console.error('Error sending message:', error);
+    throw error;
+  }
+}
 
-    const decoder = new TextDecoder();
+// Starts a server-side conversation, seeded with any earlier messages, and returns its id
+export async function createConversation(
+  model: AIModel = 'gpt-3.5-turbo',
+  messages: Message[] = []
+): Promise<string> {
+  const response = await fetch(`${API_URL}/conversations`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      model,
+      messages: messages.map(({ role, content }) => ({ role, content })),
+    }),
+  });
 
-    while (true) {
-      const { done, value } = await reader.read();
-      if (done) break;
+  if (!response.ok) {
+    throw new Error('Failed to create conversation');
+  }
 
-      const chunk = decoder.decode(value);
-      const lines = chunk.split('\n');
+  const data = await response.json();
+  return data.id;
+}
 
-      for (const line of lines) {
-        if (line.startsWith('data: ')) {
-          const data = JSON.parse(line.slice(6));
-          if (data.error) {
-            throw new Error(data.error);
-          }
-          if (data.content) {
-            onChunk(data.content);
-          }
-        }
-      }
+export async function deleteConversation(conversationId: string): Promise<void> {
+  try {
+    await fetch(`${API_URL}/conversations/${conversationId}`, { method: 'DELETE' });
+  } catch (error) {
+    console.error('Error deleting conversation:', error);
+  }
+}
+
+// Sends only the new user turn; the server keeps the conversation's history
+export async function sendTurn(
+  conversationId: string,
+  content: string,
+  onChunk: (chunk: string) => void,
+  model: AIModel = 'gpt-3.5-turbo'
+): Promise<void> {
+  try {
+    const response = await fetch(`${API_URL}/conversations/${conversationId}/messages`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ content, model }),
+    });
+
+    if (response.status === 404) {
+      throw new ConversationNotFoundError('Conversation expired');
     }
+    if (!response.ok) {
+      throw new Error('Failed to fetch');
+    }
+
+    await readStream(response, onChunk);
   } catch (error) {
     console.error('Error sending message:', error);
     throw error;
   }
-} 
\ No newline at end of file
+}
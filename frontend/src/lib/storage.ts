@@ -1,6 +1,7 @@
 import { Message } from '@/types/chat';
 
 const CHAT_HISTORY_KEY = 'thinkscript_chat_history';
+const CONVERSATION_ID_KEY = 'thinkscript_conversation_id';
 
 export function loadChatHistory(): Message[] {
   if (typeof window === 'undefined') return [];
@@ -32,4 +33,29 @@ export function clearChatHistory(): void {
   } catch (error) {
     console.error('Error clearing chat history:', error);
   }
-} 
\ No newline at end of file
+}
+
+export function loadConversationId(): string | null {
+  if (typeof window === 'undefined') return null;
+
+  try {
+    return localStorage.getItem(CONVERSATION_ID_KEY);
+  } catch (error) {
+    console.error('Error loading conversation id:', error);
+    return null;
+  }
+}
+
+export function saveConversationId(conversationId: string | null): void {
+  if (typeof window === 'undefined') return;
+
+  try {
+    if (conversationId) {
+      localStorage.setItem(CONVERSATION_ID_KEY, conversationId);
+    } else {
+      localStorage.removeItem(CONVERSATION_ID_KEY);
+    }
+  } catch (error) {
+    console.error('Error saving conversation id:', error);
+  }
+}
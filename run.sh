@@ -6,17 +6,20 @@ RED='\033[0;31m'
 YELLOW='\033[1;33m'
 NC='\033[0m' # No Color
 
-# Function to check if Neo4j is ready
+# Function to check if Neo4j is ready (answers a Cypher query over HTTP)
 check_neo4j() {
-    # for i in {1..30}; do
-    #     if curl -s -f http://localhost:7474/db/neo4j/tx/commit -X POST -H "Content-Type: application/json" -d '{"statements": [{"statement": "RETURN 1"}]}' > /dev/null; then
-    #         echo -e "${GREEN}Neo4j is ready!${NC}"
-    #         return 0
-    #     fi
-    #     echo "Waiting for Neo4j... ($i/30)"
+    local user password
+    user=$(grep -E '^NEO4J_USER=' .env 2>/dev/null | cut -d= -f2-)
+    password=$(grep -E '^NEO4J_PASSWORD=' .env 2>/dev/null | cut -d= -f2-)
+    for i in {1..30}; do
+        if curl -s -f -u "${user:-neo4j}:${password:-password}" http://localhost:7474/db/neo4j/tx/commit -X POST -H "Content-Type: application/json" -d '{"statements": [{"statement": "RETURN 1"}]}' > /dev/null; then
+            echo -e "${GREEN}Neo4j is ready!${NC}"
+            return 0
+        fi
+        echo "Waiting for Neo4j... ($i/30)"
         sleep 2
-    # done
-    # echo -e "${RED}Neo4j failed to start within 60 seconds${NC}"
+    done
+    echo -e "${RED}Neo4j failed to start within 60 seconds${NC}"
     return 1
 }
 
@@ -97,10 +100,30 @@ run_crawler() {
     cd ../..
 }
 
+# Function to run the crawler with AutoThrottle, a resumable job directory and
+# an HTTP cache, so pages answering 304 are recorded as unchanged, not re-parsed
+run_crawler_incremental() {
+    local job="${1:-$(date +%Y%m%d_%H%M%S)}"
+    echo -e "${GREEN}Starting incremental ThinkScript crawl (job $job)...${NC}"
+    echo "If interrupted, resume with: ./run.sh crawl-incremental $job"
+    setup_data_dirs
+    cd backend/crawler
+    if [ ! -d "venv" ]; then
+        python3 -m venv venv
+    fi
+    source venv/bin/activate
+    pip3 install -r requirements.txt
+    cd src/thinkscript_crawler
+    CRAWL_MODE=incremental CRAWL_JOB="$job" scrapy crawl thinkscript ${2:+-a base_url="$2"}
+    deactivate
+    cd ../../../..
+    echo -e "${GREEN}Apply it with: ./run.sh sync-crawl thinkscript_data_$job.jsonl${NC}"
+}
+
 # Function to list crawl files
 list_crawls() {
     echo -e "${GREEN}Available crawl files:${NC}"
-    ls -l data/crawls/thinkscript_data_*.json 2>/dev/null || echo "No crawl files found"
+    ls -l data/crawls/thinkscript_data_*.json data/crawls/thinkscript_data_*.jsonl 2>/dev/null || echo "No crawl files found"
 }
 
 # Function to get project root directory
@@ -131,6 +154,88 @@ process_crawl() {
     cd ../..
 }
 
+# Function to incrementally sync a crawl file (only new/changed/removed pages)
+sync_crawl() {
+    if [ -z "$1" ]; then
+        echo -e "${RED}Please specify a crawl file to sync${NC}"
+        list_crawls
+        return
+    fi
+
+    crawl_file="data/crawls/$1"
+    if [ ! -f "$crawl_file" ]; then
+        echo -e "${RED}Crawl file not found: $crawl_file${NC}"
+        list_crawls
+        return
+    fi
+
+    echo -e "${GREEN}Syncing crawl file: $crawl_file${NC}"
+    cd backend/api
+    source venv/bin/activate
+    PYTHONPATH=$PYTHONPATH:$(pwd)/src ENV_FILE="$(get_project_root)/.env" python3 src/process_content.py --sync ${2:+"$2"} "$crawl_file"
+    deactivate
+    cd ../..
+}
+
+# Function to rebuild the graph offline: export a crawl file to CSVs, replace the
+# neo4j database with neo4j-admin import, then add constraints, indexes and embeddings
+import_crawl() {
+    if [ -z "$1" ]; then
+        echo -e "${RED}Please specify a crawl file to import${NC}"
+        list_crawls
+        return
+    fi
+
+    crawl_file="data/crawls/$1"
+    if [ ! -f "$crawl_file" ]; then
+        echo -e "${RED}Crawl file not found: $crawl_file${NC}"
+        list_crawls
+        return
+    fi
+
+    if [ "$2" != "--yes" ]; then
+        echo -e "${RED}Warning: This will replace all data in Neo4j${NC}"
+        read -p "Are you sure? (y/n) " -n 1 -r
+        echo
+        if [[ ! $REPLY =~ ^[Yy]$ ]]; then
+            return
+        fi
+    fi
+
+    local import_dir started
+    import_dir="$(get_project_root)/data/import"
+    started=$(date +%s)
+
+    echo -e "${GREEN}Exporting $crawl_file to CSV...${NC}"
+    cd backend/api
+    source venv/bin/activate
+    PYTHONPATH=$PYTHONPATH:$(pwd)/src ENV_FILE="$(get_project_root)/.env" IMPORT_DIR="$import_dir" python3 src/bulk_import.py "$crawl_file" || { deactivate; cd ../..; return 1; }
+    deactivate
+    cd ../..
+
+    # neo4j-admin needs the database offline; the import writes into the neo4j_data volume
+    echo -e "${GREEN}Importing into an empty database...${NC}"
+    docker-compose stop neo4j
+    docker-compose run --rm --no-deps -v "$import_dir:/import" neo4j \
+        neo4j-admin database import full neo4j --overwrite-destination \
+        --nodes=Node=/import/nodes.csv \
+        --nodes=ContentChunk=/import/chunks.csv \
+        --nodes=CodeExample=/import/examples.csv \
+        --relationships=HAS_CHUNK=/import/has_chunk.csv \
+        --relationships=HAS_EXAMPLE=/import/has_example.csv \
+        --relationships=LINKS_TO=/import/links_to.csv \
+        --multiline-fields=true --array-delimiter=U+001F || return 1
+    start_neo4j || return 1
+
+    echo -e "${GREEN}Creating constraints and indexes...${NC}"
+    cd backend/api
+    source venv/bin/activate
+    PYTHONPATH=$PYTHONPATH:$(pwd)/src ENV_FILE="$(get_project_root)/.env" python3 src/bulk_import.py --finish
+    deactivate
+    cd ../..
+    echo -e "${GREEN}Cold rebuild finished in $(( $(date +%s) - started ))s${NC}"
+}
+
 # Function to setup schema
 setup_schema() {
     echo -e "${GREEN}Setting up Neo4j schema...${NC}"
@@ -151,6 +256,56 @@ process_data() {
     cd ../..
 }
 
+# Function to benchmark the original per-row loader against per-row and batched upserts
+bench_ingest() {
+    echo -e "${GREEN}Benchmarking ingestion (this clears all Node data)...${NC}"
+    cd backend/api
+    source venv/bin/activate
+    PYTHONPATH=$PYTHONPATH:$(pwd)/src ENV_FILE="$(get_project_root)/.env" python3 benchmarks/bench_ingest.py "$@"
+    deactivate
+    cd ../..
+}
+
+# Function to benchmark the token-aware chunker against the legacy splitter
+bench_chunker() {
+    echo -e "${GREEN}Benchmarking chunker...${NC}"
+    cd backend/api
+    source venv/bin/activate
+    PYTHONPATH=$PYTHONPATH:$(pwd)/src ENV_FILE="$(get_project_root)/.env" python3 benchmarks/bench_chunker.py "$@"
+    deactivate
+    cd ../..
+}
+
+# Function to benchmark retrieval latency and quality on the question set
+bench_retrieval() {
+    echo -e "${GREEN}Benchmarking retrieval...${NC}"
+    cd backend/api
+    source venv/bin/activate
+    PYTHONPATH=$PYTHONPATH:$(pwd)/src ENV_FILE="$(get_project_root)/.env" python3 benchmarks/bench_retrieval.py "$@"
+    deactivate
+    cd ../..
+}
+
+# Function to benchmark a cold rebuild with the online loader vs CSV export and neo4j-admin import
+bench_cold_rebuild() {
+    echo -e "${GREEN}Benchmarking cold rebuild (this replaces all data in Neo4j)...${NC}"
+    cd backend/api
+    source venv/bin/activate
+    PYTHONPATH=$PYTHONPATH:$(pwd)/src ENV_FILE="$(get_project_root)/.env" python3 benchmarks/bench_cold_rebuild.py "$@"
+    deactivate
+    cd ../..
+}
+
+# Function to benchmark single-walk page extraction against the old CSS selectors
+bench_extraction() {
+    echo -e "${GREEN}Benchmarking page extraction...${NC}"
+    cd backend/crawler
+    source venv/bin/activate
+    PYTHONPATH=$PYTHONPATH:$(pwd)/src/thinkscript_crawler python3 benchmarks/bench_extraction.py "$@"
+    deactivate
+    cd ../..
+}
+
 # Function to kill processes using specific ports
 kill_port_processes() {
     echo -e "${YELLOW}Checking for processes using ports 3000 and 8000...${NC}"
@@ -193,15 +348,15 @@ start_backend() {
     echo -e "${YELLOW}Starting FastAPI server...${NC}"
     PYTHONPATH=$PYTHONPATH:$(pwd)/src ENV_FILE="$(get_project_root)/.env" uvicorn src.main:app --host 0.0.0.0 --port 8000 --reload &
     
-    # Wait for the server to start
-    # for i in {1..30}; do
-    #     if curl -s http://localhost:8000/api/health > /dev/null; then
-    #         echo -e "${GREEN}Backend API is running!${NC}"
-    #         break
-    #     fi
-    #     echo "Waiting for backend to start... ($i/30)"
-    #     sleep 1
-    # done
+    # Wait until the API is warmed up and its indexes are online
+    for i in {1..30}; do
+        if curl -s -f http://localhost:8000/ready > /dev/null; then
+            echo -e "${GREEN}Backend API is ready!${NC}"
+            break
+        fi
+        echo "Waiting for backend to become ready... ($i/30)"
+        sleep 1
+    done
     
     cd ../..
 }
@@ -262,10 +417,18 @@ show_help() {
     echo "  logs      - Show service logs"
     echo "  reset     - Reset all Neo4j data"
     echo "  crawl     - Run the ThinkScript crawler"
+    echo "  crawl-incremental [job] [base_url] - Resumable crawl that skips unchanged pages"
     echo "  crawls    - List available crawl files"
     echo "  process   - Process data and create Neo4j nodes"
     echo "  process-crawl [file] - Process specific crawl file"
+    echo "  sync-crawl [file] [--tombstone] - Incrementally sync a crawl file"
+    echo "  import-crawl [file] [--yes] - Rebuild the database from a crawl file with neo4j-admin import"
     echo "  schema    - Set up Neo4j schema"
+    echo "  bench-ingest [file] - Benchmark the original loader vs per-row and batched upserts"
+    echo "  bench-chunker [file] - Benchmark chunker vs legacy split_content"
+    echo "  bench-extraction [html_dir] - Benchmark crawler page extraction on saved HTML"
+    echo "  bench-cold-rebuild [file] - Time a cold rebuild: online loader vs neo4j-admin import"
+    echo "  bench-retrieval [--load [file]] [--modes ...] - Retrieval latency, QPS, recall@k and MRR"
     echo "  help      - Show this help message"
 }
 
@@ -299,18 +462,47 @@ case "$1" in
     "crawl")
         run_crawler
         ;;
+    "crawl-incremental")
+        run_crawler_incremental "$2" "$3"
+        ;;
     "crawls")
         list_crawls
         ;;
     "process-crawl")
         process_crawl "$2"
         ;;
+    "sync-crawl")
+        sync_crawl "$2" "$3"
+        ;;
+    "import-crawl")
+        import_crawl "$2" "$3"
+        ;;
     "schema")
         setup_schema
         ;;
     "process")
         process_data
         ;;
+    "bench-ingest")
+        shift
+        bench_ingest "$@"
+        ;;
+    "bench-chunker")
+        shift
+        bench_chunker "$@"
+        ;;
+    "bench-cold-rebuild")
+        shift
+        bench_cold_rebuild "$@"
+        ;;
+    "bench-retrieval")
+        shift
+        bench_retrieval "$@"
+        ;;
+    "bench-extraction")
+        shift
+        bench_extraction "$@"
+        ;;
     "help")
         show_help
         ;;